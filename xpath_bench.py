@@ -0,0 +1,309 @@
+"""XPath分析基准测试 - 在合成的大页面上比较文档遍历方式"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from xpath_engine import (ELEMENT_CONFIGS, BACKENDS, UNLIMITED, scan_document, parse_html, generate_xpath_rows,
+                          generate_element_xpaths)
+from xpath_stability import SnapshotIndex, StabilityReport, baseline_locators, evaluate_snapshot
+from xpath_store import XPATH_ITEM_PREFIX, TreeItemTable, XPathTable
+
+
+def generate_page(element_count=100000):
+    """生成包含约element_count个元素的合成页面"""
+    parts = ['<!DOCTYPE html><html><head><title>bench</title></head><body>']
+    count = 3
+    section = 0
+    while count < element_count:
+        section += 1
+        parts.append(f'<div class="section s{section % 50}" id="section-{section}">')
+        parts.append(f'<h2>标题 {section}</h2><p class="intro">段落 <span>{section}</span></p>')
+        parts.append('<ul class="list">')
+        for item in range(5):
+            parts.append(f'<li><a href="/item/{section}/{item}" class="link">链接 {item}</a></li>')
+        parts.append('</ul>')
+        parts.append(f'<form action="/submit/{section}"><input type="text" name="q{section}" placeholder="搜索">'
+                     f'<button type="submit">提交</button></form></div>')
+        count += 20
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def generate_deep_page(depth=5000):
+    """生成嵌套depth层div的页面"""
+    return ('<html><body>' + '<div class="level">' * depth + '<p>底部</p>'
+            + '</div>' * depth + '</body></html>')
+
+
+def generate_wide_page(width=50000):
+    """生成body下有width个并列子元素的页面"""
+    items = ''.join(f'<div class="item"><span>{i}</span></div>' for i in range(width // 2))
+    return f'<html><body>{items}</body></html>'
+
+
+def generate_sibling_snapshots(versions=4, items=5):
+    """同一列表的多个版本：各项外观相同，版本间只有data-rev和图片地址变化"""
+    pages = []
+    for version in range(versions):
+        lis = ''.join(f'<li class="item" data-rev="{version}{item}"><img src="/img/{version}/{item}.png"></li>'
+                      for item in range(items))
+        pages.append(f'<html><body><div id="main"><ul>{lis}</ul></div></body></html>')
+    return pages
+
+
+def legacy_collect(soup):
+    """原实现：每个标签一次find_all，再递归遍历一次构建树"""
+    buckets = {}
+    for config in ELEMENT_CONFIGS:
+        buckets[config['tag']] = soup.find_all(config['tag'])
+
+    tree_nodes = []
+
+    def walk(element):
+        tree_nodes.append(element)
+        for child in element.children:
+            if hasattr(child, 'name') and child.name:
+                walk(child)
+
+    walk(soup.find('body') or soup.find('html') or soup)
+    return buckets, tree_nodes
+
+
+def legacy_build_tree(soup):
+    """原实现：递归构建树，返回(节点ID, 父节点ID)序列"""
+    tree = []
+    
+    def build(element, parent_id):
+        node_id = f"{element.name}_{len(tree)}"
+        tree.append((node_id, parent_id))
+        for child in element.children:
+            if hasattr(child, 'name') and child.name:
+                build(child, node_id)
+
+    build(soup.find('body') or soup.find('html') or soup, '')
+    return tree
+
+
+def iterative_build_tree(scan):
+    """现实现：按遍历结果的先序节点表迭代构建树，返回(节点ID, 父节点ID)序列"""
+    tree = []
+    for index in scan.tree_range():
+        parent_id = scan.tree_node_id(scan.parents[index]) if index != scan.tree_root else ''
+        tree.append((scan.tree_node_id(index), parent_id))
+    return tree
+
+
+def bench_tree_build(soup):
+    """比较递归建树与迭代建树的吞吐量，并确认节点顺序和ID一致"""
+    scan = scan_document(soup)
+
+    start = time.perf_counter()
+    try:
+        legacy = legacy_build_tree(soup)
+    except RecursionError:
+        legacy = None
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    iterative = iterative_build_tree(scan)
+    iterative_time = time.perf_counter() - start
+
+    if legacy is not None:
+        assert legacy == iterative
+    nodes = len(iterative)
+    return {
+        'nodes': nodes,
+        'max_depth': max(scan.depths),
+        'recursive': {'seconds': legacy_time, 'nodes_per_second': nodes / legacy_time if legacy else 0,
+                      'error': None if legacy is not None else 'RecursionError'},
+        'iterative': {'seconds': iterative_time, 'nodes_per_second': nodes / iterative_time},
+    }
+
+
+def bench_traversal(soup):
+    """比较原实现与单次遍历的遍历次数和耗时"""
+    descendant_count = sum(1 for _ in soup.descendants)
+
+    start = time.perf_counter()
+    buckets, tree_nodes = legacy_collect(soup)
+    legacy_time = time.perf_counter() - start
+    # find_all每次都遍历全部后代节点，递归建树再遍历一次树的子树
+    legacy_passes = len(ELEMENT_CONFIGS) + 1
+
+    start = time.perf_counter()
+    scan = scan_document(soup)
+    scan_time = time.perf_counter() - start
+
+    assert [len(buckets[tag]) for tag in buckets] == [len(scan.buckets.get(tag, [])) for tag in buckets]
+    assert len(tree_nodes) == len(scan.tree_range())
+
+    return {
+        'descendants': descendant_count,
+        'legacy': {'passes': legacy_passes, 'visited': descendant_count * legacy_passes, 'seconds': legacy_time},
+        'single_pass': {'passes': scan.passes, 'visited': scan.visited, 'seconds': scan_time},
+    }
+
+
+def bench_backends(html):
+    """在同一文档上比较BeautifulSoup与lxml后端的解析+遍历+生成耗时，并确认结果一致"""
+    result = {}
+    outputs = {}
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        scan = parse_html(html, backend=backend)
+        parsed = time.perf_counter()
+        rows = [(row['type'], row['xpath'], row['element_type'], row['element_index'])
+                for row in generate_xpath_rows(scan)]
+        end = time.perf_counter()
+        outputs[backend] = rows
+        result[backend] = {'parse_seconds': parsed - start, 'generate_seconds': end - parsed,
+                           'seconds': end - start, 'rows': len(rows)}
+    assert outputs['bs4'] == outputs['lxml'], '两个后端的XPath结果不一致'
+    return result
+
+
+def bench_stability_alignment(versions=4, items=5):
+    """在各项外观相同的列表的多个版本上评估定位，确认位置路径全部稳定（相似度相同的兄弟按顺序对应）"""
+    pages = generate_sibling_snapshots(versions, items)
+    start = time.perf_counter()
+    base = SnapshotIndex(parse_html(pages[0], backend='lxml'))
+    locators = baseline_locators(base.scan, UNLIMITED)
+    plain = [(row['xpath'], target) for row, target in locators]
+    report = StabilityReport(locators)
+    for version, page in enumerate(pages[1:], 1):
+        outcomes, aligned = evaluate_snapshot(base, parse_html(page, backend='lxml'), plain)
+        report.add({'file': f'v{version}', 'outcomes': outcomes, 'aligned': aligned, 'error': None})
+    stability = {entry['strategy']: entry['stability'] for entry in report.strategy_summaries()}
+    for strategy in ('位置', '锚点位置'):
+        assert stability[strategy] == 1.0, f'外观相同的兄弟元素对齐错误：{strategy}稳定率{stability[strategy]:.1%}'
+    return {'versions': versions, 'locators': len(locators), 'seconds': time.perf_counter() - start,
+            'stability': stability}
+
+
+def all_element_rows(scan):
+    """为所有候选元素（不限每类8个）生成XPath记录，用于构造大量记录"""
+    counter = 1
+    for config in ELEMENT_CONFIGS:
+        for idx, element in enumerate(scan.buckets.get(config['tag'], []), 1):
+            for xpath_type, xpath in generate_element_xpaths(element, config['tag'], scan).items():
+                yield {'id': counter, 'type': xpath_type, 'element_type': config['name'], 'element_index': idx,
+                       'xpath': xpath, 'tag': config['tag'], 'element': element,
+                       'match_count': 1, 'hits_target': True}
+                counter += 1
+
+
+def legacy_store(scan):
+    """原实现：每个树节点、每条XPath记录一个字典，另有三个按列表项ID的映射"""
+    html_nodes = {}
+    tree_items = {}
+    for index in scan.tree_range():
+        element = scan.nodes[index]
+        node_id = f"{scan.tags[index]}_{index}"
+        html_nodes[node_id] = {'element': element, 'tag': scan.tags[index], 'attrs': scan.attrs_of(element),
+                               'item_id': node_id, 'index': index}
+        tree_items[index] = node_id
+    all_xpaths = []
+    xpath_items = {}
+    element_xpath_items = {}
+    node_mapping = {}
+    for number, row in enumerate(all_element_rows(scan)):
+        item_id = f"{XPATH_ITEM_PREFIX}{number}"
+        row['tree_index'] = scan.tree_index(row['element'])
+        row['item_id'] = item_id
+        all_xpaths.append(row)
+        xpath_items[item_id] = row
+        element_xpath_items.setdefault(id(row['element']), []).append(item_id)
+        if row['tree_index'] is not None:
+            node_mapping[item_id] = row['tree_index']
+    return html_nodes, tree_items, all_xpaths, xpath_items, element_xpath_items, node_mapping
+
+
+def columnar_store(scan):
+    """现实现：TreeItemTable和XPathTable按列保存"""
+    tree_items = TreeItemTable(scan.tags)
+    for index in scan.tree_range():
+        tree_items.add(index)
+    table = XPathTable(scan)
+    for row in all_element_rows(scan):
+        table.append(row)
+    return tree_items, table
+
+
+def bench_store_memory(scan):
+    """比较两种存储保存全部树节点和XPath记录时的内存占用、建立耗时和完整GC耗时"""
+    # 先生成一遍，使文本等节点表上的惰性缓存不计入任何一方
+    rows = sum(1 for _ in all_element_rows(scan))
+    result = {'nodes': len(scan.tree_range()), 'rows': rows}
+    for name, build in (('dicts', legacy_store), ('columnar', columnar_store)):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        store = build(scan)
+        build_time = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        gc.collect()
+        gc_time = time.perf_counter() - start
+        result[name] = {'bytes': size, 'build_seconds': build_time, 'gc_seconds': gc_time}
+        del store
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='XPath分析基准测试')
+    parser.add_argument('-n', '--elements', type=int, default=100000, help='合成页面的元素数量')
+    parser.add_argument('--depth', type=int, default=5000, help='深层页面的嵌套层数')
+    parser.add_argument('--width', type=int, default=50000, help='宽页面的并列元素数量')
+    parser.add_argument('--recursion-limit', type=int, default=sys.getrecursionlimit(),
+                        help='递归建树时的递归深度上限（默认使用解释器当前设置）')
+    args = parser.parse_args(argv)
+    sys.setrecursionlimit(args.recursion_limit)
+
+    html = generate_page(args.elements)
+    start = time.perf_counter()
+    soup = BeautifulSoup(html, 'lxml')
+    parse_time = time.perf_counter() - start
+    print(f"解析: {parse_time:.3f}s ({args.elements} 个元素)")
+
+    result = bench_traversal(soup)
+    print(f"后代节点数: {result['descendants']}")
+    for name in ('legacy', 'single_pass'):
+        stats = result[name]
+        print(f"{name:12s} 遍历次数={stats['passes']:3d} 访问节点={stats['visited']:10d} 耗时={stats['seconds']:.3f}s")
+
+    result = bench_backends(html)
+    print("解析后端（解析+遍历+生成，结果一致）:")
+    for backend, stats in result.items():
+        print(f"  {backend:5s} 解析={stats['parse_seconds']:.3f}s 生成={stats['generate_seconds']:.3f}s "
+              f"合计={stats['seconds']:.3f}s XPath={stats['rows']}")
+
+    result = bench_stability_alignment()
+    print(f"稳定性对齐（{result['versions']} 个版本, {result['locators']} 条XPath, 外观相同的兄弟）: "
+          + ', '.join(f"{name}={value:.0%}" for name, value in result['stability'].items() if value is not None)
+          + f" 耗时={result['seconds']:.3f}s")
+
+    result = bench_store_memory(scan_document(soup))
+    print(f"界面存储（{result['nodes']} 个树节点, {result['rows']} 条XPath）:")
+    for name in ('dicts', 'columnar'):
+        stats = result[name]
+        print(f"  {name:8s} 内存={stats['bytes'] / 1024 / 1024:.1f}MB 建立={stats['build_seconds']:.3f}s "
+              f"GC={stats['gc_seconds'] * 1000:.1f}ms")
+
+    for shape, page in (('deep', generate_deep_page(args.depth)), ('wide', generate_wide_page(args.width))):
+        result = bench_tree_build(BeautifulSoup(page, 'lxml'))
+        print(f"建树[{shape}] 节点={result['nodes']} 最大深度={result['max_depth']}")
+        for name in ('recursive', 'iterative'):
+            stats = result[name]
+            if stats.get('error'):
+                print(f"  {name:10s} 失败: {stats['error']}")
+            else:
+                print(f"  {name:10s} 耗时={stats['seconds']:.3f}s 吞吐={stats['nodes_per_second']:.0f} 节点/秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""基准测试套件 - 在确定性的合成页面语料上测量分析流水线各阶段的耗时
+
+语料按固定随机种子生成（宽、深、长文本、多属性、大量重复class、综合页面），同一参数每次内容相同。
+无界面的阶段直接调用xpath_engine等模块；树形视图相关的阶段（build_html_tree、generate_all_xpaths、
+highlight_original_html）在隐藏的Tk根窗口中调用界面方法，没有显示环境时记为跳过。
+结果写入JSON，用--baseline与之前提交的结果比较，超过阈值的变慢使命令以非0退出。
+"""
+import argparse
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from xpath_bench import generate_deep_page, generate_page, generate_wide_page
+from xpath_diff import diff_scans
+from xpath_engine import generate_xpath_rows, make_limits, parse_html, parse_limit
+from xpath_source_map import get_source_offsets
+from xpath_stream import stream_xpath_rows
+
+# 结果文件格式版本
+RESULT_VERSION = 1
+# 语料随机种子
+CORPUS_SEED = 20240601
+# 默认比例下各页面的规模
+BASE_ELEMENTS = 20000
+BASE_DEPTH = 2000
+# 每个阶段重复次数，取最短耗时
+DEFAULT_REPEAT = 3
+# 比较时允许的变慢比例，以及忽略的绝对差（计时噪声）
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_DELTA = 0.01
+# 每个类型生成XPath的元素数（界面默认的8个太少，测不出差别）
+DEFAULT_ELEMENT_LIMIT = 200
+# highlight_original_html阶段高亮的元素数
+HIGHLIGHT_SAMPLES = 200
+
+WORDS = ('数据', '分析', '页面', '元素', '定位', 'product', 'price', 'order', 'user', 'search', 'report',
+         'item', 'list', '文本', '链接', 'value', 'status', 'detail')
+
+
+def generate_text_page(elements, rng):
+    """长文本页面：段落中混有行内元素，文本节点多且长"""
+    parts = ['<html><body><article>']
+    count = 0
+    while count < elements:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+            if rng.random() < 0.3:
+                words += f' <b>{rng.choice(WORDS)}</b> <i>{rng.choice(WORDS)}</i>'
+                count += 2
+            sentences.append(words)
+        parts.append(f"<p>{'。'.join(sentences)}</p>")
+        count += 1
+        if rng.random() < 0.1:
+            parts.append(f'<h3>{rng.choice(WORDS)} {count}</h3>')
+            count += 1
+    parts.append('</article></body></html>')
+    return ''.join(parts)
+
+
+def generate_attribute_page(elements, rng):
+    """多属性页面：表单控件、链接和图片带大量name/type/data-*/aria-*属性"""
+    parts = ['<html><body><form id="big-form">']
+    for i in range(elements // 4):
+        data = ' '.join(f'data-{name}="{rng.choice(WORDS)}-{rng.randint(0, 99)}"'
+                        for name in ('id', 'role', 'track', 'group', 'state'))
+        parts.append(f'<label for="f{i}" aria-label="{rng.choice(WORDS)}">{rng.choice(WORDS)}</label>'
+                     f'<input id="f{i}" name="field{i}" type="{rng.choice(("text", "email", "number"))}" '
+                     f'placeholder="{rng.choice(WORDS)}" {data} aria-required="true">'
+                     f'<a href="/help/{i}" title="{rng.choice(WORDS)}" {data}>?</a>'
+                     f'<img src="/icons/{i % 50}.png" alt="{rng.choice(WORDS)}" width="16" height="16">')
+    parts.append('</form></body></html>')
+    return ''.join(parts)
+
+
+def generate_duplicate_class_page(elements, rng):
+    """重复class页面：少量class名反复出现，Class策略几乎都不唯一，最短唯一定位需要更多组合"""
+    classes = ('row', 'cell', 'item', 'btn', 'btn primary', 'card', 'card active')
+    parts = ['<html><body><div class="container">']
+    count = 0
+    while count < elements:
+        parts.append(f'<div class="{rng.choice(classes)}">')
+        for _ in range(rng.randint(2, 6)):
+            tag = rng.choice(('span', 'a', 'button', 'li', 'p'))
+            parts.append(f'<{tag} class="{rng.choice(classes)}">{rng.choice(WORDS)}</{tag}>')
+            count += 1
+        parts.append('</div>')
+        count += 1
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def generate_corpus(scale=1.0, seed=CORPUS_SEED):
+    """生成确定性的合成页面语料：页面名 -> HTML"""
+    elements = max(int(BASE_ELEMENTS * scale), 100)
+    rng = random.Random(seed)
+    return {
+        'wide': generate_wide_page(elements),
+        'deep': generate_deep_page(max(int(BASE_DEPTH * scale), 10)),
+        'text': generate_text_page(elements, rng),
+        'attributes': generate_attribute_page(elements, rng),
+        'duplicate_classes': generate_duplicate_class_page(elements, rng),
+        'mixed': generate_page(elements),
+    }
+
+
+def edited_page(html):
+    """在页面中部做一处小修改，用于测量增量比较"""
+    middle = html.find('<', len(html) // 2)
+    return html[:middle] + '<p class="inserted">插入</p>' + html[middle:]
+
+
+def time_stage(run, setup=None, repeat=DEFAULT_REPEAT):
+    """执行repeat次，返回各次耗时（秒）；setup的返回值作为run的参数，不计入耗时"""
+    runs = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(argument)
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def headless_stages(html, limits):
+    """无界面的各阶段：阶段名 -> (setup, run)"""
+    edited = edited_page(html)
+
+    def fresh_lxml():
+        # 节点表上缓存了源码偏移、子树哈希等，每次计时使用新的节点表
+        return parse_html(html, backend='lxml')
+
+    return {
+        'parse_bs4': (None, lambda _arg: parse_html(html, backend='bs4')),
+        'parse_lxml': (None, lambda _arg: parse_html(html, backend='lxml')),
+        'generate': (fresh_lxml, lambda scan: list(generate_xpath_rows(scan, limits=limits))),
+        'verify': (fresh_lxml, lambda scan: list(generate_xpath_rows(scan, verify=True, limits=limits))),
+        'locate': (fresh_lxml, lambda scan: list(generate_xpath_rows(scan, locate=True, limits=limits))),
+        'source_map': (fresh_lxml, lambda scan: get_source_offsets(scan, html)),
+        'diff': (lambda: (fresh_lxml(), parse_html(edited, backend='lxml')), lambda scans: diff_scans(*scans)),
+        'stream': (None, lambda _arg: list(stream_xpath_rows(io.BytesIO(html.encode('utf-8')), limits=limits,
+                                                               encoding='utf-8'))),
+    }
+
+
+def open_hidden_gui():
+    """在隐藏的Tk根窗口中创建界面，没有tkinter或显示环境时返回(None, 原因)"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    root.withdraw()
+    from xpath_gui_enhanced import XPathEnhancedGUI
+    app = XPathEnhancedGUI(root)
+    app.cache_var.set(False)
+    return app, None
+
+
+def gui_stages(app, html, limit):
+    """树形视图相关的界面阶段：阶段名 -> (setup, run)，每次setup重新解析，使各次从相同状态开始"""
+    root = app.root
+
+    def load():
+        scan = parse_html(html, backend='lxml')
+        app.scan = scan
+        app.soup = scan.soup
+        app.original_html = html
+        return scan
+
+    def build(_scan):
+        app.build_html_tree()
+        root.update_idletasks()
+
+    def generate(_scan):
+        app.element_limit_var.set(str(limit) if limit is not None else '全部')
+        app.generate_all_xpaths()
+        root.update_idletasks()
+
+    def load_original():
+        scan = load()
+        get_source_offsets(scan, html)
+        app.view_mode = 'original'
+        app.update_original_html_display()
+        # 从文档各处均匀取样，含最后一个元素
+        indexes = sorted({scan.tree_root + (scan.tree_end - 1 - scan.tree_root) * i // HIGHLIGHT_SAMPLES
+                          for i in range(HIGHLIGHT_SAMPLES + 1)})
+        return [scan.nodes[index] for index in indexes]
+
+    def highlight(elements):
+        for element in elements:
+            app.highlight_original_html(element)
+        root.update_idletasks()
+
+    return {
+        'build_html_tree': (load, build),
+        'generate_all_xpaths': (load, generate),
+        'highlight_original_html': (load_original, highlight),
+    }
+
+
+def current_commit():
+    """当前git提交，不在仓库中时返回None"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scale=1.0, repeat=DEFAULT_REPEAT, limit=DEFAULT_ELEMENT_LIMIT, pages=None, stages=None, gui=True,
+              log=None):
+    """运行基准测试，返回结果字典（可直接写入JSON）"""
+    corpus = generate_corpus(scale)
+    limits = make_limits(limit)
+    app, gui_error = open_hidden_gui() if gui else (None, '已禁用')
+    results = {}
+    page_info = {}
+    try:
+        for name, html in corpus.items():
+            if pages and name not in pages:
+                continue
+            scan = parse_html(html, backend='lxml')
+            page_info[name] = {'bytes': len(html.encode('utf-8')), 'elements': len(scan.nodes) - 1}
+            del scan
+            page_stages = dict(headless_stages(html, limits))
+            if app is not None:
+                page_stages.update(gui_stages(app, html, limit))
+            results[name] = {}
+            for stage, (setup, run) in page_stages.items():
+                if stages and stage not in stages:
+                    continue
+                runs = time_stage(run, setup, repeat)
+                results[name][stage] = {'seconds': min(runs), 'runs': runs}
+                if log:
+                    log(f"{name:18s} {stage:24s} {min(runs):8.3f}s")
+    finally:
+        if app is not None:
+            app.root.destroy()
+    return {
+        'version': RESULT_VERSION,
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': scale,
+        'repeat': repeat,
+        'limit': limit,
+        'gui': None if app is not None else gui_error,
+        'pages': page_info,
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """与基线结果比较，返回变慢超过阈值的阶段[(页面, 阶段, 基线耗时, 当前耗时)]
+
+    只比较两边都有的页面和阶段；规模或上限不同时结果不可比，抛出ValueError。
+    """
+    for key in ('scale', 'limit'):
+        if baseline.get(key) != current.get(key):
+            raise ValueError(f"基线的{key}为{baseline.get(key)}，当前为{current.get(key)}，结果不可比")
+    regressions = []
+    for page, stages in current['results'].items():
+        for stage, stats in stages.items():
+            old = baseline.get('results', {}).get(page, {}).get(stage)
+            if old is None:
+                continue
+            new_seconds = stats['seconds']
+            old_seconds = old['seconds']
+            if new_seconds > old_seconds * (1 + threshold) and new_seconds - old_seconds > min_delta:
+                regressions.append((page, stage, old_seconds, new_seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='XPath分析流水线基准测试套件')
+    parser.add_argument('-o', '--output', help='把结果写入JSON文件')
+    parser.add_argument('--baseline', help='与之前的JSON结果比较，变慢超过阈值时以非0退出')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'允许的变慢比例（默认{DEFAULT_THRESHOLD}，即{DEFAULT_THRESHOLD:.0%}%）')
+    parser.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA,
+                        help=f'小于该秒数的差异视为噪声（默认{DEFAULT_MIN_DELTA}）')
+    parser.add_argument('--scale', type=float, default=1.0, help=f'语料规模比例（1.0约{BASE_ELEMENTS}个元素/页面）')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='每个阶段重复次数，取最短耗时')
+    parser.add_argument('--limit', type=parse_limit, default=DEFAULT_ELEMENT_LIMIT,
+                        help=f'每个元素类型生成XPath的元素数，all表示不限（默认{DEFAULT_ELEMENT_LIMIT}）')
+    parser.add_argument('--page', action='append', help='只测指定页面（可重复）')
+    parser.add_argument('--stage', action='append', help='只测指定阶段（可重复）')
+    parser.add_argument('--no-gui', dest='gui', action='store_false', help='跳过需要Tk的阶段')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    result = run_suite(args.scale, args.repeat, args.limit, args.page, args.stage, args.gui,
+                       log=lambda line: print(line, file=sys.stderr))
+    if result['gui']:
+        print(f"跳过界面阶段: {result['gui']}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"已写入: {args.output}", file=sys.stderr)
+
+    if baseline is None:
+        return 0
+    try:
+        regressions = compare_results(baseline, result, args.threshold, args.min_delta)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    for page, stage, old_seconds, new_seconds in regressions:
+        print(f"变慢: {page} {stage} {old_seconds:.3f}s -> {new_seconds:.3f}s "
+              f"(+{new_seconds / old_seconds - 1:.0%})", file=sys.stderr)
+    if regressions:
+        return 1
+    print(f"与基线 {baseline.get('commit') or args.baseline} 相比没有超过 {args.threshold:.0%} 的变慢", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
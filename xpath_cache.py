@@ -0,0 +1,210 @@
+"""分析结果磁盘缓存 - 按内容哈希、解析后端和生成器版本保存节点表与XPath记录（SQLite，按大小LRU淘汰）
+
+缓存命中时由保存的节点表重建CachedDocumentScan，树形视图、详细信息、高亮和增量比较都不需要重新解析。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+
+from xpath_engine import DEFAULT_LIMITS, GENERATOR_VERSION, DocumentScan, get_element_description, limits_key
+from xpath_metrics import metrics
+from xpath_rules import active_rules, compiled_rules
+
+# 序列化格式版本，节点表或记录的保存方式变化时递增
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024  # 默认缓存上限（字节）
+# 保存到缓存的XPath记录字段（element等界面字段不保存）
+ROW_FIELDS = ('id', 'type', 'element_type', 'element_index', 'xpath', 'tag', 'match_count', 'hits_target')
+
+
+def default_cache_path():
+    """默认缓存文件位置，可用环境变量XPATH_CACHE_DIR指定目录"""
+    directory = os.environ.get('XPATH_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'xpath-parser')
+    return os.path.join(directory, 'analysis-cache.sqlite')
+
+
+def content_hash(content):
+    """HTML文本的内容哈希"""
+    if isinstance(content, str):
+        content = content.encode('utf-8', 'surrogatepass')
+    return hashlib.sha256(content).hexdigest()
+
+
+def cache_key(content, backend, parser, verify=True, locate=True, limits=None):
+    """缓存键：内容哈希 + 解析后端 + 生成器版本 + 当前规则 + 生成选项（含元素数量上限）"""
+    return ':'.join((content_hash(content), backend, str(parser), f"g{GENERATOR_VERSION}",
+                     f"f{CACHE_FORMAT_VERSION}", f"r{active_rules().fingerprint()}", 'v' if verify else '-',
+                     'l' if locate else '-', f"n{limits_key(limits or DEFAULT_LIMITS)}"))
+
+
+class CachedNode:
+    """缓存节点表中的元素占位对象，只用于按身份查节点下标"""
+
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+
+class CachedDocumentScan(DocumentScan):
+    """由缓存重建的节点表，属性和直接文本来自保存的表而不是解析树"""
+
+    def __init__(self, data, configs=None):
+        nodes = [CachedNode(index) for index in range(len(data['tags']))]
+        super().__init__(nodes[0])
+        self.nodes = nodes
+        self.backend = data['backend']
+        self.tags = data['tags']
+        self.parents = data['parents']
+        self.text_prefixes = data['text_prefixes']
+        self.text_lengths = data['text_lengths']
+        self.positions = data['positions']
+        self.same_tag_counts = data['same_tag_counts']
+        self.tree_root = data['tree_root']
+        self.tree_end = data['tree_end']
+        self.visited = data['visited']
+        self.attrs = data['attrs']
+        self.texts = data['texts']
+        offsets = data.get('source_offsets')
+        self.source_offsets = [tuple(span) if span else None for span in offsets] if offsets is not None else None
+
+        rules = compiled_rules(configs)
+        self.depths = [0] * len(self.nodes)
+        self.children = [[] for _ in self.nodes]
+        for index in range(1, len(self.nodes)):
+            parent = self.parents[index]
+            self.depths[index] = self.depths[parent] + 1
+            self.children[parent].append(index)
+            for key in rules.classify(self.tags[index], self.attrs[index].get):
+                self.buckets.setdefault(key, []).append(self.nodes[index])
+        self.index_of = {id(node): node.index for node in self.nodes}
+
+    def attrs_of(self, element):
+        return self.attrs[element.index]
+
+    def text_nodes_of(self, element):
+        return self.texts[element.index]
+
+
+def serialize_scan(scan):
+    """把节点表转换为可保存的字典"""
+    nodes = scan.nodes
+    return {
+        'backend': scan.backend,
+        'tags': scan.tags,
+        'parents': scan.parents,
+        'text_prefixes': scan.text_prefixes,
+        'text_lengths': scan.text_lengths,
+        'positions': scan.positions,
+        'same_tag_counts': scan.same_tag_counts,
+        'tree_root': scan.tree_root,
+        'tree_end': scan.tree_end,
+        'visited': scan.visited,
+        'attrs': [{}] + [scan.attrs_of(nodes[index]) for index in range(1, len(nodes))],
+        'texts': [[]] + [scan.text_nodes_of(nodes[index]) for index in range(1, len(nodes))],
+        'source_offsets': scan.source_offsets,
+    }
+
+
+def serialize_row(row, scan):
+    """把XPath记录转换为可保存的字典，元素以节点下标表示"""
+    record = {key: row[key] for key in ROW_FIELDS if key in row}
+    record['node'] = scan.index_of[id(row['element'])]
+    record['description'] = row.get('description') or get_element_description(row['element'], scan)
+    return record
+
+
+def restore_rows(records, scan):
+    """由保存的记录恢复XPath记录（element指向重建节点表中的元素）"""
+    rows = []
+    for record in records:
+        row = dict(record)
+        row['element'] = scan.nodes[row.pop('node')]
+        rows.append(row)
+    return rows
+
+
+class AnalysisCache:
+    """SQLite缓存；每次操作使用独立连接，可在多个线程和进程中同时使用"""
+
+    def __init__(self, path=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries ('
+                               'key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, '
+                               'last_used REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+
+    @contextmanager
+    def _connect(self):
+        """打开连接，正常结束时提交，最后关闭"""
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            yield connection
+            connection.commit()
+        finally:
+            connection.close()
+
+    def get(self, key):
+        """返回(节点表, XPath记录)，未命中时返回None"""
+        with self._connect() as connection:
+            row = connection.execute('SELECT data FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.count('cache_misses')
+                return None
+            connection.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+        payload = json.loads(zlib.decompress(row[0]).decode('utf-8'))
+        scan = CachedDocumentScan(payload['scan'])
+        self.hits += 1
+        metrics.count('cache_hits')
+        return scan, restore_rows(payload['rows'], scan)
+
+    def put(self, key, scan, rows):
+        """保存节点表和XPath记录，超出大小上限时淘汰最久未使用的条目"""
+        payload = {
+            'scan': serialize_scan(scan),
+            'rows': [row if 'node' in row else serialize_row(row, scan) for row in rows],
+        }
+        data = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        if len(data) > self.max_bytes:
+            return
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO entries (key, data, size, last_used) VALUES (?, ?, ?, ?)',
+                               (key, sqlite3.Binary(data), len(data), time.time()))
+            self._evict(connection)
+
+    def _evict(self, connection):
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in connection.execute('SELECT key, size FROM entries ORDER BY last_used').fetchall():
+            connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """清空缓存"""
+        with self._connect() as connection:
+            connection.execute('DELETE FROM entries')
+
+    def usage(self):
+        """返回(条目数, 总字节数)"""
+        with self._connect() as connection:
+            return connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+
+    def stats_text(self):
+        """命中/未命中计数的显示文本"""
+        return f"缓存命中 {self.hits} / 未命中 {self.misses}"
@@ -0,0 +1,415 @@
+"""XPath生成器命令行版本 - 支持目录/通配符批量处理与多进程并行"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from xpath_engine import (BACKENDS, DEFAULT_ELEMENT_LIMIT, make_limits, parse_limit, parse_type_limit, parse_html,
+                          generate_xpath_rows, get_element_description, count_by_element_type, write_text_report)
+from xpath_cache import DEFAULT_CACHE_SIZE, AnalysisCache, cache_key, default_cache_path, serialize_row
+from xpath_export import EXPORT_FORMATS, ExportFile, export_format, export_record
+from xpath_metrics import metrics
+from xpath_rules import RuleError, env_rule_paths, load_rules, use_rules
+from xpath_source import SourceFile
+from xpath_source_map import get_source_offsets
+from xpath_stream import stream_xpath_rows
+
+HTML_EXTENSIONS = ('.html', '.htm')
+PROFILE_LINES = 60  # --profile输出文本时显示的函数数
+
+_caches = {}  # 每个进程按缓存路径复用AnalysisCache
+_rule_files = None  # 本进程已加载的规则文件
+_worker_metrics = False  # 工作进程是否把运行统计随结果送回主进程
+
+
+def collect_input_files(inputs):
+    """展开输入参数：文件、目录（递归查找HTML文件）或通配符"""
+    files = []
+    seen = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            candidates = []
+            for dirpath, _dirnames, filenames in os.walk(pattern):
+                for filename in filenames:
+                    if filename.lower().endswith(HTML_EXTENSIONS):
+                        candidates.append(os.path.join(dirpath, filename))
+            candidates.sort()
+        elif os.path.isfile(pattern):
+            candidates = [pattern]
+        else:
+            candidates = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+        for path in candidates:
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
+
+
+def get_cache(cache):
+    """cache为(缓存文件路径, 大小上限)，返回本进程的AnalysisCache"""
+    if cache is None:
+        return None
+    if cache not in _caches:
+        _caches[cache] = AnalysisCache(*cache)
+    return _caches[cache]
+
+
+def apply_rule_files(rule_files):
+    """加载规则文件（加上环境变量中的）作为当前规则，同一进程中相同的文件列表只加载一次"""
+    global _rule_files
+    rule_files = tuple(rule_files or ())
+    if rule_files != _rule_files:
+        use_rules(load_rules(env_rule_paths() + list(rule_files)))
+        _rule_files = rule_files
+
+
+def _set_source_offsets(item, scan, spans):
+    """记录元素在源码中的字符偏移（源码中找不到时为None）"""
+    span = spans[scan.index_of[id(item['element'])]]
+    item['source_start'], item['source_end'] = span if span else (None, None)
+
+
+def analyze_file(path, parser='lxml', backend='bs4', verify=True, locate=True, cache=None, stream=False,
+                 limits=None, rule_files=(), offsets=False, sink=None):
+    """分析单个HTML文件，返回可序列化的结果（在工作进程中执行）
+
+    limits为元素数量上限（见xpath_engine.make_limits），默认每个类型最多8个元素。
+    cache为(缓存文件路径, 大小上限)时先查磁盘缓存，命中则不再解析；结果的cached表示是否命中。
+    stream为True时边读边解析，不把文件读入内存（不验证、不搜索最短唯一定位、不使用缓存）。
+    rule_files为附加的规则文件（见xpath_rules）。
+    offsets为True时每条记录带source_start/source_end（元素在源码中的字符偏移，流式模式下没有）。
+    sink不为None时每条记录生成后立即交给sink(记录)，不收集到结果的rows中，也不写入缓存
+    （缓存需要同时保留全部记录），用于把大量记录直接写出到导出文件。
+    """
+    try:
+        if rule_files:
+            apply_rule_files(rule_files)
+        rows = []
+        add = sink or rows.append
+        if stream:
+            for item in stream_xpath_rows(path, limits=limits):
+                del item['element']
+                add(item)
+            return {'file': path, 'rows': rows, 'stats': count_by_element_type(rows), 'error': None,
+                    'cached': False}
+
+        with SourceFile(path) as source:
+            store = get_cache(cache)
+            with metrics.stage('cache_lookup'):
+                key = cache_key(source.data, backend, parser, verify, locate, limits) if store else None
+                cached = store.get(key) if store else None
+            if not cached:
+                scan = parse_html(source, parser, backend)
+            content = source.text() if offsets else None
+        if cached:
+            scan, cached_rows = cached
+            spans = get_source_offsets(scan, content) if offsets else None
+            for item in cached_rows:
+                if spans:
+                    _set_source_offsets(item, scan, spans)
+                del item['element']
+                add(item)
+        else:
+            if sink:
+                store = None
+            records = []
+            spans = get_source_offsets(scan, content) if offsets else None
+            with metrics.stage('generate'):
+                for item in generate_xpath_rows(scan, verify=verify, locate=locate, limits=limits):
+                    item['description'] = get_element_description(item['element'], scan)
+                    if store:
+                        records.append(serialize_row(item, scan))
+                    if spans:
+                        _set_source_offsets(item, scan, spans)
+                    del item['element']
+                    add(item)
+            if store:
+                with metrics.stage('cache_store'):
+                    store.put(key, scan, records)
+        return {'file': path, 'rows': rows, 'stats': count_by_element_type(rows), 'error': None,
+                'cached': cached is not None}
+    except Exception as e:
+        return {'file': path, 'rows': [], 'stats': {}, 'error': str(e), 'cached': False}
+
+
+def _analyze_task(task):
+    """进程池任务入口"""
+    path, parser, backend, verify, locate, cache, stream, limits, rule_files, offsets = task
+    with metrics.stage('file'):
+        result = analyze_file(path, parser, backend, verify, locate, cache, stream, limits, rule_files, offsets)
+    metrics.count('files')
+    if _worker_metrics:
+        # 每个结果带回本任务的统计，由主进程合并
+        result['metrics'] = metrics.snapshot()
+        metrics.reset()
+    return result
+
+
+def _init_worker(collect_metrics):
+    """工作进程初始化：主进程启用了运行统计时，工作进程也记录并随结果送回"""
+    global _worker_metrics
+    _worker_metrics = collect_metrics
+    metrics.enable(collect_metrics)
+
+
+def iter_results(files, workers=1, chunksize=1, parser='lxml', backend='bs4', verify=True, locate=True,
+                 cache=None, stream=False, limits=None, rule_files=(), offsets=False):
+    """逐个产出分析结果，workers大于1时分发到进程池（结果顺序不保证）"""
+    tasks = [(path, parser, backend, verify, locate, cache, stream, limits, tuple(rule_files), offsets)
+             for path in files]
+    if workers <= 1 or len(files) <= 1:
+        for task in tasks:
+            yield _analyze_task(task)
+        return
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=(metrics.enabled,)) as pool:
+        for result in pool.imap_unordered(_analyze_task, tasks, chunksize=chunksize):
+            if 'metrics' in result:
+                metrics.merge(result.pop('metrics'))
+            yield result
+
+
+def result_output_path(path, out_dir, base_dir):
+    """计算单个输入对应的结果文件路径，保留相对目录结构"""
+    relative = os.path.relpath(os.path.abspath(path), base_dir)
+    stem, _ext = os.path.splitext(relative)
+    return os.path.join(out_dir, stem + '.xpaths.json')
+
+
+def write_result_file(result, output_path):
+    """写出单个输入的JSON结果文件"""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def write_jsonl_rows(f, result):
+    """把单个输入的XPath记录以JSONL格式追加到合并输出"""
+    for row in result['rows']:
+        record = {'file': result['file']}
+        record.update(row)
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='XPath生成器命令行版本')
+    parser.add_argument('inputs', nargs='+', help='HTML文件、目录或通配符（如 "pages/**/*.html"）')
+    parser.add_argument('-o', '--output', help='单个输入时导出文本结果到文件')
+    parser.add_argument('-c', '--copy', action='store_true', help='单个输入时复制所有XPath到剪贴板')
+    parser.add_argument('--out-dir', help='每个输入写出一个JSON结果文件到该目录')
+    parser.add_argument('--jsonl', help='把所有结果合并写入JSONL文件（每行一条XPath记录，"-"表示标准输出）')
+    parser.add_argument('--export', metavar='FILE',
+                        help='导出结构化结果（含描述、源码偏移、匹配数量），格式按扩展名：.jsonl、.csv、.parquet、.arrow；'
+                             '多个输入时合并写入并带file列')
+    parser.add_argument('--export-format', choices=sorted(EXPORT_FORMATS), help='指定--export的格式（默认按扩展名）')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='工作进程数（默认CPU核数）')
+    parser.add_argument('--chunksize', type=int, default=8, help='每次分发给工作进程的文件数')
+    parser.add_argument('--parser', default='lxml', choices=['lxml', 'html.parser'], help='BeautifulSoup解析器')
+    parser.add_argument('--backend', default='bs4', choices=BACKENDS,
+                        help='解析后端：bs4为BeautifulSoup，lxml直接使用lxml元素（结果相同，速度更快）')
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help='不在文档上执行XPath验证匹配数量和唯一性')
+    parser.add_argument('--no-locate', dest='locate', action='store_false',
+                        help='不为每个元素搜索"最短唯一"定位')
+    parser.add_argument('--cache', default=None, help=f'分析结果缓存文件（默认 {default_cache_path()}）')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='缓存大小上限（MB），超出时淘汰最久未使用的结果')
+    parser.add_argument('--no-cache', action='store_true', help='不读取也不写入分析结果缓存')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式解析超大文件：不建立解析树，内存约为文件大小加每个元素少量字节，记录在文档结束后输出；'
+                             '只有配合--export时生成的记录才不占内存（不验证、不搜索最短唯一定位、不使用缓存）')
+    parser.add_argument('--limit', type=parse_limit, default=DEFAULT_ELEMENT_LIMIT,
+                        help=f'每个元素类型最多生成XPath的元素数，all表示不限（默认{DEFAULT_ELEMENT_LIMIT}）')
+    parser.add_argument('--type-limit', type=parse_type_limit, action='append', default=[], metavar='TAG=N',
+                        help='单独指定某个标签或类型名的上限（可重复，如 a=100、链接=all）')
+    parser.add_argument('--total-limit', type=parse_limit, default=None,
+                        help='所有类型合计的元素数上限，按类型顺序分配（默认不限）')
+    parser.add_argument('--rules', action='append', default=[], metavar='FILE',
+                        help='加载JSON规则文件，添加元素类型和XPath策略（可重复）')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='记录各阶段耗时和计数，以JSON写入文件（"-"表示标准错误输出）；多进程时耗时为各进程之和')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='用cProfile分析运行过程（单进程）：.txt或"-"输出按累计耗时排序的文本，其他写入pstats文件')
+    return parser
+
+
+def write_profile(profiler, target):
+    """输出cProfile结果：文本（按累计耗时排序的前PROFILE_LINES行）或pstats二进制文件"""
+    import pstats
+    if target == '-' or target.endswith('.txt'):
+        stream = sys.stderr if target == '-' else open(target, 'w', encoding='utf-8')
+        try:
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        finally:
+            if stream is not sys.stderr:
+                stream.close()
+    else:
+        profiler.dump_stats(target)
+
+
+def write_metrics(target, **extra):
+    """把运行统计以JSON写入文件，"-"表示标准错误输出"""
+    text = metrics.to_json(**extra)
+    if target == '-':
+        print(text, file=sys.stderr)
+    else:
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def run_single(result, args):
+    """单文件模式：输出文本结果，可选导出和复制"""
+    rows = result['rows']
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            write_text_report(f, rows)
+        print(f"已导出到: {args.output}")
+    elif not args.export:
+        write_text_report(sys.stdout, rows)
+    if args.export:
+        with ExportFile(args.export, args.export_format) as export:
+            export.write_rows(rows)
+        print(f"已导出 {export.count} 条记录到: {args.export}")
+
+    if args.copy:
+        import pyperclip
+        pyperclip.copy('\n'.join(item['xpath'] for item in rows))
+        print(f"已复制 {len(rows)} 个XPath到剪贴板")
+
+
+def run_export(path, args, cache, limits):
+    """单个输入只导出时：每条记录生成后直接写入导出文件，不在内存中保留"""
+    try:
+        with ExportFile(args.export, args.export_format) as export:
+            result = analyze_file(path, args.parser, args.backend, args.verify, args.locate, cache, args.stream,
+                                  limits, args.rules, True, lambda item: export.write(export_record(item)))
+    except OSError as e:
+        result = {'error': str(e), 'cached': False}
+    if result['error']:
+        print(f"错误: {path}: {result['error']}", file=sys.stderr)
+        return 1
+    if result['cached']:
+        print("使用缓存的分析结果", file=sys.stderr)
+    print(f"已导出 {export.count} 条记录到: {args.export}")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not (args.metrics or args.profile):
+        return run(parser, args)
+
+    metrics.enable()
+    profiler = None
+    if args.profile:
+        import cProfile
+        # cProfile只能分析当前进程
+        args.workers = 1
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        return run(parser, args)
+    finally:
+        wall = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            write_profile(profiler, args.profile)
+        if args.metrics:
+            write_metrics(args.metrics, wall_seconds=wall, workers=args.workers)
+
+
+def run(parser, args):
+    """按命令行参数执行分析"""
+    files = collect_input_files(args.inputs)
+    if not files:
+        parser.error('没有找到HTML文件')
+
+    batch_mode = bool(args.out_dir or args.jsonl) or bool(args.export and len(files) > 1)
+    if not batch_mode and len(files) > 1:
+        parser.error('多个输入时请使用 --out-dir 或 --jsonl 指定输出方式')
+    if batch_mode and (args.output or args.copy):
+        parser.error('-o/-c 只能用于单个输入的文本输出')
+
+    cache = None if args.no_cache or args.stream else (args.cache or default_cache_path(),
+                                                       args.cache_size * 1024 * 1024)
+    limits = make_limits(args.limit, dict(args.type_limit), args.total_limit)
+    try:
+        apply_rule_files(args.rules)
+    except (OSError, RuleError, ImportError, AttributeError) as e:
+        parser.error(f'规则加载失败: {e}')
+    if args.export:
+        try:
+            export_format(args.export, args.export_format)
+        except (ValueError, ImportError) as e:
+            parser.error(str(e))
+    if args.export and not (batch_mode or args.output or args.copy):
+        return run_export(files[0], args, cache, limits)
+    if not batch_mode:
+        result = analyze_file(files[0], args.parser, args.backend, args.verify, args.locate, cache, args.stream,
+                              limits, args.rules, bool(args.export))
+        if result['error']:
+            print(f"错误: {files[0]}: {result['error']}", file=sys.stderr)
+            return 1
+        if result.pop('cached'):
+            print("使用缓存的分析结果", file=sys.stderr)
+        run_single(result, args)
+        return 0
+
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+    jsonl_file = None
+    if args.jsonl == '-':
+        jsonl_file = sys.stdout
+    elif args.jsonl:
+        jsonl_file = open(args.jsonl, 'w', encoding='utf-8')
+    export = None
+    if args.export:
+        try:
+            export = ExportFile(args.export, args.export_format, with_file=True)
+        except (OSError, ImportError) as e:
+            if jsonl_file and jsonl_file is not sys.stdout:
+                jsonl_file.close()
+            parser.error(f'导出失败: {e}')
+
+    failed = 0
+    total_rows = 0
+    hits = 0
+    try:
+        for done, result in enumerate(iter_results(files, args.workers, args.chunksize, args.parser, args.backend,
+                                                             args.verify, args.locate, cache, args.stream,
+                                                             limits, args.rules, bool(args.export)), 1):
+            if result.pop('cached'):
+                hits += 1
+            if result['error']:
+                failed += 1
+                print(f"错误: {result['file']}: {result['error']}", file=sys.stderr)
+                continue
+            total_rows += len(result['rows'])
+            if args.out_dir:
+                write_result_file(result, result_output_path(result['file'], args.out_dir, base_dir))
+            if jsonl_file:
+                write_jsonl_rows(jsonl_file, result)
+            if export:
+                export.write_rows(result['rows'], file=result['file'])
+            if done % 100 == 0:
+                print(f"已处理 {done}/{len(files)} 个文件", file=sys.stderr)
+    finally:
+        if jsonl_file and jsonl_file is not sys.stdout:
+            jsonl_file.close()
+        if export:
+            export.close()
+
+    print(f"完成: {len(files) - failed}/{len(files)} 个文件, {total_rows} 个XPath", file=sys.stderr)
+    if cache:
+        print(f"缓存命中 {hits} / 未命中 {len(files) - hits}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""子树哈希与文档比较 - 重新分析同一页面时只更新变化的子树"""
+from xpath_engine import LOCATOR_STRATEGY, anchored_position_path, position_path
+
+# 子节点对齐时向后查找相同子树/相同标签的最大距离
+MATCH_LOOKAHEAD = 20
+
+
+def compute_subtree_hashes(scan):
+    """自底向上计算每个节点的标签哈希（标签+属性）和子树哈希（标签、文本和子节点哈希），缓存在节点表上"""
+    if scan.subtree_hashes is not None:
+        return scan.label_hashes, scan.subtree_hashes
+
+    nodes = scan.nodes
+    tags = scan.tags
+    children = scan.children
+    count = len(nodes)
+    labels = [0] * count
+    hashes = [0] * count
+    for index in range(count - 1, 0, -1):
+        element = nodes[index]
+        attrs = scan.attrs_of(element)
+        label = hash((tags[index], tuple(sorted(
+            (key, ' '.join(value) if isinstance(value, list) else value) for key, value in attrs.items()))))
+        labels[index] = label
+        hashes[index] = hash((label, tuple(scan.text_nodes_of(element)),
+                              tuple(hashes[child] for child in children[index])))
+    hashes[0] = hash(tuple(hashes[child] for child in children[0]))
+
+    scan.label_hashes = labels
+    scan.subtree_hashes = hashes
+    return labels, hashes
+
+
+class TreeDiff:
+    """新旧文档的节点对应关系
+
+    old_of[i]: 新文档节点i对应的旧文档节点下标，没有对应（新增）时为-1
+    unchanged[i]: 节点i的整个子树与旧文档相同
+    """
+
+    def __init__(self, old_scan, new_scan):
+        self.old_scan = old_scan
+        self.new_scan = new_scan
+        self.old_of = [-1] * len(new_scan.nodes)
+        self.unchanged = [False] * len(new_scan.nodes)
+        self.changed = 0  # 子树有变化但标签相同、原地更新的节点数
+
+    def _subtree_size(self, scan, index):
+        end = index + 1
+        depth = scan.depths[index]
+        depths = scan.depths
+        total = len(depths)
+        while end < total and depths[end] > depth:
+            end += 1
+        return end - index
+
+    def _pair_unchanged(self, old, new):
+        """整个子树相同：先序编号下子树是连续区间，逐个对应"""
+        size = self._subtree_size(self.new_scan, new)
+        old_of = self.old_of
+        unchanged = self.unchanged
+        for offset in range(size):
+            old_of[new + offset] = old + offset
+            unchanged[new + offset] = True
+
+    def _align_children(self, old, new, old_labels, old_hashes, new_labels, new_hashes):
+        """对齐两个节点的子元素，返回[(旧下标, 新下标)]，保持文档顺序"""
+        old_children = self.old_scan.children[old]
+        new_children = self.new_scan.children[new]
+        pairs = []
+
+        # 相同的前缀和后缀（编辑通常是局部的）
+        head = 0
+        limit = min(len(old_children), len(new_children))
+        while head < limit and old_hashes[old_children[head]] == new_hashes[new_children[head]]:
+            pairs.append((old_children[head], new_children[head]))
+            head += 1
+        tail = 0
+        while (tail < limit - head
+               and old_hashes[old_children[-1 - tail]] == new_hashes[new_children[-1 - tail]]):
+            tail += 1
+
+        # 中间部分：优先找相同子树，其次找相同标签（原地更新）
+        old_middle = old_children[head:len(old_children) - tail]
+        pointer = 0
+        for child in new_children[head:len(new_children) - tail]:
+            window = range(pointer, min(pointer + MATCH_LOOKAHEAD, len(old_middle)))
+            match = next((k for k in window if old_hashes[old_middle[k]] == new_hashes[child]), None)
+            if match is None:
+                match = next((k for k in window if old_labels[old_middle[k]] == new_labels[child]), None)
+            if match is not None:
+                pairs.append((old_middle[match], child))
+                pointer = match + 1
+
+        for offset in range(tail, 0, -1):
+            pairs.append((old_children[-offset], new_children[-offset]))
+        return pairs
+
+    def compute(self):
+        old_labels, old_hashes = compute_subtree_hashes(self.old_scan)
+        new_labels, new_hashes = compute_subtree_hashes(self.new_scan)
+        old_root = self.old_scan.tree_root
+        new_root = self.new_scan.tree_root
+        if old_labels[old_root] != new_labels[new_root]:
+            return self
+
+        stack = [(old_root, new_root)]
+        while stack:
+            old, new = stack.pop()
+            if old_hashes[old] == new_hashes[new]:
+                self._pair_unchanged(old, new)
+                continue
+            self.old_of[new] = old
+            self.changed += 1
+            stack.extend(self._align_children(old, new, old_labels, old_hashes, new_labels, new_hashes))
+        return self
+
+    def root_matched(self):
+        """树形视图的根节点是否有对应（否则需要整体重建）"""
+        return self.old_of[self.new_scan.tree_root] >= 0
+
+
+def diff_scans(old_scan, new_scan):
+    """比较两次分析得到的节点表"""
+    return TreeDiff(old_scan, new_scan).compute()
+
+
+def reusable_xpaths(diff, old_rows):
+    """上次生成的XPath中仍然有效的部分：元素id() -> XPath字典
+
+    子树未变、同标签兄弟位置、位置路径和锚点位置路径（取决于整个文档中祖先id是否唯一）都不变的元素，
+    模板策略的结果与上次相同；最短唯一定位依赖整个文档，不复用。
+    """
+    old_scan = diff.old_scan
+    new_scan = diff.new_scan
+    old_xpaths = {}
+    for row in old_rows:
+        if row['type'] != LOCATOR_STRATEGY:
+            old_xpaths.setdefault(id(row['element']), {})[row['type']] = row['xpath']
+
+    reuse = {}
+    for index, old in enumerate(diff.old_of):
+        if old < 0 or not diff.unchanged[index]:
+            continue
+        xpaths = old_xpaths.get(id(old_scan.nodes[old]))
+        if (xpaths is not None and old_scan.positions[old] == new_scan.positions[index]
+                and old_scan.same_tag_counts[old] == new_scan.same_tag_counts[index]
+                and position_path(old_scan, old) == position_path(new_scan, index)
+                and anchored_position_path(old_scan, old) == anchored_position_path(new_scan, index)):
+            reuse[id(new_scan.nodes[index])] = xpaths
+    return reuse
@@ -0,0 +1,724 @@
+"""XPath分析引擎 - 不依赖GUI的文档遍历与XPath生成逻辑"""
+from bs4 import BeautifulSoup, Tag
+from bs4.element import CData, PreformattedString
+
+from xpath_metrics import metrics
+from xpath_rules import ANY_TAG, active_rules, compiled_rules, rule_key
+from xpath_source import SourceFile
+
+# 内置的元素类型，可用xpath_rules中的规则文件或入口点增加
+ELEMENT_CONFIGS = [
+    {'tag': 'a', 'name': '链接'},
+    {'tag': 'button', 'name': '按钮'},
+    {'tag': 'input', 'name': '输入框'},
+    {'tag': 'form', 'name': '表单'},
+    {'tag': 'div', 'name': '容器'},
+    {'tag': 'span', 'name': '文本'},
+    {'tag': 'img', 'name': '图片'},
+    {'tag': 'table', 'name': '表格'},
+    {'tag': 'select', 'name': '下拉框'},
+    {'tag': 'textarea', 'name': '文本域'},
+    {'tag': 'h1', 'name': '标题'},
+    {'tag': 'h2', 'name': '标题'},
+    {'tag': 'h3', 'name': '标题'},
+    {'tag': 'p', 'name': '段落'},
+    {'tag': 'ul', 'name': '列表'},
+    {'tag': 'li', 'name': '列表项'}
+]
+
+# 文本表中每个元素保存的文本前缀长度上限（详细信息最多显示200个字符）
+TEXT_PREFIX_LIMIT = 200
+
+# 遍历时每访问这么多节点回调一次进度
+PROGRESS_INTERVAL = 5000
+
+# 默认每个元素类型最多生成XPath的元素数
+DEFAULT_ELEMENT_LIMIT = 8
+# 表示"不限"的上限写法
+UNLIMITED_NAMES = ('', 'all', 'none', '全部', '不限')
+
+
+def make_limits(per_type=DEFAULT_ELEMENT_LIMIT, types=None, total=None):
+    """元素数量上限
+
+    per_type为每个类型的上限，types为标签或类型名 -> 该类型的上限（优先于per_type），
+    total为所有类型合计的上限（按配置顺序分配）；None表示不限。
+    """
+    return {'per_type': per_type, 'types': dict(types or {}), 'total': total}
+
+
+DEFAULT_LIMITS = make_limits()
+UNLIMITED = make_limits(None)
+
+
+def parse_limit(text):
+    """解析上限文本：非负整数，或"all"/"全部"等表示不限（返回None）"""
+    text = str(text).strip()
+    if text.lower() in UNLIMITED_NAMES:
+        return None
+    limit = int(text)
+    if limit < 0:
+        raise ValueError(f"上限不能为负数: {text}")
+    return limit
+
+
+def parse_type_limit(text):
+    """解析"标签或类型名=上限"，返回(键, 上限)"""
+    key, separator, value = text.partition('=')
+    if not separator or not key.strip():
+        raise ValueError(f"类型上限格式应为 标签=数量: {text}")
+    return key.strip(), parse_limit(value)
+
+
+def type_limit(config, limits):
+    """元素类型的上限，None表示不限"""
+    types = limits.get('types') or {}
+    for key in (config['tag'], config['name']):
+        if key in types:
+            return types[key]
+    return limits.get('per_type')
+
+
+def limits_key(limits):
+    """上限的文本表示（用于缓存键和显示）"""
+    def text(limit):
+        return 'all' if limit is None else str(limit)
+    parts = [text(limits.get('per_type'))]
+    parts += [f"{key}={text(limit)}" for key, limit in sorted((limits.get('types') or {}).items())]
+    if limits.get('total') is not None:
+        parts.append(f"total={limits['total']}")
+    return ','.join(parts)
+
+
+def apply_limits(configs, limits, elements_of):
+    """按配置顺序产出(配置, 截取后的元素列表)，elements_of(配置)返回该类型的全部候选元素
+
+    elements_of在产出该配置时才调用，调用方可以在所需元素收齐后再取下一项。
+    """
+    remaining = limits.get('total')
+    for config in configs:
+        elements = elements_of(config)
+        limit = type_limit(config, limits)
+        if limit is not None:
+            elements = elements[:limit]
+        if remaining is not None:
+            elements = elements[:remaining]
+            remaining -= len(elements)
+        yield config, elements
+
+
+class AnalysisCancelled(Exception):
+    """分析被取消（由进度回调抛出）"""
+
+
+class DocumentScan:
+    """单次遍历文档得到的节点表，同时供树形视图和XPath生成使用
+
+    节点表与解析后端无关：BeautifulSoup后端的元素是Tag，lxml后端的元素是lxml元素，
+    标签名、属性、父节点、文本和同标签兄弟位置都通过这里的方法读取。
+    """
+
+    backend = 'bs4'
+
+    def __init__(self, soup):
+        self.soup = soup
+        self.nodes = []  # 按文档顺序（先序）排列的元素，下标0为文档对象本身
+        self.tags = []  # 每个节点的标签名，文档对象为'[document]'
+        self.parents = []  # 父节点下标，文档对象为-1
+        self.depths = []  # 节点深度，文档对象为0
+        self.children = []  # 每个节点的子元素下标列表
+        self.index_of = {}  # 元素id() -> 节点下标
+        self.text_prefixes = []  # 每个元素get_text(strip=True)的前缀（最多TEXT_PREFIX_LIMIT个字符）
+        self.text_lengths = []  # 每个元素get_text(strip=True)的完整长度
+        self.positions = []  # 在父节点同标签子元素中的位置（从1开始）
+        self.same_tag_counts = []  # 父节点下同标签子元素的数量
+        self.buckets = {}  # 元素类型的分桶键（普通类型为标签名，见xpath_rules.rule_key） -> 元素列表（文档顺序）
+        self.tree_root = 0  # 树形视图的根节点下标（body，其次html，否则文档本身）
+        self.tree_end = 0  # 树形视图子树的结束下标（不含）
+        self.visited = 0  # 遍历过程中访问的节点数（含文本、注释）
+        self.passes = 0  # 文档遍历次数
+        self.locator_index = None  # 最短唯一定位索引，首次使用时由xpath_locator建立
+        self.source_offsets = None  # 每个元素在原始HTML中的(起始, 结束)偏移，由xpath_source_map建立
+        self.position_paths = None  # 每个元素的位置路径，首次使用时按需填入（见position_path）
+        self.id_counts = None  # (标签, id) -> 出现次数，首次使用时统计（见id_counts）
+        self.label_hashes = None  # 每个节点的标签+属性哈希，由xpath_diff计算
+        self.subtree_hashes = None  # 每个节点的子树哈希，由xpath_diff计算
+
+    def tree_range(self):
+        """树形视图对应的节点下标范围"""
+        return range(self.tree_root, self.tree_end)
+
+    def tree_node_id(self, index):
+        """树形视图中节点的ID，按树内先序编号，与是否已插入树无关"""
+        return f"{self.tags[index]}_{index - self.tree_root}"
+
+    def tree_index(self, element):
+        """元素在树形视图范围内的下标，不在树中时返回None"""
+        index = self.index_of.get(id(element))
+        if index is None or not self.tree_root <= index < self.tree_end:
+            return None
+        return index
+
+    def tag_of(self, element):
+        """元素标签名"""
+        return self.tags[self.index_of[id(element)]]
+
+    def attrs_of(self, element):
+        """元素属性字典，多值属性（如class）为列表"""
+        return element.attrs
+
+    def text_nodes_of(self, element):
+        """元素的直接文本子节点（对应XPath的text()），不含注释等特殊字符串"""
+        return [str(child) for child in element.contents
+                if isinstance(child, str) and (not isinstance(child, PreformattedString) or isinstance(child, CData))]
+
+    def text_of(self, element):
+        """返回元素的文本前缀和完整文本长度，等价于get_text(strip=True)但不再遍历子树"""
+        index = self.index_of[id(element)]
+        return self.text_prefixes[index], self.text_lengths[index]
+
+    def position_path(self, element):
+        """元素的位置路径（见position_path）"""
+        return position_path(self, self.index_of[id(element)])
+
+    def anchored_position_path(self, element):
+        """元素以id唯一的祖先为锚点的位置路径（见anchored_position_path）"""
+        return anchored_position_path(self, self.index_of[id(element)])
+
+
+def id_anchor(tag, element_id):
+    """以祖先元素id开头的路径前缀，id为空或含单引号（无法写成XPath字符串）时返回None"""
+    if not element_id or "'" in element_id:
+        return None
+    return f"//{tag}[@id='{element_id}']"
+
+
+def id_counts(scan):
+    """每个(标签, id)在文档中出现的次数，首次使用时遍历节点表统计一次，缓存在scan.id_counts中"""
+    counts = scan.id_counts
+    if counts is None:
+        counts = scan.id_counts = {}
+        nodes = scan.nodes
+        tags = scan.tags
+        for index in range(1, len(nodes)):
+            element_id = scan.attrs_of(nodes[index]).get('id')
+            if element_id:
+                key = (tags[index], element_id)
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def position_path(scan, index):
+    """由同标签兄弟位置组成的绝对路径，如 /html[1]/body[1]/div[3]/p[1]
+
+    每一步都带位置，所以只需要位置本身（流式分析时元素开始即可确定）。各节点的路径缓存在
+    scan.position_paths中，子元素在父元素的路径后追加一步，祖先路径只生成一次，每个元素的开销与深度成正比。
+    """
+    paths = scan.position_paths
+    if paths is None:
+        paths = scan.position_paths = [None] * len(scan.nodes)
+    parents = scan.parents
+    chain = []
+    node = index
+    while node > 0 and paths[node] is None:
+        chain.append(node)
+        node = parents[node]
+    tags = scan.tags
+    positions = scan.positions
+    for node in reversed(chain):
+        step = f"{tags[node]}[{positions[node]}]"
+        parent = parents[node]
+        paths[node] = f"{paths[parent]}/{step}" if parent > 0 else '/' + step
+    return paths[index]
+
+
+def anchored_position_path(scan, index):
+    """从最近的锚点祖先开始的位置路径，如 //div[@id='main']/ul[1]/li[3]；没有锚点祖先时返回None
+
+    锚点祖先的(标签, id)在文档中只出现一次；id重复的祖先会匹配多个元素，跳过继续向上查找。
+    """
+    counts = id_counts(scan)
+    path = position_path(scan, index)
+    tags = scan.tags
+    parents = scan.parents
+    node = parents[index]
+    while node > 0:
+        element_id = scan.attrs_of(scan.nodes[node]).get('id')
+        if element_id and counts.get((tags[node], element_id)) == 1:
+            anchor = id_anchor(tags[node], element_id)
+            if anchor:
+                return anchor + path[len(position_path(scan, node)):]
+        node = parents[node]
+    return None
+
+
+def _append_text(acc, key, text):
+    """把文本追加到累积结果，只保留有限长度的前缀"""
+    entry = acc.get(key)
+    if entry is None:
+        acc[key] = [text[:TEXT_PREFIX_LIMIT], len(text)]
+        return
+    prefix = entry[0]
+    if len(prefix) < TEXT_PREFIX_LIMIT:
+        entry[0] = prefix + text[:TEXT_PREFIX_LIMIT - len(prefix)]
+    entry[1] += len(text)
+
+
+def _aggregate_texts(scan, parts, own_sets):
+    """自底向上汇总每个元素的文本
+
+    get_text只收集类型属于元素interesting_string_types的字符串（例如script的文本
+    不计入外层div），所以按不同的类型集合分别累积，每个元素只取自己的那一份。
+    """
+    count = len(scan.nodes)
+    string_sets = set(own_sets)
+    prefixes = [''] * count
+    lengths = [0] * count
+    pending = [None] * count
+    keys_by_type = {}
+    for index in range(count - 1, -1, -1):
+        acc = {}
+        for part in parts[index]:
+            if part.__class__ is int:
+                child_acc = pending[part]
+                pending[part] = None
+                if child_acc:
+                    for key, (prefix, length) in child_acc.items():
+                        entry = acc.get(key)
+                        if entry is None:
+                            acc[key] = [prefix, length]
+                        else:
+                            if len(entry[0]) < TEXT_PREFIX_LIMIT:
+                                entry[0] += prefix[:TEXT_PREFIX_LIMIT - len(entry[0])]
+                            entry[1] += length
+            else:
+                string_type, text = part
+                keys = keys_by_type.get(string_type)
+                if keys is None:
+                    keys = keys_by_type[string_type] = [key for key in string_sets if string_type in key]
+                for key in keys:
+                    _append_text(acc, key, text)
+        parts[index] = None
+        pending[index] = acc
+
+        own = acc.get(own_sets[index])
+        if own:
+            prefixes[index], lengths[index] = own
+    scan.text_prefixes = prefixes
+    scan.text_lengths = lengths
+
+
+def _string_set(types):
+    """把interesting_string_types统一成frozenset"""
+    if isinstance(types, type):
+        return frozenset((types,))
+    return frozenset(types)
+
+
+def _compute_sibling_positions(scan):
+    """按子元素列表计算每个元素在同标签兄弟中的位置"""
+    tags = scan.tags
+    count = len(tags)
+    positions = [1] * count
+    same_tag_counts = [1] * count
+    for child_list in scan.children:
+        if len(child_list) < 2:
+            continue
+        seen = {}
+        for child in child_list:
+            tag = tags[child]
+            position = seen.get(tag, 0) + 1
+            seen[tag] = position
+            positions[child] = position
+        for child in child_list:
+            same_tag_counts[child] = seen[tags[child]]
+    scan.positions = positions
+    scan.same_tag_counts = same_tag_counts
+
+
+def finish_scan(scan, parts, own_sets, body_index, html_index):
+    """遍历结束后的公共处理：文本汇总、兄弟位置和树形视图范围"""
+    scan.passes = 1
+    _aggregate_texts(scan, parts, own_sets)
+    _compute_sibling_positions(scan)
+
+    # 从body开始构建树，如果没有body，从html开始
+    if body_index is not None:
+        root = body_index
+    elif html_index is not None:
+        root = html_index
+    else:
+        root = 0
+    depths = scan.depths
+    end = root + 1
+    root_depth = depths[root]
+    while end < len(depths) and depths[end] > root_depth:
+        end += 1
+    scan.tree_root = root
+    scan.tree_end = end
+    return scan
+
+
+def scan_document(soup, configs=None, progress=None):
+    """一次遍历文档：记录先序节点表，并按元素类型规则把候选元素分桶
+
+    configs为元素类型列表，None表示当前规则（见xpath_rules.active_rules）；
+    progress(visited)每访问PROGRESS_INTERVAL个节点调用一次，可抛出AnalysisCancelled中止遍历。
+    """
+    scan = DocumentScan(soup)
+    rules = compiled_rules(configs)
+    dispatch = rules.dispatch
+    has_conditions = rules.has_conditions
+    nodes = scan.nodes
+    tags = scan.tags
+    parents = scan.parents
+    depths = scan.depths
+    children = scan.children
+    buckets = scan.buckets
+    index_of = scan.index_of
+    index_of[id(soup)] = 0
+    # parts[i]: 元素i的直接内容，子元素记为下标，文本记为(类型, 去除空白后的文本)
+    parts = [[]]
+    # own_sets[i]: 元素i的get_text收集的字符串类型集合
+    own_sets = [_string_set(soup.interesting_string_types)]
+
+    nodes.append(soup)
+    tags.append(soup.name)
+    parents.append(-1)
+    depths.append(0)
+    children.append([])
+
+    body_index = html_index = None
+    visited = 0
+    for node in soup.descendants:
+        visited += 1
+        if progress is not None and visited % PROGRESS_INTERVAL == 0:
+            progress(visited)
+        if not isinstance(node, Tag):
+            # 注释、doctype等不参与get_text
+            if isinstance(node, PreformattedString) and not isinstance(node, CData):
+                continue
+            text = node.strip()
+            if text:
+                parts[index_of[id(node.parent)]].append((node.__class__, text))
+            continue
+
+        parent_index = index_of[id(node.parent)]
+        index = len(nodes)
+        index_of[id(node)] = index
+        name = node.name
+        nodes.append(node)
+        tags.append(name)
+        parents.append(parent_index)
+        depths.append(depths[parent_index] + 1)
+        children.append([])
+        children[parent_index].append(index)
+        parts.append([])
+        parts[parent_index].append(index)
+        own_sets.append(_string_set(node.interesting_string_types))
+
+        keys = dispatch.get(name)
+        if keys:
+            for key in keys:
+                buckets.setdefault(key, []).append(node)
+        if has_conditions:
+            for key in rules.match(name, node.attrs.get):
+                buckets.setdefault(key, []).append(node)
+        if name == 'body' and body_index is None:
+            body_index = index
+        elif name == 'html' and html_index is None:
+            html_index = index
+
+    scan.visited = visited
+    return finish_scan(scan, parts, own_sets, body_index, html_index)
+
+
+BACKENDS = ('bs4', 'lxml')
+
+# XPath生成器版本，生成规则变化时递增（缓存按版本区分）
+GENERATOR_VERSION = 3
+
+# 最短唯一定位在XPath记录中的类型名
+LOCATOR_STRATEGY = '最短唯一'
+
+
+def parse_html(content, parser='lxml', backend='bs4', progress=None):
+    """解析HTML文本并完成一次文档遍历
+
+    backend为'bs4'时用BeautifulSoup（parser指定其解析器），为'lxml'时直接使用lxml元素，
+    两者对同一文档生成相同的结果。content可以是文本或SourceFile（lxml后端直接从内存映射解析）。
+    """
+    with metrics.stage('parse'):
+        if backend == 'lxml':
+            from xpath_lxml_backend import parse_lxml_document
+            scan = parse_lxml_document(content, progress=progress)
+        else:
+            if isinstance(content, SourceFile):
+                content = content.text()
+            soup = BeautifulSoup(content, parser)
+            scan = scan_document(soup, progress=progress)
+    metrics.count('nodes_visited', scan.visited)
+    return scan
+
+
+def element_text(element, scan=None):
+    """获取元素文本前缀和完整长度，有遍历结果时直接查文本表"""
+    if scan is not None:
+        return scan.text_of(element)
+    text = element.get_text(strip=True)
+    return text[:TEXT_PREFIX_LIMIT], len(text)
+
+
+def get_element_description(element, scan=None):
+    """获取元素描述"""
+    attrs = scan.attrs_of(element) if scan is not None else element.attrs
+    name = scan.tag_of(element) if scan is not None else element.name
+    desc_parts = []
+    
+    # ID属性
+    if attrs.get('id'):
+        desc_parts.append(f"id='{attrs.get('id')}'")
+        
+    # Class属性
+    if attrs.get('class'):
+        classes = ' '.join(attrs.get('class'))
+        desc_parts.append(f"class='{classes}'")
+        
+    # 文本内容
+    text, length = element_text(element, scan)
+    if text and length <= 30:
+        desc_parts.append(f"文本='{text}'")
+        
+    # 特定属性
+    if name == 'a' and attrs.get('href'):
+        href = attrs.get('href')
+        if len(href) <= 50:
+            desc_parts.append(f"href='{href}'")
+    elif name == 'input':
+        input_type = attrs.get('type', 'text')
+        placeholder = attrs.get('placeholder', '')
+        if placeholder:
+            desc_parts.append(f"placeholder='{placeholder}'")
+        desc_parts.append(f"type='{input_type}'")
+    elif name == 'img' and attrs.get('alt'):
+        desc_parts.append(f"alt='{attrs.get('alt')}'")
+        
+    return ', '.join(desc_parts) if desc_parts else f"<{name}>"
+
+
+def xpath_by_id(element, tag, attrs, scan):
+    """ID优先的XPath"""
+    if attrs.get('id'):
+        return f"//{tag}[@id='{attrs.get('id')}']"
+    return None
+
+
+def xpath_by_class(element, tag, attrs, scan):
+    """Class优先的XPath"""
+    if attrs.get('class'):
+        classes = ' '.join(attrs.get('class'))
+        return f"//{tag}[contains(@class,'{classes.split()[0]}')]"
+    return None
+
+
+def xpath_by_attributes(element, tag, attrs, scan):
+    """属性组合路径"""
+    parts = []
+    for attr in ['name', 'type', 'placeholder', 'href', 'alt', 'src']:
+        if attrs.get(attr):
+            parts.append(f"@{attr}='{attrs.get(attr)}'")
+    if parts:
+        return f"//{tag}[{' and '.join(parts)}]"
+    return None
+
+
+def xpath_by_text(element, tag, attrs, scan):
+    """文本内容路径"""
+    text, length = element_text(element, scan)
+    if text and length <= 50:
+        return f"//{tag}[text()='{text}']"
+    return None
+
+
+def _soup_position_path(element):
+    """没有节点表时由BeautifulSoup元素逐级向上生成位置路径（与position_path相同）"""
+    steps = []
+    while element.parent is not None:
+        position = sum(1 for _sibling in element.find_previous_siblings(element.name)) + 1
+        steps.append(f"{element.name}[{position}]")
+        element = element.parent
+    return '/' + '/'.join(reversed(steps))
+
+
+def _soup_anchored_position_path(element):
+    """没有节点表时由BeautifulSoup元素向上查找锚点祖先（与anchored_position_path相同）"""
+    root = element
+    while root.parent is not None:
+        root = root.parent
+    path = _soup_position_path(element)
+    ancestor = element.parent
+    while ancestor is not None and ancestor.parent is not None:
+        element_id = ancestor.get('id')
+        anchor = id_anchor(ancestor.name, element_id)
+        if anchor and len(root.find_all(ancestor.name, id=element_id, limit=2)) == 1:
+            return anchor + path[len(_soup_position_path(ancestor)):]
+        ancestor = ancestor.parent
+    return None
+
+
+def xpath_by_position(element, tag, attrs, scan):
+    """位置路径：从文档根逐级按同标签兄弟位置定位的绝对路径"""
+    if scan is not None:
+        return scan.position_path(element)
+    return _soup_position_path(element)
+
+
+def xpath_by_anchored_position(element, tag, attrs, scan):
+    """锚点位置路径：从最近的id唯一的祖先开始逐级按位置定位，没有这样的祖先时不生成"""
+    if scan is not None:
+        return scan.anchored_position_path(element)
+    return _soup_anchored_position_path(element)
+
+
+# 内置的XPath策略（按生成顺序），可用xpath_rules中的规则文件或入口点增加
+BUILTIN_STRATEGIES = (
+    ('ID', xpath_by_id),
+    ('Class', xpath_by_class),
+    ('属性', xpath_by_attributes),
+    ('文本', xpath_by_text),
+    ('位置', xpath_by_position),
+    ('锚点位置', xpath_by_anchored_position),
+)
+
+
+def generate_element_xpaths(element, tag, scan=None, strategies=None):
+    """为元素生成XPath：依次执行各策略，策略名 -> XPath（strategies默认为当前规则中的策略）"""
+    attrs = scan.attrs_of(element) if scan is not None else element.attrs
+    xpaths = {}
+    for name, strategy in (strategies if strategies is not None else active_rules().strategies):
+        xpath = strategy(element, tag, attrs, scan)
+        if xpath:
+            xpaths[name] = xpath
+    return xpaths
+
+
+def element_tag(config, element, scan):
+    """元素类型对应的XPath标签：通配类型使用元素自身的标签"""
+    return config['tag'] if config['tag'] != ANY_TAG else scan.tag_of(element)
+
+
+def generate_xpath_rows(scan, configs=None, verify=False, locate=False, reuse=None, limits=None):
+    """按元素类型依次生成XPath记录（生成器）
+
+    configs为元素类型列表，None表示当前规则（须与遍历文档时使用的相同）；
+    limits为元素数量上限（见make_limits），默认每个类型最多DEFAULT_ELEMENT_LIMIT个元素；
+    locate为True时为每个元素追加一条"最短唯一"定位；
+    verify为True时在lxml树上执行每条XPath，记录匹配数量(match_count)和是否命中目标元素(hits_target)；
+    reuse为元素id() -> 上次生成的XPath字典，其中的元素不再重新生成（见xpath_diff.reusable_xpaths）
+    """
+    verifier = None
+    if verify:
+        from xpath_verify import XPathVerifier
+        verifier = XPathVerifier(scan)
+    locator_index = None
+    if locate:
+        from xpath_locator import get_locator_index
+        locator_index = get_locator_index(scan)
+    strategies = active_rules().strategies
+    # 统计开启时各步骤换成计时版本，关闭时循环内没有额外开销
+    generate = metrics.wrap('strategies', generate_element_xpaths)
+    find_locator = metrics.wrap('locate', locator_index.find) if locator_index is not None else None
+    verify_xpath = metrics.wrap('verify', verifier.verify) if verifier is not None else None
+    counter = 1
+    reused = 0
+    try:
+        for config, elements in limited_buckets(scan, configs, limits):
+            for idx, element in enumerate(elements, 1):
+                tag = element_tag(config, element, scan)
+                xpaths = reuse.get(id(element)) if reuse else None
+                if xpaths is None:
+                    xpaths = generate(element, tag, scan, strategies)
+                else:
+                    xpaths = dict(xpaths)
+                    reused += 1
+                if find_locator is not None:
+                    xpaths[LOCATOR_STRATEGY] = find_locator(element)[0]
+                for xpath_type, xpath in xpaths.items():
+                    row = {
+                        'id': counter,
+                        'type': xpath_type,
+                        'element_type': config['name'],
+                        'element_index': idx,
+                        'xpath': xpath,
+                        'tag': tag,
+                        'element': element
+                    }
+                    if verify_xpath is not None:
+                        row['match_count'], row['hits_target'] = verify_xpath(xpath, element)
+                    yield row
+                    counter += 1
+    finally:
+        metrics.count('xpaths_generated', counter - 1)
+        if reused:
+            metrics.count('elements_reused', reused)
+        if verifier is not None:
+            metrics.count('xpath_evaluations', verifier.evaluations)
+
+
+def limited_buckets(scan, configs=None, limits=None):
+    """节点表中按上限截取的各类型元素，产出(配置, 元素列表)"""
+    return apply_limits(compiled_rules(configs).configs, limits or DEFAULT_LIMITS,
+                        lambda config: scan.buckets.get(rule_key(config), []))
+
+
+def count_by_element_type(rows):
+    """按元素类型统计XPath数量"""
+    stats = {}
+    for item in rows:
+        stats[item['element_type']] = stats.get(item['element_type'], 0) + 1
+    return stats
+
+
+def format_match(count, hits_target):
+    """XPath验证结果的简短显示文本"""
+    if count is None:
+        return "无效"
+    if not hits_target:
+        return f"{count}个(未命中)"
+    if count == 1:
+        return "唯一"
+    return f"{count}个"
+
+
+def count_unique(rows):
+    """统计唯一命中目标元素的XPath数量，未验证时返回None"""
+    verified = [item for item in rows if 'match_count' in item]
+    if not verified:
+        return None
+    return sum(1 for item in verified if item['hits_target'] and item['match_count'] == 1)
+
+
+def write_text_report(f, rows):
+    """以文本格式写出XPath结果"""
+    f.write("XPath生成结果\n")
+    f.write("=" * 50 + "\n\n")
+    
+    # 统计信息
+    stats = count_by_element_type(rows)
+    f.write("【统计信息】\n")
+    for element_type, count in stats.items():
+        f.write(f"{element_type}: {count}个\n")
+    f.write(f"\n总计: {len(rows)} 个XPath\n")
+    unique = count_unique(rows)
+    if unique is not None:
+        f.write(f"唯一定位: {unique} 个XPath\n")
+    f.write("\n")
+    
+    # 详细结果
+    f.write("【详细XPath】\n")
+    for item in rows:
+        f.write(f"{item['element_type']} #{item['element_index']} [{item['type']}]\n")
+        f.write(f"  {item['xpath']}\n")
+        if 'match_count' in item:
+            f.write(f"  匹配: {format_match(item['match_count'], item['hits_target'])}\n")
+        f.write("\n")
@@ -0,0 +1,370 @@
+"""批量评估 - 在一批HTML文档上执行已保存的XPath，检查哪些定位仍能匹配
+
+定位文件可以是命令行--jsonl的输出、--out-dir的JSON结果、界面"导出"的文本报告、--export导出的
+CSV/JSONL/Parquet/Arrow文件（读取xpath列，Parquet/Arrow需要pyarrow），或每行一条XPath的文本。
+相同的表达式只评估一次；每个工作进程在初始化时编译全部表达式一次，每个文档只解析一次（lxml，
+与lxml后端验证使用的树相同），然后依次执行所有表达式。
+结果为匹配矩阵（JSONL第一行为各列的表达式，之后每个文档一行：每条表达式的匹配数量和第一个匹配的绝对路径），按输入顺序边计算边写入文件，
+汇总只累加计数，文档数量多时内存不增长。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from array import array
+from multiprocessing import Pool
+
+from lxml import etree
+
+from xpath_cli import collect_input_files
+from xpath_export import EXPORT_EXTENSIONS, import_pyarrow
+from xpath_lxml_backend import parse_lxml_tree
+from xpath_source import SourceFile
+from xpath_verify import compile_xpath, xpath_tree
+
+# 文本报告（write_text_report）的标题和详细部分
+REPORT_TITLE = 'XPath生成结果'
+REPORT_DETAILS = '【详细XPath】'
+# 文本汇总中最多列出的从未匹配的表达式数
+REPORT_LOCATORS = 20
+# 结构化导出中生成说明和定位所用的列
+LOCATOR_COLUMNS = ('element_type', 'element_index', 'type', 'xpath')
+
+
+def _row_label(row):
+    """JSON记录的说明：元素类型 #序号 [策略]"""
+    if 'element_type' not in row:
+        return ''
+    return f"{row['element_type']} #{row.get('element_index', '')} [{row.get('type', '')}]"
+
+
+def _report_locators(lines):
+    """从文本报告中读取(说明, XPath)：说明行之后缩进两格的第一行是XPath"""
+    details = False
+    label = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not details:
+            details = line == REPORT_DETAILS
+            continue
+        if not line.strip():
+            continue
+        if not line.startswith('  '):
+            label = line
+        elif label is not None:
+            yield label, line[2:]
+            label = None
+
+
+def _table_locators(path, fmt):
+    """从Parquet/Arrow导出中按批读取xpath列及说明所需的列"""
+    pa = import_pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.ParquetFile(path)
+        names = table.schema_arrow.names
+        batches = table.iter_batches(columns=[name for name in LOCATOR_COLUMNS if name in names])
+    else:
+        reader = pa.ipc.open_file(path)
+        names = reader.schema.names
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    if 'xpath' not in names:
+        raise ValueError(f"导出文件中没有xpath列: {path}")
+    locators = []
+    for batch in batches:
+        locators.extend((_row_label(row), row['xpath']) for row in batch.to_pylist())
+    return locators
+
+
+def read_locator_file(path):
+    """读取定位文件，按出现顺序返回[(说明, XPath)]（可能有重复的表达式）"""
+    fmt = EXPORT_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt in ('parquet', 'arrow'):
+        return _table_locators(path, fmt)
+    if fmt == 'csv':
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            if 'xpath' not in (reader.fieldnames or ()):
+                raise ValueError(f"CSV文件中没有xpath列: {path}")
+            return [(_row_label(row), row['xpath']) for row in reader]
+    with open(path, encoding='utf-8-sig') as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith(REPORT_TITLE):
+        return list(_report_locators(text.splitlines()))
+    if stripped.startswith(('{', '[')):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and 'rows' in data:
+            data = data['rows']
+        elif not isinstance(data, list):
+            # JSONL：每行一条记录（只有一行时整个文件也是一个JSON对象）
+            data = [json.loads(line) for line in text.splitlines() if line.strip()]
+        return [('', row) if isinstance(row, str) else (_row_label(row), row['xpath']) for row in data]
+    return [('', line.strip()) for line in text.splitlines() if line.strip() and not line.startswith('#')]
+
+
+class LocatorSet:
+    """去重后的表达式：expressions与匹配矩阵的列对应，labels为每条表达式第一次出现时的说明"""
+
+    def __init__(self, locators):
+        self.expressions = []
+        self.labels = []
+        self.occurrences = []  # 每条表达式在定位文件中出现的次数
+        position_of = {}
+        for label, expression in locators:
+            position = position_of.get(expression)
+            if position is None:
+                position_of[expression] = len(self.expressions)
+                self.expressions.append(expression)
+                self.labels.append(label)
+                self.occurrences.append(1)
+            else:
+                self.occurrences[position] += 1
+        self.invalid = [position for position, expression in enumerate(self.expressions)
+                        if compile_xpath(expression) is None]
+
+
+def match_path(tree, item):
+    """匹配结果的绝对路径：元素用getpath，属性值为所在元素路径加/@名称，文本为父元素路径加/text()"""
+    if isinstance(item, etree._Element):
+        return tree.getpath(item)
+    parent = getattr(item, 'getparent', lambda: None)()
+    if parent is None:
+        return None
+    if item.is_attribute:
+        return f"{tree.getpath(parent)}/@{item.attrname}"
+    if item.is_tail:
+        parent = parent.getparent()
+        if parent is None:
+            return None
+    return f"{tree.getpath(parent)}/text()"
+
+
+def evaluate_document(tree, compiled):
+    """在一个文档上执行全部已编译的表达式，返回(匹配数量列表, 第一个匹配的路径列表)
+
+    表达式无效、执行出错或结果不是节点集时匹配数量为None。
+    """
+    counts = []
+    first = []
+    for xpath in compiled:
+        found = None
+        if xpath is not None:
+            try:
+                found = xpath(tree)
+            except etree.XPathEvalError:
+                pass
+        if isinstance(found, list):
+            counts.append(len(found))
+            first.append(match_path(tree, found[0]) if found else None)
+        else:
+            counts.append(None)
+            first.append(None)
+    return counts, first
+
+
+_compiled = None  # 工作进程中已编译的表达式列表（与LocatorSet.expressions对齐）
+
+
+def _init_worker(expressions):
+    """工作进程初始化：编译全部表达式一次（已编译的XPath不能在进程间传递）"""
+    global _compiled
+    _compiled = [compile_xpath(expression) for expression in expressions]
+
+
+def _evaluate_task(path):
+    """进程池任务入口：解析一个文档并执行全部表达式"""
+    try:
+        with SourceFile(path) as source:
+            tree = xpath_tree(parse_lxml_tree(source))
+        counts, first = evaluate_document(tree, _compiled)
+        return {'file': path, 'error': None, 'counts': counts, 'first_matches': first}
+    except Exception as e:
+        return {'file': path, 'error': str(e), 'counts': None, 'first_matches': None}
+
+
+def iter_evaluation_results(files, expressions, workers=1, chunksize=4):
+    """按输入顺序逐个产出各文档的评估结果，workers大于1时分发到进程池"""
+    if workers <= 1 or len(files) <= 1:
+        _init_worker(expressions)
+        for path in files:
+            yield _evaluate_task(path)
+        return
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=(expressions,)) as pool:
+        yield from pool.imap(_evaluate_task, files, chunksize=chunksize)
+
+
+class JsonlMatrixWriter:
+    """匹配矩阵写为JSONL：第一行为列说明{"columns": [{column, xpath, label}]}，
+    之后每个文档一行，counts和first_matches按列顺序排列"""
+
+    def __init__(self, f, locator_set):
+        self.f = f
+        columns = [{'column': position, 'xpath': expression, 'label': label}
+                   for position, (expression, label) in enumerate(zip(locator_set.expressions, locator_set.labels))]
+        f.write(json.dumps({'columns': columns}, ensure_ascii=False) + '\n')
+
+    def write(self, result):
+        self.f.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+
+class CsvMatrixWriter:
+    """匹配矩阵写为CSV：每条表达式两列（匹配数量、第一个匹配的路径），表头为表达式本身"""
+
+    def __init__(self, f, locator_set):
+        self.writer = csv.writer(f)
+        header = ['file', 'error']
+        for expression in locator_set.expressions:
+            header.extend((expression, f"首个匹配: {expression}"))
+        self.writer.writerow(header)
+
+    def write(self, result):
+        row = [result['file'], result['error'] or '']
+        if result['counts'] is not None:
+            for count, first in zip(result['counts'], result['first_matches']):
+                row.extend(('' if count is None else count, first or ''))
+        self.writer.writerow(row)
+
+
+MATRIX_WRITERS = {'.csv': CsvMatrixWriter}
+
+
+class EvaluationSummary:
+    """累加各文档的结果：每条表达式有匹配、唯一匹配、出错的文档数和匹配总数"""
+
+    def __init__(self, locator_set):
+        self.locator_set = locator_set
+        size = len(locator_set.expressions)
+        self.matched = array('q', [0]) * size
+        self.unique = array('q', [0]) * size
+        self.failed = array('q', [0]) * size
+        self.total = array('q', [0]) * size
+        self.documents = 0
+        self.errors = []
+
+    def add(self, result):
+        self.documents += 1
+        if result['error']:
+            self.errors.append({'file': result['file'], 'error': result['error']})
+            return
+        for position, count in enumerate(result['counts']):
+            if count is None:
+                self.failed[position] += 1
+            elif count:
+                self.matched[position] += 1
+                self.total[position] += count
+                if count == 1:
+                    self.unique[position] += 1
+
+    def never_matched(self):
+        """在所有成功解析的文档中都能执行、但从未匹配的表达式位置"""
+        ok = self.documents - len(self.errors)
+        return [position for position, matched in enumerate(self.matched)
+                if not matched and self.failed[position] < ok]
+
+    def always_failed(self):
+        """在所有文档中都无效、执行出错或结果不是节点集的表达式位置"""
+        ok = self.documents - len(self.errors)
+        return [position for position, failed in enumerate(self.failed) if ok and failed == ok]
+
+    def to_dict(self):
+        locator_set = self.locator_set
+        invalid = set(locator_set.invalid)
+        return {
+            'documents': self.documents,
+            'errors': self.errors,
+            'locators': [{
+                'column': position,
+                'xpath': expression,
+                'label': locator_set.labels[position],
+                'occurrences': locator_set.occurrences[position],
+                'valid': position not in invalid,
+                'matched_documents': self.matched[position],
+                'unique_documents': self.unique[position],
+                'failed_documents': self.failed[position],
+                'total_matches': self.total[position],
+            } for position, expression in enumerate(locator_set.expressions)],
+        }
+
+
+def write_text_report(f, summary):
+    """输出总体情况和从未匹配的表达式"""
+    locator_set = summary.locator_set
+    ok = summary.documents - len(summary.errors)
+    never = summary.never_matched()
+    f.write(f"文档数: {ok}（失败 {len(summary.errors)}），表达式数: {len(locator_set.expressions)}"
+            f"（无效 {len(locator_set.invalid)}）\n")
+    f.write(f"在每个文档中都有匹配: {sum(1 for matched in summary.matched if ok and matched == ok)} 个\n")
+    f.write(f"在每个文档中都唯一匹配: {sum(1 for unique in summary.unique if ok and unique == ok)} 个\n")
+    f.write(f"无效或结果不是节点集: {len(summary.always_failed())} 个\n")
+    f.write(f"在所有文档中都没有匹配: {len(never)} 个\n")
+    for position in never[:REPORT_LOCATORS]:
+        label = locator_set.labels[position]
+        f.write(f"  {locator_set.expressions[position]}" + (f"  ({label})" if label else '') + '\n')
+    if len(never) > REPORT_LOCATORS:
+        f.write(f"  ……另有 {len(never) - REPORT_LOCATORS} 个（详见--summary）\n")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='批量评估：在一批HTML文档上执行定位文件中的XPath')
+    parser.add_argument('locators', help='定位文件（JSONL、JSON结果、导出的文本报告、CSV/Parquet/Arrow导出或每行一条XPath）')
+    parser.add_argument('inputs', nargs='+', help='HTML文件、目录或通配符')
+    parser.add_argument('-o', '--output', required=True,
+                        help='匹配矩阵输出文件（.csv写CSV，其他扩展名写JSONL，"-"表示标准输出的JSONL）')
+    parser.add_argument('--summary', help='写出每条表达式的汇总（有匹配/唯一匹配的文档数等）到JSON文件')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='工作进程数（默认CPU核数）')
+    parser.add_argument('--chunksize', type=int, default=4, help='每次分发给工作进程的文档数')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        locator_set = LocatorSet(read_locator_file(args.locators))
+    except (OSError, ValueError, KeyError, TypeError, ImportError) as e:
+        parser.error(f'定位文件读取失败: {e}')
+    if not locator_set.expressions:
+        parser.error('定位文件中没有XPath')
+    files = collect_input_files(args.inputs)
+    if not files:
+        parser.error('没有找到HTML文件')
+    for position in locator_set.invalid:
+        print(f"无效的XPath: {locator_set.expressions[position]}", file=sys.stderr)
+
+    summary = EvaluationSummary(locator_set)
+    if args.output == '-':
+        out = sys.stdout
+    else:
+        out = open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        writer_class = MATRIX_WRITERS.get(os.path.splitext(args.output)[1].lower(), JsonlMatrixWriter)
+        writer = writer_class(out, locator_set)
+        for done, result in enumerate(iter_evaluation_results(files, locator_set.expressions, args.workers,
+                                                              args.chunksize), 1):
+            if result['error']:
+                print(f"错误: {result['file']}: {result['error']}", file=sys.stderr)
+            writer.write(result)
+            summary.add(result)
+            if done % 50 == 0:
+                print(f"已处理 {done}/{len(files)} 个文档", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    write_text_report(sys.stderr if out is sys.stdout else sys.stdout, summary)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"已导出到: {args.summary}", file=sys.stderr)
+    return 1 if summary.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
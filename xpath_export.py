@@ -0,0 +1,256 @@
+"""结构化导出 - 把XPath记录写成JSONL、CSV或列式的Parquet/Arrow文件，供其他程序读取
+
+写出器逐条接收记录，边生成边写入：JSONL和CSV每条记录直接写出，Parquet/Arrow按ROW_BATCH_SIZE条一批
+写出一个批次，内存与记录总数无关。Parquet/Arrow需要可选依赖pyarrow（pip install pyarrow）。
+
+每条记录的字段见EXPORT_FIELDS；source_start/source_end为元素在原始HTML文本中的字符偏移，
+没有源码（如流式分析）或源码中找不到该元素时为空，未验证时match_count/hits_target为空。
+"""
+import csv
+import json
+import os
+
+from xpath_engine import get_element_description
+from xpath_source_map import get_source_offsets
+
+# 导出的字段（按列顺序）及pyarrow类型函数名
+EXPORT_FIELDS = (
+    ('id', 'int64'),
+    ('element_type', 'string'),
+    ('element_index', 'int64'),
+    ('tag', 'string'),
+    ('type', 'string'),
+    ('xpath', 'string'),
+    ('description', 'string'),
+    ('source_start', 'int64'),
+    ('source_end', 'int64'),
+    ('match_count', 'int64'),
+    ('hits_target', 'bool_'),
+)
+# 批量导出多个文件时放在最前面的来源字段
+FILE_FIELD = ('file', 'string')
+# Parquet/Arrow每批写出的记录数
+ROW_BATCH_SIZE = 65536
+
+
+def export_record(row, scan=None, offsets=None):
+    """把XPath记录（字典或XPathTable的行视图）转换为导出字段
+
+    没有description时用scan生成；offsets为与节点表对齐的源码偏移表（get_source_offsets的结果）。
+    已有source_start（如工作进程中计算过）时直接使用。
+    """
+    description = row.get('description')
+    element = row.get('element')
+    if description is None and element is not None:
+        description = get_element_description(element, scan)
+    span = None
+    if 'source_start' in row:
+        span = (row['source_start'], row['source_end'])
+    elif offsets is not None and element is not None:
+        span = offsets[scan.index_of[id(element)]]
+    return {
+        'id': row['id'],
+        'element_type': row['element_type'],
+        'element_index': row['element_index'],
+        'tag': row['tag'],
+        'type': row['type'],
+        'xpath': row['xpath'],
+        'description': description,
+        'source_start': span[0] if span else None,
+        'source_end': span[1] if span else None,
+        'match_count': row.get('match_count'),
+        'hits_target': row.get('hits_target'),
+    }
+
+
+def iter_export_records(rows, scan=None, content=None):
+    """逐条转换记录（生成器）；给出scan和原始HTML文本content时附带源码偏移"""
+    offsets = get_source_offsets(scan, content) if scan is not None and content is not None else None
+    for row in rows:
+        yield export_record(row, scan, offsets)
+
+
+class JsonlExportWriter:
+    """每条记录一行JSON"""
+
+    binary = False
+
+    def __init__(self, f, fields):
+        self.f = f
+        self.names = [name for name, _type in fields]
+
+    def write(self, record):
+        self.f.write(json.dumps({name: record.get(name) for name in self.names}, ensure_ascii=False) + '\n')
+
+    def close(self):
+        pass
+
+
+class CsvExportWriter:
+    """带表头的CSV，空值写为空单元格"""
+
+    binary = False
+
+    def __init__(self, f, fields):
+        self.names = [name for name, _type in fields]
+        self.writer = csv.writer(f)
+        self.writer.writerow(self.names)
+
+    def write(self, record):
+        values = []
+        for name in self.names:
+            value = record.get(name)
+            values.append('' if value is None else value)
+        self.writer.writerow(values)
+
+    def close(self):
+        pass
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("读写Parquet/Arrow需要安装pyarrow（pip install pyarrow）") from None
+    return pyarrow
+
+
+class _ArrowBatchWriter:
+    """按列缓存ROW_BATCH_SIZE条记录，满一批交给_write_batch写出"""
+
+    binary = True
+
+    def __init__(self, f, fields):
+        pa = import_pyarrow()
+        self.pa = pa
+        self.schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in fields])
+        self.names = self.schema.names
+        self.columns = {name: [] for name in self.names}
+        self.pending = 0
+
+    def write(self, record):
+        for name in self.names:
+            self.columns[name].append(record.get(name))
+        self.pending += 1
+        if self.pending >= ROW_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self._write_batch(self.pa.RecordBatch.from_pydict(self.columns, schema=self.schema))
+        self.columns = {name: [] for name in self.names}
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self._close()
+
+
+class ParquetExportWriter(_ArrowBatchWriter):
+    """Parquet文件，每批一个行组"""
+
+    def __init__(self, f, fields):
+        super().__init__(f, fields)
+        import pyarrow.parquet as pq
+        self.writer = pq.ParquetWriter(f, self.schema)
+
+    def _write_batch(self, batch):
+        self.writer.write_batch(batch)
+
+    def _close(self):
+        self.writer.close()
+
+
+class ArrowExportWriter(_ArrowBatchWriter):
+    """Arrow IPC文件（Feather v2）"""
+
+    def __init__(self, f, fields):
+        super().__init__(f, fields)
+        self.writer = self.pa.ipc.new_file(f, self.schema)
+
+    def _write_batch(self, batch):
+        self.writer.write_batch(batch)
+
+    def _close(self):
+        self.writer.close()
+
+
+# 格式名 -> 写出器
+EXPORT_FORMATS = {
+    'jsonl': JsonlExportWriter,
+    'csv': CsvExportWriter,
+    'parquet': ParquetExportWriter,
+    'arrow': ArrowExportWriter,
+}
+# 扩展名 -> 格式名
+EXPORT_EXTENSIONS = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+}
+
+
+def export_format(path, fmt=None):
+    """导出格式：指定的fmt，否则按扩展名判断；无法判断时抛出ValueError，缺少pyarrow时抛出ImportError"""
+    if fmt is None:
+        fmt = EXPORT_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"无法识别的导出格式: {fmt or path}（支持 {', '.join(EXPORT_EXTENSIONS)}）")
+    if EXPORT_FORMATS[fmt].binary:
+        import_pyarrow()
+    return fmt
+
+
+class ExportFile:
+    """打开导出文件并创建写出器，可用作上下文管理器；with_file为True时每条记录带来源文件字段"""
+
+    def __init__(self, path, fmt=None, with_file=False):
+        writer_class = EXPORT_FORMATS[export_format(path, fmt)]
+        fields = ((FILE_FIELD,) if with_file else ()) + EXPORT_FIELDS
+        if writer_class.binary:
+            self.file = open(path, 'wb')
+        else:
+            # CSV由csv模块处理换行；utf-8-sig让Excel正确识别中文
+            self.file = open(path, 'w', encoding='utf-8-sig' if writer_class is CsvExportWriter else 'utf-8',
+                             newline='')
+        try:
+            self.writer = writer_class(self.file, fields)
+        except Exception:
+            self.file.close()
+            os.remove(path)
+            raise
+        self.count = 0
+
+    def write(self, record):
+        self.writer.write(record)
+        self.count += 1
+
+    def write_rows(self, rows, scan=None, content=None, file=None):
+        """转换并写出一批XPath记录，file为来源文件字段的值"""
+        for record in iter_export_records(rows, scan, content):
+            if file is not None:
+                record['file'] = file
+            self.write(record)
+
+    def close(self):
+        try:
+            self.writer.close()
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_rows(path, rows, scan=None, content=None, fmt=None):
+    """把XPath记录（可以是生成器）写出到path，返回写出的记录数"""
+    with ExportFile(path, fmt) as export:
+        export.write_rows(rows, scan, content)
+    return export.count
@@ -2,9 +2,415 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinter import scrolledtext
 import os
-from bs4 import BeautifulSoup
-import re
+import queue
+import sqlite3
+import threading
+from collections import deque
+from xpath_engine import (scan_document, parse_html, generate_xpath_rows, generate_element_xpaths,
+                          get_element_description, count_by_element_type, count_unique, format_match,
+                          write_text_report, AnalysisCancelled, DEFAULT_ELEMENT_LIMIT, limited_buckets,
+                          make_limits, parse_limit)
+from xpath_source_map import get_source_offsets
+from xpath_export import ExportFile
+from xpath_diff import diff_scans, reusable_xpaths
+from xpath_cache import AnalysisCache, cache_key, serialize_row
+from xpath_source import SourceFile, SourceText
+from xpath_store import TreeItemTable, XPathTable
+from xpath_rules import RuleError, env_rule_paths, load_rules, use_rules
+from xpath_metrics import metrics, timed
 
+LAZY_TREE_THRESHOLD = 5000  # 树节点超过该数量时改为展开时才插入子节点
+EXPAND_ALL_LIMIT = 20000  # "全部展开"最多展开的节点数
+EXPAND_BATCH_SIZE = 500  # "全部展开"每批展开的节点数，批次之间让出事件循环
+ROW_BATCH_SIZE = 200  # 后台分析每批送回界面的XPath数
+POLL_INTERVAL = 50  # 界面轮询后台分析结果的间隔（毫秒）
+POLL_MESSAGE_LIMIT = 20  # 每次轮询最多处理的消息数，避免界面卡顿
+SOURCE_WINDOW_CHARS = 200000  # 原始HTML视图一次装入文本框的字符数
+SOURCE_LINE_SNAP = 2000  # 装入范围的边界向附近换行对齐的最大距离
+SOURCE_EDGE = 0.1  # 视图滚动到装入范围首尾这个比例以内时重新装入
+XPATH_WINDOW_ROWS = 1000  # XPath列表一次插入Treeview的记录数
+XPATH_EDGE = 0.1  # 列表滚动到已插入范围首尾这个比例以内时重新插入
+DEBUG_REFRESH_INTERVAL = 500  # 调试面板刷新统计的间隔（毫秒）
+PASTED_SOURCE_LABEL = "通过源码粘贴"  # 分析粘贴的源码时文件路径框显示的文字
+# "每类上限"和"合计上限"下拉框的候选值，也可以直接输入数字
+ELEMENT_LIMIT_CHOICES = (str(DEFAULT_ELEMENT_LIMIT), '50', '200', '1000', '全部')
+TOTAL_LIMIT_CHOICES = ('全部', '1000', '10000', '100000', '1000000')
+
+# 可选的解析后端：显示名称 -> (后端, BeautifulSoup解析器)，文件和粘贴源码使用同一设置
+PARSER_BACKENDS = {
+    "BeautifulSoup(lxml)": ('bs4', 'lxml'),
+    "BeautifulSoup(html.parser)": ('bs4', 'html.parser'),
+    "lxml": ('lxml', None),
+}
+
+class AnalysisJob:
+    """后台分析任务：在工作线程中读取、解析并生成XPath，结果通过队列分批交给界面线程"""
+    
+    def __init__(self, source, backend, parser, previous=None, cache=None, limits=None):
+        self.source = source  # ('file', 路径) 或 ('text', HTML源码)
+        self.backend = backend
+        self.parser = parser
+        self.previous = previous  # 增量更新时为(上次的节点表, 上次的XPath记录)
+        self.cache = cache  # 分析结果磁盘缓存，None表示不使用
+        self.cache_hit = False
+        self.limits = limits  # 元素数量上限，None表示默认
+        self.queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        
+    def start(self):
+        """启动工作线程"""
+        self.thread.start()
+        
+    def cancel(self):
+        """请求取消，工作线程在下一个检查点停止"""
+        self.cancel_event.set()
+        
+    def check_cancelled(self, *args):
+        """检查点：已请求取消时抛出AnalysisCancelled"""
+        if self.cancel_event.is_set():
+            raise AnalysisCancelled()
+            
+    def _cache_get(self, key):
+        """读取缓存，缓存不可用时按未命中处理"""
+        try:
+            return self.cache.get(key)
+        except (sqlite3.Error, OSError, ValueError):
+            return None
+            
+    def _cache_put(self, key, scan, records):
+        """写入缓存，失败时忽略（不影响分析结果）"""
+        try:
+            self.cache.put(key, scan, records)
+        except (sqlite3.Error, OSError):
+            pass
+            
+    def run(self):
+        """工作线程入口"""
+        put = self.queue.put
+        try:
+            kind, value = self.source
+            source = None
+            try:
+                if kind == 'file':
+                    # 内存映射读取并识别编码，lxml后端直接从映射解析
+                    put(('progress', 0, "读取文件..."))
+                    with metrics.stage('read'):
+                        source = SourceFile(value)
+                    content = None
+                else:
+                    content = value
+                self.check_cancelled()
+                
+                # 相同内容、后端和生成器版本的结果直接从缓存读取，不再解析
+                key = cached = None
+                if self.cache is not None:
+                    with metrics.stage('cache_lookup'):
+                        key = cache_key(source.data if source else content, self.backend, self.parser,
+                                        limits=self.limits)
+                        cached = self._cache_get(key)
+                    self.cache_hit = cached is not None
+                    
+                if cached:
+                    scan, cached_rows = cached
+                else:
+                    put(('progress', 5, "解析HTML..."))
+                    scan = parse_html(source or content, self.parser, self.backend, progress=self.check_cancelled)
+                    self.check_cancelled()
+                # lxml后端直接从映射解析，不解码文本；源码视图需要时再由SourceText解码
+                original = source.source_text() if source else SourceText(text=content)
+            finally:
+                if source:
+                    source.close()
+            if original.decoded():
+                # 已有文本时源码偏移表在后台建立，点击时只需查表；否则在首次高亮源码时建立
+                with metrics.stage('source_map'):
+                    get_source_offsets(scan, original.text())
+            self.check_cancelled()
+            
+            # 增量更新：与上次的结果比较，未变化元素的XPath直接复用
+            diff = None
+            reuse = None
+            if self.previous:
+                put(('progress', 55, "比较变化..."))
+                old_scan, old_rows = self.previous
+                with metrics.stage('diff'):
+                    diff = diff_scans(old_scan, scan)
+                    reuse = reusable_xpaths(diff, old_rows)
+                self.check_cancelled()
+            put(('parsed', original, scan.soup, scan, diff))
+            
+            if cached:
+                for start in range(0, len(cached_rows), ROW_BATCH_SIZE):
+                    put(('rows', cached_rows[start:start + ROW_BATCH_SIZE], 100))
+                put(('done',))
+                return
+                
+            # 生成XPath，分批送回界面
+            total = sum(len(elements) for _config, elements in limited_buckets(scan, limits=self.limits)) or 1
+            batch = []
+            records = []
+            done_elements = set()
+            with metrics.stage('generate'):
+                for xpath_item in generate_xpath_rows(scan, verify=True, locate=True, reuse=reuse,
+                                                      limits=self.limits):
+                    batch.append(xpath_item)
+                    if key is not None:
+                        records.append(serialize_row(xpath_item, scan))
+                    done_elements.add(id(xpath_item['element']))
+                    if len(batch) >= ROW_BATCH_SIZE:
+                        self.check_cancelled()
+                        put(('rows', batch, 60 + 40 * len(done_elements) / total))
+                        batch = []
+            self.check_cancelled()
+            if batch:
+                put(('rows', batch, 100))
+            if key is not None:
+                with metrics.stage('cache_store'):
+                    self._cache_put(key, scan, records)
+            put(('done',))
+        except AnalysisCancelled:
+            put(('cancelled',))
+        except Exception as e:
+            put(('error', str(e)))
+
+class SourceWindow:
+    """原始HTML视图：文本框只装入当前滚动位置附近的一段源码，滚动条按整个文档显示和定位
+    
+    偏移都是全文中的字符位置；滚动接近装入范围的首尾、拖动滚动条或高亮范围外的元素时重新装入。
+    """
+    
+    def __init__(self, text, scrollbar):
+        self.text = text
+        self.scrollbar = scrollbar
+        self.content = ""
+        self.start = 0  # 已装入部分在全文中的范围
+        self.end = 0
+        self.highlight = None  # 高亮的全文范围(起始, 结束)
+        self._recenter_pending = False
+        text.configure(yscrollcommand=self._on_view_changed)
+        scrollbar.configure(command=self._on_scrollbar)
+        
+    def set_content(self, content):
+        """显示新的源码"""
+        self.content = content
+        self.highlight = None
+        self._load(0)
+        
+    def _index(self, position):
+        """全文位置对应的文本框索引"""
+        return f"1.0 + {position - self.start} chars"
+        
+    def _load(self, position):
+        """装入以position为中心的一段源码，并把position滚动到顶部"""
+        content = self.content
+        total = len(content)
+        start = max(0, min(position - SOURCE_WINDOW_CHARS // 2, total - SOURCE_WINDOW_CHARS))
+        if start <= SOURCE_LINE_SNAP:
+            start = 0
+        else:
+            newline = content.rfind('\n', start - SOURCE_LINE_SNAP, start)
+            if newline >= 0:
+                start = newline + 1
+        end = min(total, start + SOURCE_WINDOW_CHARS)
+        if total - end <= SOURCE_LINE_SNAP:
+            end = total
+        else:
+            newline = content.find('\n', end, end + SOURCE_LINE_SNAP)
+            if newline >= 0:
+                end = newline + 1
+        self.start, self.end = start, end
+        self.text.delete(1.0, tk.END)
+        self.text.insert(1.0, content[start:end])
+        self._apply_highlight()
+        self.text.yview(self._index(min(max(position, start), end)))
+        
+    def _apply_highlight(self):
+        self.text.tag_remove('highlight', 1.0, tk.END)
+        if self.highlight is None:
+            return
+        start = max(self.highlight[0], self.start)
+        end = min(self.highlight[1], self.end)
+        if start < end:
+            self.text.tag_add('highlight', self._index(start), self._index(end))
+            
+    def show(self, start, end):
+        """高亮全文中的[start, end)并滚动到该位置"""
+        self.highlight = (start, end)
+        if self.start <= start < self.end:
+            self._apply_highlight()
+        else:
+            self._load(start)
+        self.text.see(self._index(start))
+        
+    def clear_highlight(self):
+        self.highlight = None
+        self.text.tag_remove('highlight', 1.0, tk.END)
+        
+    def _top_position(self):
+        """视图顶部字符在全文中的位置"""
+        count = self.text.count(1.0, self.text.index('@0,0'), 'chars')
+        if isinstance(count, tuple):
+            count = count[0]
+        return self.start + (count or 0)
+        
+    def _on_view_changed(self, first, last):
+        """文本框滚动：换算成全文比例更新滚动条，接近装入范围首尾时安排重新装入"""
+        first, last = float(first), float(last)
+        total = len(self.content) or 1
+        size = self.end - self.start
+        self.scrollbar.set((self.start + first * size) / total, (self.start + last * size) / total)
+        if self._near_edge(first, last) and not self._recenter_pending:
+            self._recenter_pending = True
+            self.text.after_idle(self._recenter)
+            
+    def _near_edge(self, first, last):
+        """视图是否接近装入范围的首尾（且那一侧还有未装入的源码）"""
+        return ((first < SOURCE_EDGE and self.start > 0)
+                or (last > 1 - SOURCE_EDGE and self.end < len(self.content)))
+        
+    def _recenter(self):
+        self._recenter_pending = False
+        first, last = self.text.yview()
+        if self._near_edge(float(first), float(last)):
+            self._load(self._top_position())
+        
+    def _on_scrollbar(self, action, *args):
+        """滚动条操作：拖动按全文比例定位，行/页滚动交给文本框"""
+        if action != 'moveto':
+            self.text.yview(action, *args)
+            return
+        if self.start == 0 and self.end == len(self.content):
+            self.text.yview('moveto', args[0])
+            return
+        position = int(float(args[0]) * len(self.content))
+        margin = int((self.end - self.start) * SOURCE_EDGE)
+        if self.start + margin <= position < self.end - margin:
+            self.text.yview(self._index(position))
+        else:
+            self._load(position)
+            
+class XPathListWindow:
+    """XPath列表：Treeview只插入当前滚动位置附近的一段记录，滚动条按全部记录显示和定位
+    
+    记录保存在XPathTable中，第row行的列表项ID为"xpath_行号"；滚动接近已插入范围的首尾、拖动滚动条
+    或选中范围外的记录时重新插入，百万条记录也只有XPATH_WINDOW_ROWS个列表项。
+    """
+    
+    def __init__(self, tree, scrollbar, values_of):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.values_of = values_of  # 行视图 -> 各列显示值
+        self.table = XPathTable(None)
+        self.start = 0  # 已插入的行范围
+        self.end = 0
+        self.selected = None  # 选中的行（可能已滚出插入范围）
+        self._recenter_pending = False
+        tree.configure(yscrollcommand=self._on_view_changed)
+        scrollbar.configure(command=self._on_scrollbar)
+        
+    def set_table(self, table, top=0, selected=None):
+        """显示新的记录表，第top行滚动到顶部，第selected行设为选中"""
+        self.table = table
+        self.selected = selected
+        self._load(top)
+        
+    def rows_added(self):
+        """表中追加了记录：插入范围未满时补足，否则只更新滚动条"""
+        end = min(len(self.table), self.start + XPATH_WINDOW_ROWS)
+        for row in range(self.end, end):
+            self._insert(row)
+        self.end = max(self.end, end)
+        self._on_view_changed(*self.tree.yview())
+        
+    def _insert(self, row):
+        metrics.count('xpath_list_inserts')
+        xpath_item = self.table[row]
+        # 使用元素类型作为显示文本
+        self.tree.insert('', 'end', self.table.item_id(row), text=xpath_item['element_type'],
+                         values=self.values_of(xpath_item))
+        
+    @timed('xpath_list_load')
+    def _load(self, top):
+        """插入以top为中心的一段记录，并把top滚动到顶部"""
+        total = len(self.table)
+        start = max(0, min(top - XPATH_WINDOW_ROWS // 2, total - XPATH_WINDOW_ROWS))
+        end = min(total, start + XPATH_WINDOW_ROWS)
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self.start, self.end = start, end
+        for row in range(start, end):
+            self._insert(row)
+        if self.selected is not None and start <= self.selected < end:
+            self.tree.selection_set(self.table.item_id(self.selected))
+        if end > start:
+            self.tree.yview_moveto((min(max(top, start), end) - start) / (end - start))
+            
+    def selected_row(self):
+        """选中的行号，没有时返回None（滚出插入范围的选中行仍然有效）"""
+        current = self.tree.selection()
+        if current:
+            row = self.table.row_of_item(current[0])
+            self.selected = row.row if row is not None else None
+        elif self.selected is not None and self.start <= self.selected < self.end:
+            # 在插入范围内却没有选中：用户取消了选择
+            self.selected = None
+        return self.selected
+        
+    def top_row(self):
+        """视图顶部的行号，列表为空时返回None"""
+        if self.end <= self.start:
+            return None
+        first = float(self.tree.yview()[0])
+        return min(self.start + int(first * (self.end - self.start)), self.end - 1)
+        
+    def show(self, row):
+        """选中第row行并滚动到可见"""
+        if not self.start <= row < self.end:
+            self._load(row)
+        item_id = self.table.item_id(row)
+        self.selected = row
+        self.tree.selection_set(item_id)
+        self.tree.see(item_id)
+        
+    def _on_view_changed(self, first, last):
+        """列表滚动：换算成全部记录中的比例更新滚动条，接近插入范围首尾时安排重新插入"""
+        first, last = float(first), float(last)
+        total = len(self.table) or 1
+        size = self.end - self.start
+        self.scrollbar.set((self.start + first * size) / total, (self.start + last * size) / total)
+        if self._near_edge(first, last) and not self._recenter_pending:
+            self._recenter_pending = True
+            self.tree.after_idle(self._recenter)
+            
+    def _near_edge(self, first, last):
+        """视图是否接近插入范围的首尾（且那一侧还有未插入的记录）"""
+        return ((first < XPATH_EDGE and self.start > 0)
+                or (last > 1 - XPATH_EDGE and self.end < len(self.table)))
+        
+    def _recenter(self):
+        self._recenter_pending = False
+        first, last = self.tree.yview()
+        if self._near_edge(float(first), float(last)):
+            self.selected_row()
+            self._load(self.top_row())
+            
+    def _on_scrollbar(self, action, *args):
+        """滚动条操作：拖动按全部记录的比例定位，行/页滚动交给Treeview"""
+        if action != 'moveto':
+            self.tree.yview(action, *args)
+            return
+        if self.start == 0 and self.end == len(self.table):
+            self.tree.yview('moveto', args[0])
+            return
+        row = int(float(args[0]) * len(self.table))
+        margin = int((self.end - self.start) * XPATH_EDGE)
+        if self.start + margin <= row < self.end - margin:
+            self.tree.yview_moveto((row - self.start) / (self.end - self.start))
+        else:
+            self.selected_row()
+            self._load(row)
+            
 class XPathEnhancedGUI:
     def __init__(self, root):
         self.root = root
@@ -24,7 +430,30 @@ class XPathEnhancedGUI:
         ttk.Entry(file_frame, textvariable=self.file_path, width=50).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(file_frame, text="浏览", command=self.browse_file).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(file_frame, text="分析", command=self.analyze_html).pack(side=tk.LEFT, padx=(0, 5))
-        ttk.Button(file_frame, text="粘贴源码解析", command=self.show_paste_dialog).pack(side=tk.LEFT)
+        ttk.Button(file_frame, text="粘贴源码解析", command=self.show_paste_dialog).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(file_frame, text="规则...", command=self.load_rule_file).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(file_frame, text="调试", command=self.show_debug_panel).pack(side=tk.LEFT, padx=(0, 5))
+        
+        # 解析后端选择
+        self.backend_var = tk.StringVar(value="BeautifulSoup(lxml)")
+        ttk.Combobox(file_frame, textvariable=self.backend_var, values=list(PARSER_BACKENDS),
+                     state='readonly', width=24).pack(side=tk.LEFT, padx=(0, 5))
+        
+        # 重新分析时只更新变化的部分，保留展开和选中状态
+        self.incremental_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(file_frame, text="增量更新", variable=self.incremental_var).pack(side=tk.LEFT, padx=(0, 5))
+        
+        # 相同内容再次分析时直接使用磁盘缓存
+        self.cache_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(file_frame, text="使用缓存", variable=self.cache_var).pack(side=tk.LEFT, padx=(0, 5))
+        
+        # 后台分析进度和取消
+        self.progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(file_frame, variable=self.progress_var, maximum=100, length=150).pack(side=tk.LEFT, padx=(0, 5))
+        self.cancel_button = ttk.Button(file_frame, text="取消", command=self.cancel_analysis, width=6, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(0, 5))
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(file_frame, textvariable=self.status_var).pack(side=tk.LEFT)
         
         # 创建两栏布局 - 移除右侧统计信息，合并到中间
         paned = ttk.PanedWindow(main_frame, orient=tk.HORIZONTAL)
@@ -60,8 +489,14 @@ class XPathEnhancedGUI:
         tree_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.html_tree.yview)
         self.html_tree.configure(yscrollcommand=tree_scrollbar.set)
         
-        # 原始HTML文本框（初始隐藏）
-        self.original_text = scrolledtext.ScrolledText(tree_frame, height=15, width=50)
+        # 原始HTML文本框（初始隐藏），只装入滚动位置附近的一段源码
+        self.original_frame = ttk.Frame(tree_frame)
+        self.original_text = tk.Text(self.original_frame, height=15, width=50)
+        original_scrollbar = ttk.Scrollbar(self.original_frame, orient=tk.VERTICAL)
+        self.original_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        original_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.original_text.tag_configure('highlight', background='yellow', foreground='black')
+        self.source_window = SourceWindow(self.original_text, original_scrollbar)
         
         # 默认显示树形视图
         self.html_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -83,20 +518,32 @@ class XPathEnhancedGUI:
         ttk.Button(xpath_control_frame, text="复制全部", command=self.copy_all, width=8).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(xpath_control_frame, text="导出", command=self.export_to_file, width=6).pack(side=tk.LEFT)
         
+        # 元素数量上限：每个类型的上限和所有类型合计的上限，"全部"表示不限
+        self.total_limit_var = tk.StringVar(value=TOTAL_LIMIT_CHOICES[0])
+        ttk.Combobox(xpath_control_frame, textvariable=self.total_limit_var, values=TOTAL_LIMIT_CHOICES,
+                     width=8).pack(side=tk.RIGHT)
+        ttk.Label(xpath_control_frame, text="合计上限:").pack(side=tk.RIGHT, padx=(5, 2))
+        self.element_limit_var = tk.StringVar(value=ELEMENT_LIMIT_CHOICES[0])
+        ttk.Combobox(xpath_control_frame, textvariable=self.element_limit_var, values=ELEMENT_LIMIT_CHOICES,
+                     width=6).pack(side=tk.RIGHT)
+        ttk.Label(xpath_control_frame, text="每类上限:").pack(side=tk.RIGHT, padx=(5, 2))
+        
         # XPath树形视图 - 简化列
-        self.xpath_tree = ttk.Treeview(xpath_frame, columns=('type', 'xpath'), show='tree headings', height=12)
+        self.xpath_tree = ttk.Treeview(xpath_frame, columns=('type', 'xpath', 'match'), show='tree headings', height=12)
         self.xpath_tree.heading('#0', text='元素')
         self.xpath_tree.heading('type', text='类型')
         self.xpath_tree.heading('xpath', text='XPath表达式')
+        self.xpath_tree.heading('match', text='匹配')
         
         # 设置列宽
         self.xpath_tree.column('#0', width=120)
         self.xpath_tree.column('type', width=60)
         self.xpath_tree.column('xpath', width=400)
+        self.xpath_tree.column('match', width=80)
         
-        # XPath滚动条
-        xpath_scrollbar = ttk.Scrollbar(xpath_frame, orient=tk.VERTICAL, command=self.xpath_tree.yview)
-        self.xpath_tree.configure(yscrollcommand=xpath_scrollbar.set)
+        # XPath滚动条，列表只插入滚动位置附近的记录
+        xpath_scrollbar = ttk.Scrollbar(xpath_frame, orient=tk.VERTICAL)
+        self.xpath_list = XPathListWindow(self.xpath_tree, xpath_scrollbar, self._xpath_row_values)
         
         self.xpath_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         xpath_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -116,10 +563,23 @@ class XPathEnhancedGUI:
         
         # 存储数据
         self.soup = None
-        self.all_xpaths = []
-        self.html_nodes = {}  # 存储HTML节点信息
-        self.node_mapping = {}  # XPath到树节点的映射
-        self.original_html = ""  # 存储原始HTML内容
+        self.scan = None  # 单次遍历得到的节点表
+        self.all_xpaths = XPathTable(None)  # XPath记录（按列保存），行视图可按字典方式读取
+        self.tree_items = TreeItemTable(())  # 节点下标 <-> 已插入的树节点ID
+        self.unloaded_nodes = set()  # 子节点尚未插入（只有占位子项）的树节点
+        self._expand_job = None  # 正在分批执行的"全部展开"任务
+        self.analysis_job = None  # 正在进行的后台分析任务
+        try:
+            self.cache = AnalysisCache()  # 分析结果磁盘缓存
+        except (sqlite3.Error, OSError):
+            self.cache = None
+        self._previous_xpath_view = None  # 增量更新时上次选中的行和顶部行的_xpath_row_key
+        self._pending_rows = None  # 增量更新时暂存新XPath记录的XPathTable，分析完成后一次性对齐到列表
+        self._rules_changed = False  # 规则改变后下一次分析不复用上次的XPath
+        self.pasted_html = None  # 最近一次粘贴的HTML源码，文件路径框为PASTED_SOURCE_LABEL时重新分析用
+        self.debug_window = None  # 调试面板（运行统计）
+        self.original_source = SourceText(text='')  # 原始HTML（SourceText），文件来源的在首次显示源码时才解码
+        self._source_displayed = True  # 源码视图是否已装入当前的原始HTML
         self.view_mode = "structured"  # 当前显示模式：structured或original
         
         # 绑定事件
@@ -127,6 +587,7 @@ class XPathEnhancedGUI:
         self.xpath_tree.bind('<Button-3>', self.show_xpath_context_menu)
         self.html_tree.bind('<Button-1>', self.on_tree_click)
         self.html_tree.bind('<Double-1>', self.on_tree_double_click)
+        self.html_tree.bind('<<TreeviewOpen>>', self.on_tree_open)
         # self.html_tree.bind('<Button-3>', self.show_tree_context_menu)  # 暂时移除，因为没有实现
         
         # 创建右键菜单
@@ -167,93 +628,354 @@ class XPathEnhancedGUI:
             self.analyze_html()
             
     def analyze_html(self):
-        """分析HTML文件"""
+        """分析HTML文件；文件路径框为粘贴源码的标记时重新分析最近粘贴的源码"""
         if not self.file_path.get():
             messagebox.showwarning("警告", "请先选择HTML文件")
             return
+        if self.file_path.get() == PASTED_SOURCE_LABEL and self.pasted_html is not None:
+            self.start_analysis(('text', self.pasted_html), "解析HTML源码时出错")
+            return
             
-        try:
-            with open(self.file_path.get(), 'r', encoding='utf-8') as file:
-                content = file.read()
-            
-            self.original_html = content  # 保存原始HTML
-            self.soup = BeautifulSoup(content, 'lxml')
-            self.build_html_tree()
-            self.generate_all_xpaths()
-            self.update_statistics()
+        self.start_analysis(('file', self.file_path.get()), "分析HTML文件时出错")
+        
+    def start_analysis(self, source, error_title, on_done=None):
+        """在后台线程中分析HTML，界面通过轮询队列分批接收结果"""
+        if self.analysis_job:
+            self.analysis_job.cancel()
+        # 被取代的增量更新暂存的记录属于旧文档，不能再接收新结果
+        self._pending_rows = None
+        self._previous_xpath_view = None
             
-            # 分析完成后自动展开第一层
-            self.expand_first_level()
+        limits = self._get_limits()
+        if limits is None:
+            return
+        backend, parser = PARSER_BACKENDS[self.backend_var.get()]
+        previous = None
+        if self.incremental_var.get() and self.scan is not None and self.tree_items and not self._rules_changed:
+            previous = (self.scan, self.all_xpaths)
+        self._rules_changed = False
+        cache = self.cache if self.cache_var.get() else None
+        job = AnalysisJob(source, backend, parser, previous, cache, limits)
+        job.error_title = error_title
+        job.on_done = on_done
+        self.analysis_job = job
+        self.progress_var.set(0)
+        self.status_var.set("分析中...")
+        self.cancel_button.config(state=tk.NORMAL)
+        job.start()
+        self.root.after(POLL_INTERVAL, self._poll_analysis, job)
+        
+    def load_rule_file(self):
+        """加载JSON规则文件（在内置规则之上添加元素类型和XPath策略），已分析的文档按新规则重新分析"""
+        filename = filedialog.askopenfilename(
+            title="选择规则文件",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        try:
+            rules = load_rules(env_rule_paths() + [filename])
+        except (OSError, RuleError, ImportError, AttributeError) as e:
+            messagebox.showerror("错误", f"规则加载失败:\n{e}")
+            return
+        use_rules(rules)
+        self._rules_changed = True
+        self.status_var.set(f"已加载规则: {os.path.basename(filename)}")
+        if self.file_path.get():
+            self.analyze_html()
             
-            # 更新原始HTML显示
-            self.update_original_html_display()
+    def show_debug_panel(self):
+        """调试面板：开关运行统计，查看各阶段耗时和计数，导出JSON"""
+        if self.debug_window is not None and self.debug_window.winfo_exists():
+            self.debug_window.lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title("调试 - 运行统计")
+        window.geometry("640x480")
+        self.debug_window = window
+        
+        control_frame = ttk.Frame(window, padding=5)
+        control_frame.pack(fill=tk.X)
+        enabled_var = tk.BooleanVar(value=metrics.enabled)
+        ttk.Checkbutton(control_frame, text="启用统计", variable=enabled_var,
+                        command=lambda: metrics.enable(enabled_var.get())).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(control_frame, text="重置", command=metrics.reset, width=6).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(control_frame, text="导出JSON", command=self.export_metrics, width=10).pack(side=tk.LEFT)
+        
+        text = scrolledtext.ScrolledText(window, wrap=tk.NONE, font=('Consolas', 10))
+        text.pack(fill=tk.BOTH, expand=True)
+        
+        def refresh():
+            if not window.winfo_exists():
+                return
+            text.delete(1.0, tk.END)
+            if metrics.enabled:
+                text.insert(1.0, metrics.format_text())
+            else:
+                text.insert(1.0, "统计未启用（启用后开始记录，关闭时不影响分析速度）")
+            window.after(DEBUG_REFRESH_INTERVAL, refresh)
+        refresh()
+        
+    def export_metrics(self):
+        """把运行统计导出为JSON文件"""
+        filename = filedialog.asksaveasfilename(
+            title="导出运行统计",
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if filename:
+            try:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.write(metrics.to_json(file=self.file_path.get(), xpaths=len(self.all_xpaths)))
+            except OSError as e:
+                messagebox.showerror("错误", f"导出失败: {str(e)}")
+                
+    def _get_limits(self):
+        """界面上设置的元素数量上限，格式不对时提示并返回None"""
+        try:
+            return make_limits(parse_limit(self.element_limit_var.get()), total=parse_limit(self.total_limit_var.get()))
+        except ValueError:
+            messagebox.showwarning("警告", "上限应为非负整数或\"全部\"")
+            return None
+            
+    def cancel_analysis(self):
+        """取消正在进行的分析"""
+        if self.analysis_job:
+            self.analysis_job.cancel()
+            self.status_var.set("正在取消...")
+            
+    def _poll_analysis(self, job):
+        """处理后台分析送回的消息"""
+        if job is not self.analysis_job:
+            # 已被新的分析取代
+            return
             
-        except Exception as e:
-            messagebox.showerror("错误", f"分析HTML文件时出错:\n{str(e)}")
+        for _ in range(POLL_MESSAGE_LIMIT):
+            try:
+                message = job.queue.get_nowait()
+            except queue.Empty:
+                break
+                
+            kind = message[0]
+            if kind == 'progress':
+                self.progress_var.set(message[1])
+                self.status_var.set(message[2])
+            elif kind == 'parsed':
+                _, original, soup, scan, diff = message
+                old_scan = self.scan
+                self.original_source = original  # 保存原始HTML
+                self._source_displayed = False
+                self.soup = soup
+                self.scan = scan
+                if diff is not None and diff.root_matched() and old_scan is diff.old_scan:
+                    # 只更新变化的子树，保留的节点维持展开和选中状态
+                    self._apply_tree_diff(diff)
+                    self._begin_xpath_update()
+                else:
+                    self.build_html_tree()
+                    self._clear_xpath_results()
+                    
+                    # 自动展开第一层
+                    self.expand_first_level()
+                
+                # 更新原始HTML显示
+                self.update_original_html_display()
+                self.progress_var.set(60)
+                self.status_var.set("生成XPath...")
+            elif kind == 'rows':
+                if self._pending_rows is not None:
+                    for xpath_item in message[1]:
+                        self._pending_rows.append(xpath_item)
+                else:
+                    self._add_xpath_rows(message[1])
+                self.progress_var.set(message[2])
+            else:
+                self._finish_analysis(job, message)
+                return
+                
+        self.root.after(POLL_INTERVAL, self._poll_analysis, job)
+        
+    def _finish_analysis(self, job, message):
+        """分析结束（完成、取消或出错）"""
+        self.analysis_job = None
+        self.cancel_button.config(state=tk.DISABLED)
+        kind = message[0]
+        if self._pending_rows is not None:
+            if kind == 'done':
+                self._finish_xpath_update()
+            else:
+                # 未完成的增量更新：列表中剩下的是旧文档的结果，不能保留
+                self._pending_rows = None
+                self._previous_xpath_view = None
+                self._clear_xpath_results()
+        if kind == 'done':
+            self.progress_var.set(100)
+            status = f"完成: {len(self.all_xpaths)} 个XPath"
+            if job.cache is not None:
+                status += f"（{'来自缓存' if job.cache_hit else '已缓存'}） {job.cache.stats_text()}"
+            self.status_var.set(status)
+            self.update_statistics()
+            if job.on_done:
+                job.on_done()
+        elif kind == 'cancelled':
+            self.status_var.set("已取消")
+        else:
+            self.progress_var.set(0)
+            self.status_var.set("出错")
+            messagebox.showerror("错误", f"{job.error_title}:\n{message[1]}")
             
+    @timed('build_html_tree')
     def build_html_tree(self):
         """构建HTML树结构"""
         # 清空现有树
+        self._cancel_expand_all()
         for item in self.html_tree.get_children():
             self.html_tree.delete(item)
-        self.html_nodes.clear()
+        self.tree_items = TreeItemTable(())
+        self.unloaded_nodes.clear()
         
-        if not self.soup:
+        if self.soup is None:
             return
             
-        # 从body开始构建树
-        body = self.soup.find('body')
-        if body:
-            self._build_tree_recursive(body, '')
+        # 从body开始构建树（没有body则从html开始），节点来自同一次文档遍历
+        scan = self._get_scan()
+        self.tree_items = TreeItemTable(scan.tags)
+        if len(scan.tree_range()) <= LAZY_TREE_THRESHOLD:
+            # 按先序依次插入，父节点总是先于子节点，无需递归
+            for index in scan.tree_range():
+                parent_id = self.tree_items[scan.parents[index]] if index != scan.tree_root else ''
+                self._insert_tree_node(index, parent_id)
         else:
-            # 如果没有body，从html开始
-            html = self.soup.find('html') or self.soup
-            self._build_tree_recursive(html, '')
-            
-    def _build_tree_recursive(self, element, parent_id):
-        """递归构建HTML树"""
-        if not element or not hasattr(element, 'name'):
-            return
-            
-        # 跳过注释和特殊节点
-        if isinstance(element, str) or element.name is None:
+            # 大文档只插入根节点，子节点在展开时再插入
+            self._insert_tree_node(scan.tree_root, '', lazy=True)
+            
+    @timed('apply_tree_diff')
+    def _apply_tree_diff(self, diff):
+        """按新旧文档的对应关系更新HTML树：保留未变化的节点，只删除和插入变化的子树"""
+        self._cancel_expand_all()
+        scan = self.scan
+        old_scan = diff.old_scan
+        old_items = self.tree_items
+        old_unloaded = self.unloaded_nodes
+        self.tree_items = old_items.rebind(scan.tags)
+        self.unloaded_nodes = set()
+        lazy = len(scan.tree_range()) > LAZY_TREE_THRESHOLD
+        
+        stack = [scan.tree_root]
+        while stack:
+            index = stack.pop()
+            old = diff.old_of[index]
+            node_id = old_items[old]
+            if diff.unchanged[index]:
+                # 整个子树相同：已插入的节点只需改绑到新元素
+                end = index + 1
+                while end < len(scan.nodes) and scan.depths[end] > scan.depths[index]:
+                    end += 1
+                for offset in range(end - index):
+                    item = old_items.get(old + offset)
+                    if item is not None:
+                        self._bind_tree_node(item, index + offset)
+                        if item in old_unloaded:
+                            self.unloaded_nodes.add(item)
+                continue
+                
+            # 标签和属性相同、内容有变化：保留节点，逐个对齐子节点
+            self._bind_tree_node(node_id, index)
+            if node_id in old_unloaded:
+                if scan.children[index]:
+                    self.unloaded_nodes.add(node_id)
+                else:
+                    self.html_tree.delete(f"{node_id}:placeholder")
+                continue
+                
+            kept = {}
+            for child in scan.children[index]:
+                old_child = diff.old_of[child]
+                if old_child >= 0 and old_scan.parents[old_child] == old and old_child in old_items:
+                    kept[old_child] = child
+            for item in self.html_tree.get_children(node_id):
+                if old_items.node_index(item) not in kept:
+                    self.html_tree.delete(item)
+            for position, child in enumerate(scan.children[index]):
+                if kept.get(diff.old_of[child]) == child:
+                    stack.append(child)
+                else:
+                    self._insert_tree_subtree(child, node_id, position, lazy)
+                    
+    def _bind_tree_node(self, node_id, index):
+        """把已有的树节点关联到新节点表中的元素"""
+        self.tree_items.bind(node_id, index)
+        
+    def _insert_tree_subtree(self, index, parent_id, position, lazy):
+        """在指定位置插入一个新子树，lazy时只插入子树根节点"""
+        scan = self.scan
+        self._insert_tree_node(index, parent_id, lazy=lazy, position=position)
+        if lazy:
             return
-            
-        # 创建节点ID
-        node_id = f"{element.name}_{len(self.html_nodes)}"
+        depth = scan.depths[index]
+        child = index + 1
+        while child < len(scan.nodes) and scan.depths[child] > depth:
+            self._insert_tree_node(child, self.tree_items[scan.parents[child]])
+            child += 1
+            
+    def _get_scan(self):
+        """获取当前文档的遍历结果，文档变化时重新遍历"""
+        if self.scan is None or self.scan.soup is not self.soup:
+            self.scan = scan_document(self.soup)
+        return self.scan
+            
+    def _insert_tree_node(self, index, parent_id, lazy=False, position='end'):
+        """把单个元素插入HTML树，lazy时有子元素的节点先插入一个占位子项"""
+        scan = self._get_scan()
+        element = scan.nodes[index]
+        
+        # 创建节点ID（按插入顺序编号，与节点下标无关，增量更新时保留的节点ID不变）
+        node_id = self.tree_items.add(index)
+        metrics.count('treeview_inserts')
         
         # 准备显示信息 - 简化属性显示
-        attrs_text = self._format_attrs(element.attrs)
+        tag = scan.tags[index]
+        attrs = scan.attrs_of(element)
+        attrs_text = self._format_attrs(attrs)
         
         # 添加到树
-        display_text = f"<{element.name}>"
-        if element.get('id'):
-            display_text += f" #{element.get('id')}"
-        elif element.get('class'):
-            classes = ' '.join(element.get('class'))
+        display_text = f"<{tag}>"
+        if attrs.get('id'):
+            display_text += f" #{attrs.get('id')}"
+        elif attrs.get('class'):
+            classes = ' '.join(attrs.get('class'))
             display_text += f" .{classes.split()[0]}"
             
-        if parent_id:
-            item_id = self.html_tree.insert(parent_id, 'end', node_id,
-                                          text=display_text,
-                                          values=(attrs_text,))
-        else:
-            item_id = self.html_tree.insert('', 'end', node_id,
-                                          text=display_text,
-                                          values=(attrs_text,))
-        
-        # 存储节点信息
-        self.html_nodes[node_id] = {
-            'element': element,
-            'tag': element.name,
-            'attrs': element.attrs,
-            'item_id': item_id
-        }
-        
-        # 递归处理子元素
-        for child in element.children:
-            if hasattr(child, 'name') and child.name:
-                self._build_tree_recursive(child, node_id)
+        self.html_tree.insert(parent_id, position, node_id,
+                              text=display_text,
+                              values=(attrs_text,))
+        
+        if lazy and scan.children[index]:
+            self.html_tree.insert(node_id, 'end', f"{node_id}:placeholder", text="...")
+            self.unloaded_nodes.add(node_id)
+        return node_id
+        
+    def _load_tree_children(self, node_id):
+        """插入尚未加载的子节点（替换占位子项）"""
+        if node_id not in self.unloaded_nodes:
+            return
+        self.unloaded_nodes.discard(node_id)
+        self.html_tree.delete(f"{node_id}:placeholder")
+        
+        scan = self._get_scan()
+        for child in scan.children[self.tree_items.node_index(node_id)]:
+            self._insert_tree_node(child, node_id, lazy=True)
+            
+    def _open_tree_node(self, node_id):
+        """加载子节点并展开"""
+        self._load_tree_children(node_id)
+        self.html_tree.item(node_id, open=True)
+        
+    def on_tree_open(self, event):
+        """展开树节点时按需插入子节点"""
+        node_id = self.html_tree.focus()
+        if node_id:
+            self._load_tree_children(node_id)
                 
     def toggle_view_mode(self):
         """切换视图模式"""
@@ -261,44 +983,76 @@ class XPathEnhancedGUI:
             self.view_mode = "original"
             self.toggle_button.config(text="结构化")
             self.html_tree.pack_forget()
-            self.original_text.pack(fill=tk.BOTH, expand=True)
+            self.original_frame.pack(fill=tk.BOTH, expand=True)
+            if not self._source_displayed:
+                self.update_original_html_display()
         else:
             self.view_mode = "structured"
             self.toggle_button.config(text="原始HTML")
-            self.original_text.pack_forget()
+            self.original_frame.pack_forget()
             self.html_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
             
+    @property
+    def original_html(self):
+        """原始HTML文本（文件来源的在首次访问时解码）"""
+        return self.original_source.text()
+
+    @original_html.setter
+    def original_html(self, content):
+        self.original_source = SourceText(text=content)
+        self._source_displayed = False
+
     def update_original_html_display(self):
-        """更新原始HTML显示"""
+        """更新原始HTML显示；结构化视图下推迟到切换到源码视图时（避免解码用不到的文本）"""
+        if self.view_mode != "original":
+            return
+        self._source_displayed = True
         if self.original_html:
-            self.original_text.delete(1.0, tk.END)
-            self.original_text.insert(1.0, self.original_html)
+            self.source_window.set_content(self.original_html)
             
     def expand_first_level(self):
         """分析完成后自动展开第一层"""
         for item in self.html_tree.get_children():
-            self.html_tree.item(item, open=True)
+            self._open_tree_node(item)
         
     def expand_all_tree(self):
-        """展开所有树节点"""
-        def expand_children(item):
-            self.html_tree.item(item, open=True)
-            for child in self.html_tree.get_children(item):
-                expand_children(child)
+        """展开所有树节点（分批进行，最多展开EXPAND_ALL_LIMIT个节点）"""
+        self._cancel_expand_all()
+        self._expand_all_step(deque(self.html_tree.get_children()), 0)
+        
+    def _expand_all_step(self, queue, opened):
+        """展开一批节点，未完成时通过after继续下一批"""
+        scan = self._get_scan()
+        batch_end = opened + EXPAND_BATCH_SIZE
+        while queue and opened < min(batch_end, EXPAND_ALL_LIMIT):
+            node_id = queue.popleft()
+            if not scan.children[self.tree_items.node_index(node_id)]:
+                continue
+            self._open_tree_node(node_id)
+            queue.extend(self.html_tree.get_children(node_id))
+            opened += 1
+            
+        if queue and opened < EXPAND_ALL_LIMIT:
+            self._expand_job = self.root.after(1, self._expand_all_step, queue, opened)
+        else:
+            self._expand_job = None
+            if queue:
+                messagebox.showinfo("提示", f"节点过多，已展开前 {EXPAND_ALL_LIMIT} 个节点")
                 
-        for item in self.html_tree.get_children():
-            expand_children(item)
+    def _cancel_expand_all(self):
+        """取消正在进行的分批展开"""
+        if self._expand_job:
+            self.root.after_cancel(self._expand_job)
+            self._expand_job = None
             
     def collapse_all_tree(self):
-        """收起所有树节点"""
-        def collapse_children(item):
-            for child in self.html_tree.get_children(item):
-                collapse_children(child)
+        """收起所有树节点（显式栈，深层嵌套的文档不会递归溢出）"""
+        stack = list(self.html_tree.get_children())
+        while stack:
+            item = stack.pop()
+            stack.extend(self.html_tree.get_children(item))
             self.html_tree.item(item, open=False)
             
-        for item in self.html_tree.get_children():
-            collapse_children(item)
-            
     def _format_attrs(self, attrs):
         """格式化属性显示"""
         if not attrs:
@@ -323,151 +1077,99 @@ class XPathEnhancedGUI:
         
     def _get_text_content(self, element):
         """获取文本内容"""
-        text = element.get_text(strip=True)
-        if len(text) > 30:
+        text, length = self._get_scan().text_of(element)
+        if length > 30:
             text = text[:27] + "..."
         return text
         
+    @timed('generate_all_xpaths')
     def generate_all_xpaths(self):
         """生成所有XPath"""
+        limits = self._get_limits()
+        if limits is None:
+            return
+        if self.soup is not None:
+            self._get_scan()
         # 清空现有结果
-        for item in self.xpath_tree.get_children():
-            self.xpath_tree.delete(item)
-        self.all_xpaths.clear()
-        self.node_mapping.clear()
+        self._clear_xpath_results()
             
-        if not self.soup:
+        if self.soup is None:
             return
             
-        # 定义要分析的元素类型 - 简化配置
-        element_configs = [
-            {'tag': 'a', 'name': '链接'},
-            {'tag': 'button', 'name': '按钮'},
-            {'tag': 'input', 'name': '输入框'},
-            {'tag': 'form', 'name': '表单'},
-            {'tag': 'div', 'name': '容器'},
-            {'tag': 'span', 'name': '文本'},
-            {'tag': 'img', 'name': '图片'},
-            {'tag': 'table', 'name': '表格'},
-            {'tag': 'select', 'name': '下拉框'},
-            {'tag': 'textarea', 'name': '文本域'},
-            {'tag': 'h1', 'name': '标题'},
-            {'tag': 'h2', 'name': '标题'},
-            {'tag': 'h3', 'name': '标题'},
-            {'tag': 'p', 'name': '段落'},
-            {'tag': 'ul', 'name': '列表'},
-            {'tag': 'li', 'name': '列表项'}
-        ]
-        
-        counter = 1
-        for config in element_configs:
-            elements = self.soup.find_all(config['tag'])
-            for idx, element in enumerate(elements[:8], 1):  # 限制每个类型最多8个
-                xpaths = self.generate_element_xpaths(element, config['tag'])
-                
-                for xpath_type, xpath in xpaths.items():
-                    # 使用元素类型作为显示文本
-                    item_id = self.xpath_tree.insert('', 'end', text=config['name'],
-                                                   values=(xpath_type, xpath))
-                    
-                    # 建立XPath到HTML节点的映射
-                    tree_node = self._find_tree_node_for_element(element)
-                    
-                    self.all_xpaths.append({
-                        'id': counter,
-                        'type': xpath_type,
-                        'element_type': config['name'],
-                        'element_index': idx,
-                        'xpath': xpath,
-                        'tag': config['tag'],
-                        'element': element,
-                        'tree_node': tree_node,
-                        'item_id': item_id
-                    })
-                    
-                    # 建立映射关系
-                    if tree_node:
-                        self.node_mapping[item_id] = tree_node
-                    
-                    counter += 1
+        # 候选元素来自同一次文档遍历，生成逻辑在xpath_engine中
+        self._add_xpath_rows(generate_xpath_rows(self._get_scan(), verify=True, locate=True, limits=limits))
+        
+    def _clear_xpath_results(self):
+        """清空XPath记录和列表（及未完成的增量更新）"""
+        self._pending_rows = None
+        self._previous_xpath_view = None
+        self.all_xpaths = XPathTable(self.scan)
+        self.xpath_list.set_table(self.all_xpaths)
+        
+    @timed('xpath_list_update')
+    def _add_xpath_rows(self, rows):
+        """把XPath记录追加到记录表，列表只插入可见范围附近的部分"""
+        for xpath_item in rows:
+            self.all_xpaths.append(xpath_item)
+        self.xpath_list.rows_added()
+            
+    def _xpath_row_values(self, xpath_item):
+        """XPath列表项的各列显示值"""
+        return (xpath_item['type'], xpath_item['xpath'], self._format_row_match(xpath_item))
+        
+    def _xpath_row_key(self, xpath_item):
+        """XPath记录在列表中的位置标识，增量更新时按它对齐新旧列表项"""
+        return (xpath_item['element_type'], xpath_item['tag'], xpath_item['element_index'], xpath_item['type'])
+        
+    def _begin_xpath_update(self):
+        """增量更新开始：记下选中行和顶部行的位置标识，新结果暂存到分析完成后再整体替换"""
+        table = self.xpath_list.table
+        selected = self.xpath_list.selected_row()
+        top = self.xpath_list.top_row()
+        self._previous_xpath_view = (
+            self._xpath_row_key(table[selected]) if selected is not None else None,
+            self._xpath_row_key(table[top]) if top is not None else None,
+        )
+        self._pending_rows = XPathTable(self.scan)
+        # 旧记录指向旧文档的元素，更新完成前不再响应
+        self.all_xpaths = XPathTable(self.scan)
+        
+    def _finish_xpath_update(self):
+        """显示暂存的新结果：相同位置标识的记录保持选中，视图停在原来顶部的记录"""
+        rows = self._pending_rows
+        selected_key, top_key = self._previous_xpath_view
+        self._pending_rows = None
+        self._previous_xpath_view = None
+        
+        selected = top = None
+        for row, xpath_item in enumerate(rows):
+            key = self._xpath_row_key(xpath_item)
+            if key == selected_key:
+                selected = row
+            if key == top_key:
+                top = row
+        self.all_xpaths = rows
+        self.xpath_list.set_table(rows, top or 0, selected)
                     
+    @timed('find_tree_node')
     def _find_tree_node_for_element(self, element):
-        """根据元素找到对应的树节点"""
-        for node_id, node_info in self.html_nodes.items():
-            if node_info['element'] == element:
-                return node_id
-        return None
+        """根据元素找到对应的树节点下标（节点可能尚未插入树）"""
+        # Tag.__eq__是深度结构比较，这里按对象身份查索引
+        return self._get_scan().tree_index(element)
         
     def get_element_description(self, element):
         """获取元素描述"""
-        desc_parts = []
-        
-        # ID属性
-        if element.get('id'):
-            desc_parts.append(f"id='{element.get('id')}'")
-            
-        # Class属性
-        if element.get('class'):
-            classes = ' '.join(element.get('class'))
-            desc_parts.append(f"class='{classes}'")
-            
-        # 文本内容
-        text = element.get_text(strip=True)
-        if text and len(text) <= 30:
-            desc_parts.append(f"文本='{text}'")
-            
-        # 特定属性
-        if element.name == 'a' and element.get('href'):
-            href = element.get('href')
-            if len(href) <= 50:
-                desc_parts.append(f"href='{href}'")
-        elif element.name == 'input':
-            input_type = element.get('type', 'text')
-            placeholder = element.get('placeholder', '')
-            if placeholder:
-                desc_parts.append(f"placeholder='{placeholder}'")
-            desc_parts.append(f"type='{input_type}'")
-        elif element.name == 'img' and element.get('alt'):
-            desc_parts.append(f"alt='{element.get('alt')}'")
-            
-        return ', '.join(desc_parts) if desc_parts else f"<{element.name}>"
+        return get_element_description(element, self._get_scan())
         
     def generate_element_xpaths(self, element, tag):
         """为元素生成XPath"""
-        xpaths = {}
-        
-        # 1. ID优先的XPath
-        if element.get('id'):
-            xpaths['ID'] = f"//{tag}[@id='{element.get('id')}']"
-            
-        # 2. Class优先的XPath
-        if element.get('class'):
-            classes = ' '.join(element.get('class'))
-            xpaths['Class'] = f"//{tag}[contains(@class,'{classes.split()[0]}')]"
-            
-        # 3. 属性组合路径
-        attrs = []
-        for attr in ['name', 'type', 'placeholder', 'href', 'alt', 'src']:
-            if element.get(attr):
-                attrs.append(f"@{attr}='{element.get(attr)}'")
+        return generate_element_xpaths(element, tag, self._get_scan())
         
-        if attrs:
-            xpaths['属性'] = f"//{tag}[{' and '.join(attrs)}]"
-            
-        # 4. 文本内容路径
-        text = element.get_text(strip=True)
-        if text and len(text) <= 50:
-            xpaths['文本'] = f"//{tag}[text()='{text}']"
-            
-        # 5. 位置路径
-        parent = element.find_parent()
-        if parent:
-            siblings = parent.find_all(tag, recursive=False)
-            if len(siblings) > 1:
-                position = siblings.index(element) + 1
-                xpaths['位置'] = f"//{tag}[{position}]"
-                
-        return xpaths
+    def _format_row_match(self, xpath_item):
+        """XPath列表中"匹配"列的显示文本"""
+        if 'match_count' not in xpath_item:
+            return ''
+        return format_match(xpath_item['match_count'], xpath_item['hits_target'])
         
     def update_statistics(self):
         """更新统计信息到详细信息区域"""
@@ -475,15 +1177,18 @@ class XPathEnhancedGUI:
             return
             
         # 统计信息
-        stats = {}
-        for item in self.all_xpaths:
-            element_type = item['element_type']
-            stats[element_type] = stats.get(element_type, 0) + 1
+        stats = count_by_element_type(self.all_xpaths)
             
         stats_text = "【统计信息】\n"
         for element_type, count in stats.items():
             stats_text += f"{element_type}: {count}个\n"
-        stats_text += f"\n总计: {len(self.all_xpaths)} 个XPath\n\n"
+        stats_text += f"\n总计: {len(self.all_xpaths)} 个XPath\n"
+        unique = count_unique(self.all_xpaths)
+        if unique is not None:
+            stats_text += f"唯一定位: {unique} 个XPath\n"
+        if self.cache is not None:
+            stats_text += f"{self.cache.stats_text()}\n"
+        stats_text += "\n"
         
         self.detail_text.delete(1.0, tk.END)
         self.detail_text.insert(1.0, stats_text)
@@ -492,19 +1197,21 @@ class XPathEnhancedGUI:
         """双击XPath时高亮对应元素"""
         self.highlight_element()
         
+    @timed('highlight_element')
     def highlight_element(self):
         """高亮选中的XPath对应的HTML元素"""
         selected = self.xpath_tree.selection()
         if not selected:
             return
             
-        item_id = selected[0]
-        if item_id in self.node_mapping:
-            tree_node = self.node_mapping[item_id]
-            
+        xpath_item = self.all_xpaths.row_of_item(selected[0])
+        if xpath_item is not None and xpath_item['tree_index'] is not None:
             # 清除之前的高亮
             self.clear_highlight()
             
+            # 展开到该节点（节点可能尚未插入树）
+            tree_node = self.expand_to_node(xpath_item['tree_index'])
+            
             # 高亮对应的树节点
             self.html_tree.item(tree_node, tags=('highlight',))
             self.html_tree.tag_configure('highlight', background='yellow', foreground='red')
@@ -512,9 +1219,6 @@ class XPathEnhancedGUI:
             # 确保节点可见
             self.html_tree.see(tree_node)
             
-            # 展开到该节点
-            self.expand_to_node(tree_node)
-            
             # 显示详细信息
             self.show_element_details()
             
@@ -523,12 +1227,17 @@ class XPathEnhancedGUI:
         for item in self.html_tree.tag_has('highlight'):
             self.html_tree.item(item, tags=())
             
-    def expand_to_node(self, node_id):
-        """展开到指定节点"""
-        parent = self.html_tree.parent(node_id)
-        while parent:
-            self.html_tree.item(parent, open=True)
-            parent = self.html_tree.parent(parent)
+    def expand_to_node(self, index):
+        """展开到指定下标的节点，尚未插入树的祖先节点会依次加载，返回该节点的树节点ID"""
+        scan = self._get_scan()
+        ancestors = []
+        parent = scan.parents[index]
+        while parent >= scan.tree_root:
+            ancestors.append(parent)
+            parent = scan.parents[parent]
+        for parent in reversed(ancestors):
+            self._open_tree_node(self.tree_items[parent])
+        return self.tree_items[index]
             
     def on_tree_click(self, event):
         """点击树节点时显示信息"""
@@ -543,28 +1252,30 @@ class XPathEnhancedGUI:
             return
             
         item = self.html_tree.identify_row(event.y)
-        if item and item in self.html_nodes:
+        if item and self.tree_items.node_index(item) is not None:
             self.highlight_corresponding_xpath(item)
             
     def show_tree_node_details(self, node_id):
         """显示树节点详细信息"""
-        if node_id in self.html_nodes:
-            node_info = self.html_nodes[node_id]
-            element = node_info['element']
+        index = self.tree_items.node_index(node_id)
+        if index is not None:
+            scan = self._get_scan()
+            element = scan.nodes[index]
+            attrs = scan.attrs_of(element)
             
-            details = f"标签: <{element.name}>\n"
+            details = f"标签: <{scan.tags[index]}>\n"
             
-            if element.attrs:
+            if attrs:
                 details += "\n属性:\n"
-                for key, value in element.attrs.items():
+                for key, value in attrs.items():
                     if key == 'class':
                         value = ' '.join(value) if isinstance(value, list) else str(value)
                     details += f"  {key}: {value}\n"
             
-            text = element.get_text(strip=True)
+            text, length = scan.text_of(element)
             if text:
                 details += f"\n文本内容:\n{text[:200]}"
-                if len(text) > 200:
+                if length > 200:
                     details += "..."
             
             self.detail_text.delete(1.0, tk.END)
@@ -576,34 +1287,38 @@ class XPathEnhancedGUI:
         if not selected:
             return
             
-        item_id = selected[0]
-        for xpath_item in self.all_xpaths:
-            if xpath_item['item_id'] == item_id:
-                element = xpath_item['element']
-                
-                details = f"元素类型: {xpath_item['element_type']}\n"
-                details += f"XPath: {xpath_item['xpath']}\n"
-                details += f"标签: <{element.name}>\n"
-                
-                if element.attrs:
-                    details += "\n属性:\n"
-                    for key, value in element.attrs.items():
-                        if key == 'class':
-                            value = ' '.join(value) if isinstance(value, list) else str(value)
-                        details += f"  {key}: {value}\n"
-                
-                text = element.get_text(strip=True)
-                if text:
-                    details += f"\n文本内容:\n{text[:200]}"
-                    if len(text) > 200:
-                        details += "..."
-                
-                self.detail_text.delete(1.0, tk.END)
-                self.detail_text.insert(1.0, details)
-                
-                # 高亮原始HTML中对应的元素
-                self.highlight_original_html(element)
-                break
+        xpath_item = self.all_xpaths.row_of_item(selected[0])
+        if xpath_item is None:
+            return
+            
+        element = xpath_item['element']
+        scan = self._get_scan()
+        attrs = scan.attrs_of(element)
+        
+        details = f"元素类型: {xpath_item['element_type']}\n"
+        details += f"XPath: {xpath_item['xpath']}\n"
+        if 'match_count' in xpath_item:
+            details += f"匹配: {self._format_row_match(xpath_item)}\n"
+        details += f"标签: <{scan.tag_of(element)}>\n"
+        
+        if attrs:
+            details += "\n属性:\n"
+            for key, value in attrs.items():
+                if key == 'class':
+                    value = ' '.join(value) if isinstance(value, list) else str(value)
+                details += f"  {key}: {value}\n"
+        
+        text, length = scan.text_of(element)
+        if text:
+            details += f"\n文本内容:\n{text[:200]}"
+            if length > 200:
+                details += "..."
+        
+        self.detail_text.delete(1.0, tk.END)
+        self.detail_text.insert(1.0, details)
+        
+        # 高亮原始HTML中对应的元素
+        self.highlight_original_html(element)
                 
     def highlight_tree_element(self):
         """高亮选中的树元素"""
@@ -619,25 +1334,21 @@ class XPathEnhancedGUI:
             # 原始HTML模式下，通过元素位置查找
             return
             
-        if tree_node_id not in self.html_nodes:
+        index = self.tree_items.node_index(tree_node_id)
+        if index is None:
             return
             
-        target_element = self.html_nodes[tree_node_id]['element']
-        
         # 清除之前的选择和高亮
         self.xpath_tree.selection_remove(self.xpath_tree.selection())
         
         # 查找对应的XPath项
-        for xpath_item in self.all_xpaths:
-            if xpath_item['element'] == target_element:
-                # 选中对应的XPath
-                xpath_item_id = xpath_item['item_id']
-                self.xpath_tree.selection_set(xpath_item_id)
-                self.xpath_tree.see(xpath_item_id)
-                
-                # 显示详细信息
-                self.show_element_details()
-                break
+        xpath_item = self.all_xpaths.first_row_of_node(index)
+        if xpath_item is not None:
+            # 选中对应的XPath（不在列表已插入的范围内时先插入它附近的记录）
+            self.xpath_list.show(xpath_item.row)
+            
+            # 显示详细信息
+            self.show_element_details()
             
     def expand_selected(self):
         """展开选中的树节点"""
@@ -716,87 +1427,26 @@ class XPathEnhancedGUI:
         else:
             messagebox.showinfo("提示", "没有找到ID路径的XPath")
         
+    @timed('highlight_original_html')
     def highlight_original_html(self, element):
-        """高亮原始HTML中对应的元素"""
-        if not self.original_html or self.view_mode != "original":
+        """高亮原始HTML中对应的元素（按解析时记录的源码偏移）"""
+        if self.view_mode != "original" or not self.original_html:
             return
             
-        try:
-            import re
-            
-            # 清除之前的高亮
-            self.original_text.tag_remove('highlight', 1.0, tk.END)
-            
-            # 获取元素的标签名和属性
-            tag_name = element.name
-            attrs = element.attrs
-            
-            # 构建更精确的匹配模式
-            # 首先尝试通过id匹配
-            if 'id' in attrs:
-                element_id = attrs['id']
-                pattern = f'<{tag_name}[^>]*id="{re.escape(str(element_id))}"[^>]*>.*?</{tag_name}>'
-            elif 'class' in attrs:
-                # 通过class匹配
-                class_value = attrs['class']
-                if isinstance(class_value, list):
-                    class_str = ' '.join(class_value)
-                else:
-                    class_str = str(class_value)
-                pattern = f'<{tag_name}[^>]*class="[^"]*{re.escape(class_str)}[^"]*"[^>]*>.*?</{tag_name}>'
-            else:
-                # 通过标签名和文本内容匹配
-                element_text = element.get_text(strip=True)
-                if element_text and len(element_text.strip()) > 0:
-                    # 转义特殊字符
-                    escaped_text = re.escape(element_text.strip()[:50])
-                    pattern = f'<{tag_name}[^>]*>{escaped_text}.*?</{tag_name}>'
-                else:
-                    # 简单的标签匹配
-                    pattern = f'<{tag_name}[^>]*>.*?</{tag_name}>'
-            
-            # 查找匹配
-            matches = list(re.finditer(pattern, self.original_html, re.DOTALL | re.IGNORECASE))
+        # 清除之前的高亮
+        self.source_window.clear_highlight()
+        
+        scan = self._get_scan()
+        index = scan.index_of.get(id(element))
+        if index is None:
+            return
+        span = get_source_offsets(scan, self.original_html)[index]
+        if span is None:
+            # 解析器补全的元素（如tbody）在源码中没有对应位置
+            return
             
-            if matches:
-                # 找到最匹配的（考虑元素位置）
-                best_match = None
-                min_distance = float('inf')
-                
-                # 获取元素在解析树中的位置信息
-                parent = element.parent
-                if parent:
-                    siblings = parent.find_all(tag_name)
-                    try:
-                        element_index = siblings.index(element)
-                    except ValueError:
-                        element_index = 0
-                else:
-                    element_index = 0
-                
-                # 选择对应位置的匹配
-                if len(matches) > element_index:
-                    best_match = matches[element_index]
-                else:
-                    best_match = matches[0]
-                
-                if best_match:
-                    start_pos = best_match.start()
-                    end_pos = best_match.end()
-                    
-                    # 高亮对应元素
-                    self.original_text.tag_add('highlight', 
-                        f"1.0 + {start_pos} chars", 
-                        f"1.0 + {end_pos} chars")
-                    self.original_text.tag_configure('highlight', 
-                        background='yellow', foreground='black')
-                    
-                    # 滚动到高亮位置
-                    self.original_text.see(f"1.0 + {start_pos} chars")
-                    
-        except Exception as e:
-            print(f"高亮失败: {e}")
-            pass
+        # 装入并滚动到高亮位置
+        self.source_window.show(*span)
         
     def export_to_file(self):
         """导出结果到文件"""
@@ -807,30 +1457,19 @@ class XPathEnhancedGUI:
         filename = filedialog.asksaveasfilename(
             title="导出XPath",
             defaultextension=".txt",
-            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+            filetypes=[("Text files", "*.txt"), ("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"),
+                       ("Parquet files", "*.parquet"), ("Arrow files", "*.arrow"), ("All files", "*.*")]
         )
         
         if filename:
             try:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write("XPath生成结果\n")
-                    f.write("=" * 50 + "\n\n")
-                    
-                    # 统计信息
-                    stats = {}
-                    for item in self.all_xpaths:
-                        stats[item['element_type']] = stats.get(item['element_type'], 0) + 1
-                        
-                    f.write("【统计信息】\n")
-                    for element_type, count in stats.items():
-                        f.write(f"{element_type}: {count}个\n")
-                    f.write(f"\n总计: {len(self.all_xpaths)} 个XPath\n\n")
-                    
-                    # 详细结果
-                    f.write("【详细XPath】\n")
-                    for item in self.all_xpaths:
-                        f.write(f"{item['element_type']} #{item['element_index']} [{item['type']}]\n")
-                        f.write(f"  {item['xpath']}\n\n")
+                if filename.lower().endswith('.txt'):
+                    with open(filename, 'w', encoding='utf-8') as f:
+                        write_text_report(f, self.all_xpaths)
+                else:
+                    # 结构化导出：逐行读取按列保存的记录写出，附带描述和源码偏移
+                    with ExportFile(filename) as export:
+                        export.write_rows(self.all_xpaths, self.scan, self.original_html or None)
                         
                 messagebox.showinfo("成功", f"已导出到: {filename}")
                     
@@ -920,35 +1559,15 @@ class XPathEnhancedGUI:
             messagebox.showwarning("警告", "请输入HTML源码")
             return
             
-        try:
-            # 保存原始HTML内容
-            self.original_html = html_content
-            
-            # 解析HTML
-            self.soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # 清空文件路径输入框，以表示当前使用的是粘贴的源码
-            self.file_path.set("通过源码粘贴")
-            
-            # 构建树形结构
-            self.build_html_tree()
-            
-            # 生成XPath
-            self.generate_all_xpaths()
-            
-            # 更新原始HTML显示
-            self.update_original_html_display()
-            
-            # 展开第一层
-            self.expand_first_level()
-            
-            # 关闭对话框
-            dialog_window.destroy()
-            
-            messagebox.showinfo("成功", "HTML源码解析完成！")
-            
-        except Exception as e:
-            messagebox.showerror("错误", f"解析HTML源码时出错:\n{str(e)}")
+        # 清空文件路径输入框，以表示当前使用的是粘贴的源码
+        self.file_path.set(PASTED_SOURCE_LABEL)
+        self.pasted_html = html_content
+        
+        # 关闭对话框，解析在后台进行
+        dialog_window.destroy()
+        
+        self.start_analysis(('text', html_content), "解析HTML源码时出错",
+                            on_done=lambda: messagebox.showinfo("成功", "HTML源码解析完成！"))
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,223 @@
+"""最短唯一定位 - 组合标签、id、class、属性、文本和祖先锚点，按代价搜索第一个唯一的XPath
+
+唯一性判断基于每个文档预先建立的倒排索引（属性值、class、文本 -> 元素下标列表），
+大部分检查只是字典查找，组合条件取交集，祖先锚点用子树下标范围二分计数，不需要执行XPath。
+"""
+import re
+from bisect import bisect_left, bisect_right
+from itertools import combinations
+
+# 参与定位的属性及其稳定性代价（越小越稳定）
+ATTRIBUTE_COSTS = {
+    'data-testid': 1,
+    'data-test': 1,
+    'data-qa': 1,
+    'name': 3,
+    'aria-label': 4,
+    'placeholder': 4,
+    'for': 4,
+    'title': 5,
+    'alt': 5,
+    'action': 5,
+    'role': 6,
+    'type': 6,
+    'href': 7,
+    'src': 8,
+    'value': 8,
+}
+ID_COST = 2
+TEXT_COST = 6
+CLASS_COST = 7
+TAG_COST = 5  # 只用标签名（如//form）
+GENERATED_PENALTY = 5  # 疑似自动生成的值（含3位以上连续数字）额外代价
+ANCHOR_COST = 2  # 使用祖先锚点的额外代价
+LENGTH_WEIGHT = 1 / 40  # 表达式每个字符的代价
+FALLBACK_COST = 100  # 文档顺序下标定位，总能唯一但最不稳定
+ANCHOR_EXCLUDED_PENALTY = 20  # 兜底定位没有锚点、只能按整个文档计数时的额外代价
+
+TEXT_LOCATOR_LIMIT = 50  # 参与定位的文本最大长度
+ANCHOR_SEARCH_DEPTH = 10  # 向上查找锚点的最大层数
+ANCHOR_LIMIT = 3  # 最多使用的锚点数
+ANCHOR_EXCLUDED_TAGS = ('html', 'head', 'body')  # 这些标签作为锚点没有意义
+
+_generated_re = re.compile(r'\d{3,}')
+# XPath normalize-space()只处理这四种空白
+_space_re = re.compile(r'[ \t\r\n]+')
+
+
+def normalize_space(text):
+    """与XPath normalize-space()相同的空白规范化"""
+    return _space_re.sub(' ', text).strip(' ')
+
+
+def quote_literal(value):
+    """XPath字符串字面量，同时含单双引号时返回None"""
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    return None
+
+
+def _value_cost(base, value):
+    return base + GENERATED_PENALTY if _generated_re.search(value) else base
+
+
+class LocatorIndex:
+    """单个文档的定位索引：条件 -> 满足条件的元素下标列表（文档顺序）"""
+
+    def __init__(self, scan):
+        self.scan = scan
+        self.postings = {}
+        self._sets = {}
+        nodes_count = len(scan.nodes)
+
+        # 子树结束下标（不含），先序编号下子树是连续区间
+        ends = list(range(1, nodes_count + 1))
+        parents = scan.parents
+        for index in range(nodes_count - 1, 0, -1):
+            parent = parents[index]
+            if ends[index] > ends[parent]:
+                ends[parent] = ends[index]
+        self.subtree_ends = ends
+
+        postings = self.postings
+        for index in range(1, nodes_count):
+            postings.setdefault(('tag', scan.tags[index]), []).append(index)
+            for key, _predicate, _cost in self.predicates(index):
+                postings.setdefault(key, []).append(index)
+
+    def predicates(self, index):
+        """元素可用的单个条件：[(索引键, XPath条件, 代价)]"""
+        scan = self.scan
+        tag = scan.tags[index]
+        element = scan.nodes[index]
+        attrs = scan.attrs_of(element)
+        result = []
+
+        value = attrs.get('id')
+        if isinstance(value, str) and value:
+            literal = quote_literal(value)
+            if literal:
+                result.append((('id', tag, value), f"@id={literal}", _value_cost(ID_COST, value)))
+
+        classes = attrs.get('class')
+        if classes:
+            if isinstance(classes, str):
+                classes = classes.split()
+            for token in dict.fromkeys(classes):
+                literal = quote_literal(f" {token} ")
+                if literal:
+                    result.append((('class', tag, token),
+                                   f"contains(concat(' ',normalize-space(@class),' '),{literal})",
+                                   _value_cost(CLASS_COST, token)))
+
+        for name, cost in ATTRIBUTE_COSTS.items():
+            value = attrs.get(name)
+            if isinstance(value, str) and value:
+                literal = quote_literal(value)
+                if literal:
+                    result.append((('attr', tag, name, value), f"@{name}={literal}", _value_cost(cost, value)))
+
+        for text in dict.fromkeys(normalize_space(text) for text in scan.text_nodes_of(element)):
+            if text and len(text) <= TEXT_LOCATOR_LIMIT:
+                literal = quote_literal(text)
+                if literal:
+                    result.append((('text', tag, text), f"text()[normalize-space()={literal}]", TEXT_COST))
+        return result
+
+    def _set(self, key):
+        members = self._sets.get(key)
+        if members is None:
+            members = self._sets[key] = frozenset(self.postings.get(key, ()))
+        return members
+
+    def count(self, keys, anchor=None):
+        """同时满足所有条件的元素数量，anchor为祖先下标时只统计其子树内的元素"""
+        if len(keys) == 1:
+            indices = self.postings.get(keys[0], ())
+            if anchor is None:
+                return len(indices)
+            return bisect_left(indices, self.subtree_ends[anchor]) - bisect_right(indices, anchor)
+
+        sets = sorted((self._set(key) for key in keys), key=len)
+        members = sets[0].intersection(*sets[1:])
+        if anchor is None:
+            return len(members)
+        end = self.subtree_ends[anchor]
+        return sum(1 for index in members if anchor < index < end)
+
+    def _anchors(self, index):
+        """最近的几个可唯一定位的祖先：[(下标, XPath, 代价)]"""
+        scan = self.scan
+        anchors = []
+        parent = scan.parents[index]
+        depth = 0
+        while parent > 0 and depth < ANCHOR_SEARCH_DEPTH and len(anchors) < ANCHOR_LIMIT:
+            depth += 1
+            tag = scan.tags[parent]
+            if tag not in ANCHOR_EXCLUDED_TAGS:
+                best = None
+                if self.count((('tag', tag),)) == 1:
+                    best = (TAG_COST, f"//{tag}")
+                for key, predicate, cost in self.predicates(parent):
+                    if (best is None or cost < best[0]) and self.count((key,)) == 1:
+                        best = (cost, f"//{tag}[{predicate}]")
+                if best is not None:
+                    anchors.append((parent, best[1], best[0]))
+            parent = scan.parents[parent]
+        return anchors
+
+    def candidates(self, index):
+        """按代价排序的候选：[(代价, XPath, 索引键, 锚点下标)]"""
+        tag = self.scan.tags[index]
+        predicates = self.predicates(index)
+        tag_key = ('tag', tag)
+        options = [(TAG_COST, f"//{tag}", (tag_key,))]
+        for key, predicate, cost in predicates:
+            options.append((cost, f"//{tag}[{predicate}]", (key,)))
+        for (key1, predicate1, cost1), (key2, predicate2, cost2) in combinations(predicates, 2):
+            options.append((cost1 + cost2, f"//{tag}[{predicate1} and {predicate2}]", (key1, key2)))
+
+        result = [(cost + LENGTH_WEIGHT * len(xpath), xpath, keys, None) for cost, xpath, keys in options]
+        for anchor, anchor_xpath, anchor_cost in self._anchors(index):
+            for cost, xpath, keys in options[:len(predicates) + 1]:
+                xpath = anchor_xpath + xpath
+                cost += anchor_cost + ANCHOR_COST
+                result.append((cost + LENGTH_WEIGHT * len(xpath), xpath, keys, anchor))
+        result.sort(key=lambda item: (item[0], item[1]))
+        return result
+
+    def find(self, element):
+        """元素的最短唯一定位XPath，返回(XPath, 代价)"""
+        index = self.scan.index_of[id(element)]
+        for cost, xpath, keys, anchor in self.candidates(index):
+            if self.count(keys, anchor) == 1:
+                return xpath, cost
+
+        # 兜底：在最近的锚点（没有则整个文档）内按文档顺序取下标
+        tag = self.scan.tags[index]
+        indices = self.postings[('tag', tag)]
+        anchors = self._anchors(index)
+        if anchors:
+            anchor, anchor_xpath, anchor_cost = anchors[0]
+            position = bisect_left(indices, index) - bisect_right(indices, anchor) + 1
+            xpath = f"({anchor_xpath}//{tag})[{position}]"
+            cost = FALLBACK_COST + anchor_cost
+        else:
+            position = bisect_left(indices, index) + 1
+            xpath = f"(//{tag})[{position}]"
+            cost = FALLBACK_COST + ANCHOR_EXCLUDED_PENALTY
+        return xpath, cost + LENGTH_WEIGHT * len(xpath)
+
+
+def get_locator_index(scan):
+    """取得文档的定位索引，首次使用时建立并缓存在节点表上"""
+    if scan.locator_index is None:
+        scan.locator_index = LocatorIndex(scan)
+    return scan.locator_index
+
+
+def find_unique_locator(scan, element):
+    """元素的最短唯一定位XPath"""
+    return get_locator_index(scan).find(element)[0]
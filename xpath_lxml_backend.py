@@ -0,0 +1,165 @@
+"""lxml解析后端 - 直接在lxml元素上遍历，结果与BeautifulSoup后端一致"""
+import re
+
+from bs4.builder import HTMLTreeBuilder
+from bs4.element import CData, NavigableString
+from lxml import etree
+
+from xpath_engine import PROGRESS_INTERVAL, DocumentScan, finish_scan
+from xpath_rules import compiled_rules
+from xpath_source import SourceFile
+
+# 与BeautifulSoup保持一致：这些属性按空白拆分成列表
+CDATA_LIST_ATTRIBUTES = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+# 与BeautifulSoup保持一致：这些标签内的文本是特殊字符串类型，不计入外层元素的get_text
+STRING_CONTAINERS = HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS
+DEFAULT_STRING_SET = frozenset((NavigableString, CData))
+
+_nonwhitespace_re = re.compile(r"\S+")
+
+
+def element_attrs(element):
+    """按BeautifulSoup的规则返回lxml元素的属性字典（class等多值属性为列表）"""
+    attrs = dict(element.attrib)
+    if not attrs:
+        return attrs
+    universal = CDATA_LIST_ATTRIBUTES.get('*', ())
+    specific = CDATA_LIST_ATTRIBUTES.get(element.tag, ())
+    for key, value in attrs.items():
+        if key in universal or key in specific:
+            attrs[key] = _nonwhitespace_re.findall(value)
+    return attrs
+
+
+class LxmlDocumentScan(DocumentScan):
+    """lxml后端的节点表，元素为lxml元素，文档对象为ElementTree"""
+
+    backend = 'lxml'
+
+    def attrs_of(self, element):
+        """按BeautifulSoup的规则返回属性字典（class等多值属性为列表）"""
+        return element_attrs(element)
+
+    def text_nodes_of(self, element):
+        """元素的直接文本子节点：自身text加上各子节点（含注释）的tail"""
+        texts = [element.text] if element.text is not None else []
+        texts.extend(child.tail for child in element if child.tail is not None)
+        return texts
+
+
+def parse_lxml_tree(content):
+    """用lxml的HTML解析器解析文本或SourceFile，返回ElementTree
+
+    空文档（或只有空白、注释）返回没有根元素的ElementTree，遍历结果与BeautifulSoup后端一样为空。
+    """
+    # huge_tree取消libxml2的嵌套深度限制，与BeautifulSoup一致
+    parser = etree.HTMLParser(encoding='utf-8', huge_tree=True)
+    root = None
+    if isinstance(content, SourceFile) and content.is_utf8():
+        if len(content.data) > content.bom_length:
+            # UTF-8文件直接从内存映射分块交给解析器，不解码整个文件
+            for chunk in content.chunks():
+                parser.feed(chunk)
+            root = parser.close()
+    else:
+        if isinstance(content, SourceFile):
+            content = content.text()
+        if isinstance(content, str):
+            # 带编码声明的str不能直接交给lxml，统一转成UTF-8字节
+            content = content.encode('utf-8')
+        root = etree.fromstring(content, parser)
+    if root is None:
+        return etree.ElementTree()
+    return root.getroottree()
+
+
+def scan_lxml_document(tree, configs=None, progress=None):
+    """一次遍历lxml文档，得到与scan_document相同结构的节点表"""
+    scan = LxmlDocumentScan(tree)
+    rules = compiled_rules(configs)
+    dispatch = rules.dispatch
+    has_conditions = rules.has_conditions
+    nodes = scan.nodes
+    tags = scan.tags
+    parents = scan.parents
+    depths = scan.depths
+    children = scan.children
+    buckets = scan.buckets
+    index_of = scan.index_of
+    index_of[id(tree)] = 0
+    parts = [[]]
+    own_sets = [DEFAULT_STRING_SET]
+    # containers[i]: 元素i内文本的字符串类型（所在最内层script/style等容器决定）
+    containers = [NavigableString]
+
+    nodes.append(tree)
+    tags.append('[document]')
+    parents.append(-1)
+    depths.append(0)
+    children.append([])
+
+    root = tree.getroot()
+    body_index = html_index = None
+    visited = 0
+    for node in (root.iter() if root is not None else ()):
+        visited += 1
+        if progress is not None and visited % PROGRESS_INTERVAL == 0:
+            progress(visited)
+
+        parent = node.getparent()
+        parent_index = index_of[id(parent)] if parent is not None else 0
+        name = node.tag
+        if name.__class__ is not str:
+            # 注释、处理指令：自身内容不计入文本，tail属于父元素
+            tail = node.tail
+            if tail:
+                tail = tail.strip()
+                if tail:
+                    parts[parent_index].append((containers[parent_index], tail))
+            continue
+
+        index = len(nodes)
+        index_of[id(node)] = index
+        nodes.append(node)
+        tags.append(name)
+        parents.append(parent_index)
+        depths.append(depths[parent_index] + 1)
+        children.append([])
+        children[parent_index].append(index)
+        parts.append([])
+        parts[parent_index].append(index)
+
+        container = STRING_CONTAINERS.get(name)
+        own_sets.append(frozenset((container,)) if container else DEFAULT_STRING_SET)
+        containers.append(container or containers[parent_index])
+
+        text = node.text
+        if text:
+            text = text.strip()
+            if text:
+                parts[index].append((containers[index], text))
+        tail = node.tail
+        if tail:
+            tail = tail.strip()
+            if tail:
+                parts[parent_index].append((containers[parent_index], tail))
+
+        keys = dispatch.get(name)
+        if keys:
+            for key in keys:
+                buckets.setdefault(key, []).append(node)
+        if has_conditions:
+            for key in rules.match(name, node.get):
+                buckets.setdefault(key, []).append(node)
+        if name == 'body' and body_index is None:
+            body_index = index
+        elif name == 'html' and html_index is None:
+            html_index = index
+
+    scan.visited = visited
+    return finish_scan(scan, parts, own_sets, body_index, html_index)
+
+
+def parse_lxml_document(content, configs=None, progress=None):
+    """解析HTML文本并用lxml后端完成一次文档遍历"""
+    return scan_lxml_document(parse_lxml_tree(content), configs, progress)
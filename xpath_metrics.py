@@ -0,0 +1,155 @@
+"""运行统计 - 分析各阶段的耗时和计数（访问节点数、生成的XPath数、Treeview插入数、缓存命中等）
+
+默认关闭。关闭时stage()返回共用的空上下文、count()只判断一次开关，热点路径上几乎没有开销；
+计数尽量在循环结束后按批计入（如遍历结束后按scan.visited一次计入），而不是每个节点调用一次。
+界面的调试面板、命令行的--metrics都读取模块级的metrics实例。
+"""
+import functools
+import json
+import threading
+import time
+
+
+class _NullStage:
+    """统计关闭时stage()返回的空上下文"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _StageTimer:
+    """计时一个阶段，退出时计入统计"""
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """各阶段的调用次数、累计耗时、最长一次耗时，以及命名计数器（可在多个线程中记录）"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.stages = {}  # 阶段名 -> [调用次数, 累计秒数, 最长一次秒数]
+        self.counters = {}  # 计数器名 -> 数量
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+
+    def stage(self, name):
+        """with metrics.stage('parse'): ... 计时一个阶段（关闭时不计时）"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _StageTimer(self, name)
+
+    def wrap(self, name, function):
+        """统计开启时返回计时的function，关闭时原样返回（用于热点循环：循环前决定一次，循环内没有额外开销）"""
+        if not self.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _StageTimer(self, name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def add_time(self, name, seconds, calls=1):
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [calls, seconds, seconds]
+            else:
+                entry[0] += calls
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def count(self, name, amount=1):
+        """计数器加amount（关闭时忽略）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """当前统计的可序列化副本"""
+        with self._lock:
+            return {
+                'stages': {name: {'calls': calls, 'seconds': seconds, 'max_seconds': longest}
+                           for name, (calls, seconds, longest) in self.stages.items()},
+                'counters': dict(self.counters),
+            }
+
+    def merge(self, snapshot):
+        """合并另一个进程的统计（snapshot()的结果），耗时相加"""
+        with self._lock:
+            for name, stats in snapshot['stages'].items():
+                entry = self.stages.get(name)
+                if entry is None:
+                    self.stages[name] = [stats['calls'], stats['seconds'], stats['max_seconds']]
+                else:
+                    entry[0] += stats['calls']
+                    entry[1] += stats['seconds']
+                    entry[2] = max(entry[2], stats['max_seconds'])
+            for name, amount in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_json(self, **extra):
+        """JSON格式的统计，extra中的键值一并写入"""
+        data = dict(extra)
+        data.update(self.snapshot())
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def format_text(self):
+        """按累计耗时排列的文本表格（调试面板和命令行使用）"""
+        snapshot = self.snapshot()
+        lines = [f"{'阶段':<28}{'次数':>8}{'累计(ms)':>12}{'平均(ms)':>10}{'最长(ms)':>10}"]
+        for name, stats in sorted(snapshot['stages'].items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f"{name:<28}{stats['calls']:>8}{stats['seconds'] * 1000:>12.1f}"
+                         f"{stats['seconds'] * 1000 / stats['calls']:>10.2f}{stats['max_seconds'] * 1000:>10.1f}")
+        lines.append('')
+        lines.append(f"{'计数':<28}{'数量':>8}")
+        for name, amount in sorted(snapshot['counters'].items()):
+            lines.append(f"{name:<28}{amount:>8}")
+        return '\n'.join(lines)
+
+
+# 全局统计实例
+metrics = Metrics()
+
+
+def timed(name):
+    """装饰器：把函数调用计为一个阶段（统计关闭时直接调用）"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            with _StageTimer(metrics, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,278 @@
+"""可插拔规则 - 元素类型和XPath策略的注册表，可从JSON规则文件或入口点加载
+
+元素类型规则编译成按标签的分派表：遍历文档时每个元素只按自己的标签查一次表，
+带属性条件或通配标签的规则另外检查一次，规则再多也不增加文档遍历次数。
+
+规则文件格式（JSON）：
+    {
+      "element_types": [
+        {"name": "测试ID", "tag": "*", "attr": "data-testid"},
+        {"name": "ARIA按钮", "tag": "*", "attr": "role", "value": "button"},
+        {"name": "自定义组件", "tag": "*", "custom": true}
+      ],
+      "strategies": [
+        {"name": "测试ID", "attr": "data-testid"},
+        {"name": "ARIA", "attrs": ["role", "aria-label"]},
+        {"name": "组件", "template": "//{tag}[@slot='{slot}']"},
+        {"name": "自定义", "function": "mypackage.rules:xpath_for"}
+      ],
+      "replace_builtin": false
+    }
+
+入口点（组名ENTRY_POINT_GROUP）指向一个函数register(rules)，在其中调用rules.add_element_type/add_strategy。
+策略函数签名为strategy(element, tag, attrs, scan)，返回XPath，不适用时返回None。
+"""
+import hashlib
+import importlib
+import json
+import os
+from importlib import metadata
+
+ANY_TAG = '*'  # 匹配任意标签的元素类型
+ENTRY_POINT_GROUP = 'xpath_parser.rules'
+RULES_ENV = 'XPATH_RULES'  # 启动时加载的规则文件，多个文件用os.pathsep分隔
+# 元素类型规则中可以使用的键
+ELEMENT_TYPE_KEYS = ('name', 'tag', 'attr', 'value', 'custom', 'key')
+
+
+class RuleError(ValueError):
+    """规则配置有误"""
+
+
+def rule_key(config):
+    """元素类型的分桶键：普通类型为标签名，带条件的类型在标签后附加条件（可用key指定）"""
+    if config.get('key'):
+        return config['key']
+    key = config['tag']
+    if config.get('custom'):
+        key += ':custom'
+    if config.get('attr'):
+        value = config.get('value')
+        key += f"[@{config['attr']}='{value}']" if value is not None else f"[@{config['attr']}]"
+    return key
+
+
+def attr_text(value):
+    """属性值转为文本（BeautifulSoup的class等多值属性为列表）"""
+    return ' '.join(value) if isinstance(value, list) else value
+
+
+class CompiledRules:
+    """编译后的元素类型规则
+
+    dispatch: 标签 -> 无条件匹配该标签的分桶键元组
+    conditional: 标签 -> 该标签带条件规则的(分桶键, 属性, 值, 仅自定义组件)元组
+    wildcard: 通配标签规则的(分桶键, 属性, 值, 仅自定义组件)元组
+    """
+
+    def __init__(self, configs):
+        self.configs = list(configs)
+        self.keys = [rule_key(config) for config in self.configs]
+        dispatch = {}
+        conditional = {}
+        wildcard = []
+        for config, key in zip(self.configs, self.keys):
+            tag = config['tag']
+            if tag != ANY_TAG and not config.get('attr') and not config.get('custom'):
+                dispatch.setdefault(tag, []).append(key)
+                continue
+            matcher = (key, config.get('attr'), config.get('value'), bool(config.get('custom')))
+            if tag == ANY_TAG:
+                wildcard.append(matcher)
+            else:
+                conditional.setdefault(tag, []).append(matcher)
+        self.dispatch = {tag: tuple(keys) for tag, keys in dispatch.items()}
+        self.conditional = {tag: tuple(matchers) for tag, matchers in conditional.items()}
+        self.wildcard = tuple(wildcard)
+        # 没有带条件的规则时，遍历只需查dispatch
+        self.has_conditions = bool(self.conditional or self.wildcard)
+
+    def match(self, tag, get):
+        """带条件规则中匹配该元素的分桶键列表，get(属性名)返回属性值或None"""
+        keys = []
+        for matchers in (self.conditional.get(tag, ()), self.wildcard):
+            for key, attr, value, custom in matchers:
+                if custom and '-' not in tag:
+                    continue
+                if attr:
+                    actual = get(attr)
+                    if actual is None or (value is not None and attr_text(actual) != value):
+                        continue
+                keys.append(key)
+        return keys
+
+    def classify(self, tag, get):
+        """元素所属的全部分桶键"""
+        keys = self.dispatch.get(tag, ())
+        if self.has_conditions:
+            return list(keys) + self.match(tag, get)
+        return keys
+
+
+def _import_object(reference):
+    """按"模块:属性"导入对象"""
+    module_name, _, attribute = reference.partition(':')
+    if not module_name or not attribute:
+        raise RuleError(f"函数引用格式应为 模块:函数: {reference}")
+    target = importlib.import_module(module_name)
+    for part in attribute.split('.'):
+        target = getattr(target, part)
+    return target
+
+
+def attribute_strategy(attrs_wanted):
+    """声明式策略：按列出的属性组合定位（只使用元素上存在的属性）"""
+    def strategy(element, tag, attrs, scan):
+        parts = [f"@{attr}='{attr_text(attrs[attr])}'" for attr in attrs_wanted if attrs.get(attr)]
+        return f"//{tag}[{' and '.join(parts)}]" if parts else None
+    return strategy
+
+
+def template_strategy(template):
+    """声明式策略：用元素的标签、属性和文本填充模板，缺少模板中的字段时不适用"""
+    def strategy(element, tag, attrs, scan):
+        from xpath_engine import element_text
+        fields = {key: attr_text(value) for key, value in attrs.items()}
+        fields['tag'] = tag
+        text, length = element_text(element, scan)
+        if text and length == len(text):
+            fields.setdefault('text', text)
+        try:
+            return template.format_map(fields)
+        except (KeyError, IndexError):
+            return None
+    return strategy
+
+
+def strategy_from_config(config):
+    """由规则文件中的策略配置生成策略函数"""
+    if config.get('function'):
+        return _import_object(config['function'])
+    if config.get('template'):
+        return template_strategy(config['template'])
+    if config.get('attr'):
+        return attribute_strategy([config['attr']])
+    if config.get('attrs'):
+        return attribute_strategy(list(config['attrs']))
+    raise RuleError(f"策略 {config.get('name')} 需要 function、template、attr 或 attrs")
+
+
+class RuleSet:
+    """元素类型与XPath策略的注册表，编译结果在修改前一直复用"""
+
+    def __init__(self, element_types=(), strategies=()):
+        self.element_types = []
+        self.strategies = []  # [(策略名, 策略函数)]，按生成顺序
+        self.sources = []  # 规则来源（用于缓存键）
+        self._compiled = None
+        for config in element_types:
+            self.add_element_type(config)
+        for name, function in strategies:
+            self.add_strategy(name, function)
+
+    def add_element_type(self, config):
+        """注册元素类型，config至少包含name和tag（tag为"*"表示任意标签）"""
+        unknown = set(config) - set(ELEMENT_TYPE_KEYS)
+        if unknown:
+            raise RuleError(f"元素类型 {config.get('name')} 含有未知的键: {', '.join(sorted(unknown))}")
+        if not config.get('name') or not config.get('tag'):
+            raise RuleError(f"元素类型需要 name 和 tag: {config}")
+        config = dict(config)
+        key = rule_key(config)
+        self.element_types = [existing for existing in self.element_types if rule_key(existing) != key]
+        self.element_types.append(config)
+        self._compiled = None
+
+    def add_strategy(self, name, function):
+        """注册XPath策略，同名策略替换原有的（保持原来的位置）"""
+        for position, (existing, _function) in enumerate(self.strategies):
+            if existing == name:
+                self.strategies[position] = (name, function)
+                break
+        else:
+            self.strategies.append((name, function))
+        self._compiled = None
+
+    def load_config(self, data, source='<config>'):
+        """加载规则配置字典（规则文件的内容）"""
+        if data.get('replace_builtin'):
+            self.element_types = []
+            self.strategies = []
+        for config in data.get('element_types', ()):
+            self.add_element_type(config)
+        for config in data.get('strategies', ()):
+            if not config.get('name'):
+                raise RuleError(f"策略需要 name: {config}")
+            self.add_strategy(config['name'], strategy_from_config(config))
+        self.sources.append(f"{source}:{hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()}")
+        self._compiled = None
+
+    def load_file(self, path):
+        """加载JSON规则文件"""
+        with open(path, encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise RuleError(f"规则文件 {path} 不是有效的JSON: {e}") from e
+        self.load_config(data, os.path.basename(path))
+
+    def load_entry_points(self, group=ENTRY_POINT_GROUP):
+        """调用已安装包在入口点组中注册的register(rules)函数"""
+        for entry_point in sorted(metadata.entry_points(group=group), key=lambda ep: ep.name):
+            entry_point.load()(self)
+            self.sources.append(f"{entry_point.name}={entry_point.value}")
+        self._compiled = None
+
+    def compile(self):
+        """编译元素类型规则（结果缓存到下次修改）"""
+        if self._compiled is None:
+            self._compiled = CompiledRules(self.element_types)
+        return self._compiled
+
+    def fingerprint(self):
+        """规则内容的摘要，用于缓存键"""
+        if not self.sources:
+            return 'builtin'
+        return hashlib.sha256('\n'.join(self.sources).encode('utf-8')).hexdigest()[:16]
+
+
+def load_rules(paths=(), entry_points=True, builtin=True):
+    """内置规则 + 入口点注册的规则 + 规则文件（后加载的同名类型和策略覆盖先前的）"""
+    from xpath_engine import BUILTIN_STRATEGIES, ELEMENT_CONFIGS
+    rules = RuleSet(ELEMENT_CONFIGS, BUILTIN_STRATEGIES) if builtin else RuleSet()
+    if entry_points:
+        rules.load_entry_points()
+    for path in paths:
+        rules.load_file(path)
+    return rules
+
+
+_active = None  # 当前使用的规则
+
+
+def env_rule_paths():
+    """环境变量RULES_ENV中列出的规则文件"""
+    return [path for path in os.environ.get(RULES_ENV, '').split(os.pathsep) if path]
+
+
+def active_rules():
+    """当前使用的规则，首次调用时加载内置规则、入口点和环境变量中的规则文件"""
+    global _active
+    if _active is None:
+        _active = load_rules(env_rule_paths())
+    return _active
+
+
+def use_rules(rules):
+    """替换当前使用的规则"""
+    global _active
+    _active = rules
+
+
+def compiled_rules(configs=None):
+    """configs为None时返回当前规则的编译结果，否则编译给定的元素类型列表"""
+    if configs is None:
+        return active_rules().compile()
+    if isinstance(configs, CompiledRules):
+        return configs
+    return CompiledRules(configs)
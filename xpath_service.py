@@ -0,0 +1,408 @@
+"""XPath定位服务 - 基于asyncio的本地HTTP服务，供爬虫等程序调用生成逻辑
+
+接口（请求和响应都是JSON；/analyze也接受Content-Type为text/html的原始HTML，选项放在查询参数中）：
+    POST /analyze   {"html": ...} 或 {"hash": ...}，可选 backend、parser、verify、locate、limit、total_limit、
+                    type_limits → 文档哈希和XPath记录（每条带node：元素在文档中的节点下标）
+    POST /locators  {"hash"/"html", "node": 节点下标} 或 {"hash"/"html", "xpath": 表达式}（取第一个匹配元素）
+                    → 该元素的各策略XPath、最短唯一定位、描述及每条XPath的匹配数量
+    POST /evaluate  {"hash"/"html", "xpath": 表达式} → 匹配数量和匹配元素（节点下标、标签、描述）
+    GET  /health    → 服务状态
+    GET  /stats     → 各工作进程缓存的文档数和命中情况
+
+解析和生成在进程池中进行，事件循环不被阻塞。解析过的文档留在工作进程的LRU中（数量有上限），
+同一文档（按内容哈希）总是交给同一个工作进程，后续只带hash的请求不再解析；
+文档已被淘汰时返回404（error为unknown_document），客户端重新发送html即可。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from xpath_cache import content_hash
+from xpath_engine import (BACKENDS, DEFAULT_ELEMENT_LIMIT, count_by_element_type, generate_element_xpaths,
+                          generate_xpath_rows, get_element_description, make_limits, parse_html, parse_limit)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 每个工作进程缓存的已解析文档数
+DEFAULT_DOCUMENT_CACHE = 32
+# 请求体大小上限（字节）
+MAX_BODY = 256 * 1024 * 1024
+# /evaluate最多返回的匹配元素数
+MAX_MATCHES = 1000
+PARSERS = ('lxml', 'html.parser')
+
+
+class ServiceError(Exception):
+    """返回给客户端的错误：HTTP状态码、错误代码和说明"""
+
+    def __init__(self, status, code, message):
+        super().__init__(status, code, message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+# ---- 工作进程 ----
+
+class ParsedDocument:
+    """工作进程中缓存的已解析文档，XPath验证器和节点反查表按需建立"""
+
+    def __init__(self, scan):
+        self.scan = scan
+        self._verifier = None
+        self._node_of = None
+
+    @property
+    def verifier(self):
+        if self._verifier is None:
+            from xpath_verify import XPathVerifier
+            self._verifier = XPathVerifier(self.scan)
+        return self._verifier
+
+    def evaluate(self, xpath):
+        """执行XPath，返回(匹配数量, 匹配元素的节点下标列表，文档顺序)；表达式无效时抛出ServiceError"""
+        count, found = self.verifier.matches(xpath)
+        if count is None:
+            raise ServiceError(422, 'invalid_xpath', f"XPath无效: {xpath}")
+        if self._node_of is None:
+            mirror = self.verifier.mirror
+            # lxml后端直接按元素查节点表；BeautifulSoup后端的XPath在镜像lxml树上执行
+            self._node_of = (self.scan.index_of if mirror is None
+                             else {id(element): index for index, element in enumerate(mirror) if element is not None})
+        node_of = self._node_of
+        return count, sorted(node_of[item] for item in found if item in node_of)
+
+    def element(self, node):
+        scan = self.scan
+        # JSON的true/false解析为bool，也是int的子类
+        if isinstance(node, bool) or not isinstance(node, int) or not 0 < node < len(scan.nodes):
+            raise ServiceError(400, 'invalid_node', f"节点下标应为1到{len(scan.nodes) - 1}之间的整数")
+        return scan.nodes[node]
+
+    def describe(self, node):
+        scan = self.scan
+        return {'node': node, 'tag': scan.tags[node], 'description': get_element_description(scan.nodes[node], scan)}
+
+
+_documents = OrderedDict()  # (内容哈希, 后端, 解析器) -> ParsedDocument，按最近使用排列
+_document_limit = DEFAULT_DOCUMENT_CACHE
+_stats = {'parses': 0, 'hits': 0, 'misses': 0}
+
+
+def _init_worker(document_limit):
+    global _document_limit
+    _document_limit = document_limit
+
+
+def _document(key, html):
+    """取得已解析的文档，未缓存时解析html（没有html时抛出unknown_document）"""
+    document = _documents.get(key)
+    if document is not None:
+        _documents.move_to_end(key)
+        _stats['hits'] += 1
+        return document
+    _stats['misses'] += 1
+    if html is None:
+        raise ServiceError(404, 'unknown_document', "文档不在缓存中，请重新发送html")
+    _hash, backend, parser = key
+    try:
+        document = ParsedDocument(parse_html(html, parser, backend))
+    except ValueError as e:
+        # 空文档或无法解析的HTML是请求内容的问题
+        raise ServiceError(400, 'bad_request', f"HTML无法解析: {e}")
+    _stats['parses'] += 1
+    _documents[key] = document
+    while len(_documents) > _document_limit:
+        _documents.popitem(last=False)
+    return document
+
+
+def _encode(result):
+    """在工作进程中编码响应，事件循环只负责发送"""
+    return json.dumps(result, ensure_ascii=False).encode('utf-8')
+
+
+def worker_analyze(key, html, verify, locate, limits):
+    document = _document(key, html)
+    scan = document.scan
+    rows = []
+    for item in generate_xpath_rows(scan, verify=verify, locate=locate, limits=limits):
+        element = item.pop('element')
+        item['node'] = scan.index_of[id(element)]
+        item['description'] = get_element_description(element, scan)
+        rows.append(item)
+    return _encode({'hash': key[0], 'rows': rows, 'stats': count_by_element_type(rows)})
+
+
+def worker_locators(key, html, node, xpath):
+    document = _document(key, html)
+    scan = document.scan
+    if node is None:
+        _count, nodes = document.evaluate(xpath)
+        if not nodes:
+            raise ServiceError(404, 'no_match', f"XPath没有匹配元素: {xpath}")
+        node = nodes[0]
+    element = document.element(node)
+    from xpath_locator import get_locator_index
+    locator, _cost = get_locator_index(scan).find(element)
+    xpaths = []
+    for xpath_type, expression in generate_element_xpaths(element, scan.tags[node], scan).items():
+        count, hit = document.verifier.verify(expression, element)
+        xpaths.append({'type': xpath_type, 'xpath': expression, 'match_count': count, 'hits_target': hit})
+    result = document.describe(node)
+    result.update({'hash': key[0], 'locator': locator, 'xpaths': xpaths})
+    return _encode(result)
+
+
+def worker_evaluate(key, html, xpath):
+    document = _document(key, html)
+    count, nodes = document.evaluate(xpath)
+    return _encode({'hash': key[0], 'xpath': xpath, 'match_count': count,
+                    'matches': [document.describe(node) for node in nodes[:MAX_MATCHES]],
+                    'truncated': len(nodes) > MAX_MATCHES})
+
+
+def worker_stats():
+    return dict(_stats, documents=len(_documents), pid=os.getpid())
+
+
+# ---- 事件循环 ----
+
+def _option(payload, name, default, choices=None):
+    value = payload.get(name, default)
+    if choices is not None and value not in choices:
+        raise ServiceError(400, 'invalid_option', f"{name} 应为 {', '.join(choices)} 之一")
+    return value
+
+
+def _flag(payload, name, default):
+    value = payload.get(name, default)
+    if isinstance(value, str):
+        return value.lower() not in ('0', 'false', 'no', '')
+    return bool(value)
+
+
+def _limit(value):
+    return None if value is None else parse_limit(value)
+
+
+def request_limits(payload):
+    """请求中的元素数量上限：limit（每类，默认8）、total_limit、type_limits（{标签或类型名: 上限}）"""
+    try:
+        type_limits = {name: _limit(value) for name, value in (payload.get('type_limits') or {}).items()}
+        return make_limits(_limit(payload.get('limit', DEFAULT_ELEMENT_LIMIT)), type_limits,
+                           _limit(payload.get('total_limit')))
+    except (ValueError, AttributeError):
+        raise ServiceError(400, 'invalid_limit', "上限应为非负整数或\"all\"")
+
+
+class LocatorService:
+    """HTTP请求处理；shards为单进程执行器，同一文档按内容哈希固定交给其中一个"""
+
+    def __init__(self, workers=None, document_cache=DEFAULT_DOCUMENT_CACHE):
+        workers = workers or os.cpu_count() or 1
+        self.shards = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(document_cache,))
+                       for _ in range(workers)]
+        self.routes = {
+            ('POST', '/analyze'): self.analyze,
+            ('POST', '/locators'): self.locators,
+            ('POST', '/evaluate'): self.evaluate,
+            ('GET', '/health'): self.health,
+            ('GET', '/stats'): self.stats,
+        }
+        self.requests = 0
+
+    def close(self):
+        for shard in self.shards:
+            shard.shutdown(cancel_futures=True)
+
+    async def run_in_shard(self, digest, function, *args):
+        shard = self.shards[int(digest[:8], 16) % len(self.shards)]
+        return await asyncio.get_running_loop().run_in_executor(shard, function, *args)
+
+    async def document_key(self, payload):
+        """请求中的文档：(内容哈希, 后端, 解析器)和html（只给hash时为None）"""
+        backend = _option(payload, 'backend', 'lxml', BACKENDS)
+        parser = _option(payload, 'parser', 'lxml', PARSERS)
+        html = payload.get('html')
+        if html is not None:
+            if not isinstance(html, str):
+                raise ServiceError(400, 'invalid_html', "html应为字符串")
+            digest = await asyncio.to_thread(content_hash, html)
+        else:
+            digest = payload.get('hash')
+            if not isinstance(digest, str) or len(digest) != 64:
+                raise ServiceError(400, 'missing_document', "需要html或hash（64位十六进制内容哈希）")
+            try:
+                int(digest, 16)
+            except ValueError:
+                raise ServiceError(400, 'missing_document', "hash应为十六进制内容哈希")
+        return (digest.lower(), backend, parser), html
+
+    async def analyze(self, payload):
+        key, html = await self.document_key(payload)
+        return await self.run_in_shard(key[0], worker_analyze, key, html, _flag(payload, 'verify', True),
+                                       _flag(payload, 'locate', True), request_limits(payload))
+
+    async def locators(self, payload):
+        key, html = await self.document_key(payload)
+        node = payload.get('node')
+        xpath = payload.get('xpath')
+        if (node is None) == (xpath is None):
+            raise ServiceError(400, 'missing_target', "需要node或xpath之一")
+        return await self.run_in_shard(key[0], worker_locators, key, html, node, xpath)
+
+    async def evaluate(self, payload):
+        key, html = await self.document_key(payload)
+        xpath = payload.get('xpath')
+        if not isinstance(xpath, str) or not xpath:
+            raise ServiceError(400, 'missing_xpath', "需要xpath")
+        return await self.run_in_shard(key[0], worker_evaluate, key, html, xpath)
+
+    async def health(self, payload):
+        return {'status': 'ok', 'workers': len(self.shards), 'requests': self.requests}
+
+    async def stats(self, payload):
+        loop = asyncio.get_running_loop()
+        shards = await asyncio.gather(*(loop.run_in_executor(shard, worker_stats) for shard in self.shards))
+        return {'requests': self.requests, 'shards': shards}
+
+    async def dispatch(self, method, target, headers, body):
+        """处理一个请求，返回(状态码, 响应体bytes)"""
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _method, path in self.routes):
+                raise ServiceError(405, 'method_not_allowed', f"{url.path} 不支持 {method}")
+            raise ServiceError(404, 'not_found', f"没有接口 {url.path}")
+        payload = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        content_type = headers.get('content-type', '')
+        if body and content_type.startswith('text/html'):
+            charset = 'utf-8'
+            for part in content_type.split(';')[1:]:
+                name, _, value = part.strip().partition('=')
+                if name.lower() == 'charset' and value:
+                    charset = value.strip('"')
+            try:
+                payload['html'] = await asyncio.to_thread(body.decode, charset, 'replace')
+            except LookupError:
+                raise ServiceError(400, 'invalid_charset', f"未知编码: {charset}")
+        elif body:
+            try:
+                data = await asyncio.to_thread(json.loads, body)
+            except (ValueError, UnicodeDecodeError) as e:
+                raise ServiceError(400, 'invalid_json', f"请求体不是有效的JSON: {e}")
+            if not isinstance(data, dict):
+                raise ServiceError(400, 'invalid_json', "请求体应为JSON对象")
+            payload.update(data)
+        result = await handler(payload)
+        return 200, result if isinstance(result, bytes) else _encode(result)
+
+    async def handle_connection(self, reader, writer):
+        """处理一个连接上的请求（支持keep-alive）"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, _error_body('bad_request', "请求行无效"), False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    await self.respond(writer, 411, _error_body('length_required', "请使用Content-Length"), False)
+                    break
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY:
+                    await self.respond(writer, 413, _error_body('body_too_large', "请求体过大或长度无效"), False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                self.requests += 1
+                try:
+                    status, data = await self.dispatch(method.upper(), target, headers, body)
+                except ServiceError as e:
+                    status, data = e.status, _error_body(e.code, e.message)
+                except Exception as e:
+                    status, data = 500, _error_body('internal_error', str(e))
+                await self.respond(writer, status, data, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def respond(self, writer, status, data, keep_alive):
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+
+def _error_body(code, message):
+    return _encode({'error': code, 'message': message})
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, document_cache=DEFAULT_DOCUMENT_CACHE,
+                ready=None):
+    """启动服务并一直运行；ready(server)在开始监听后调用"""
+    service = LocatorService(workers, document_cache)
+    try:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='XPath定位HTTP服务')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'监听地址（默认{DEFAULT_HOST}）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口（默认{DEFAULT_PORT}）')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='工作进程数（默认CPU核数）')
+    parser.add_argument('--document-cache', type=int, default=DEFAULT_DOCUMENT_CACHE,
+                        help=f'每个工作进程缓存的已解析文档数（默认{DEFAULT_DOCUMENT_CACHE}）')
+    args = parser.parse_args(argv)
+
+    def ready(server):
+        address = server.sockets[0].getsockname()
+        print(f"XPath服务已启动: http://{address[0]}:{address[1]}（{args.workers} 个工作进程）", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.document_cache, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
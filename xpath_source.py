@@ -0,0 +1,208 @@
+"""源文件读取 - 内存映射读入HTML文件，按BOM、meta charset和内容探测识别编码
+
+文件字节通过mmap由操作系统按需换页，不复制到Python堆：lxml后端直接从映射分块解析UTF-8文档，
+缓存键直接对映射计算哈希，只有需要文本时（BeautifulSoup、源码视图）才解码一次。
+"""
+import codecs
+import mmap
+import os
+import re
+
+# BOM -> 编码，UTF-32必须排在UTF-16之前（FF FE 00 00以FF FE开头）
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+META_SCAN_BYTES = 4096  # 在文件开头这么多字节内查找<meta charset>
+SNIFF_BYTES = 65536  # 没有声明编码时用于探测的字节数
+CHUNK_SIZE = 1024 * 1024  # 分块交给解析器的字节数
+FALLBACK_ENCODING = 'cp1252'  # 都无法判断时按浏览器的默认处理
+
+# 声明的编码 -> 实际使用的编码（按浏览器的处理：GB2312/GBK按超集GB18030，Latin-1按Windows-1252；
+# 能在ASCII中读到的meta声明不可能是UTF-16/32，按UTF-8处理）
+ENCODING_ALIASES = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'latin-1': 'cp1252',
+    'iso8859-1': 'cp1252',
+    'ascii': 'cp1252',
+    'utf-16': 'utf-8',
+    'utf-16-le': 'utf-8',
+    'utf-16-be': 'utf-8',
+    'utf-32': 'utf-8',
+    'utf-32-le': 'utf-8',
+    'utf-32-be': 'utf-8',
+}
+
+_meta_charset_re = re.compile(rb'<meta\s[^>]*?charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+
+
+def normalize_encoding(name):
+    """把声明的编码名转换为Python编解码器名，不认识时返回None"""
+    try:
+        encoding = codecs.lookup(name).name
+    except LookupError:
+        return None
+    return ENCODING_ALIASES.get(encoding, encoding)
+
+
+def _decodes_as(sample, encoding, truncated):
+    """sample能否按encoding严格解码（truncated时允许结尾被截断的多字节字符）"""
+    try:
+        sample.decode(encoding)
+        return True
+    except UnicodeDecodeError as e:
+        return truncated and e.reason == 'unexpected end of data'
+
+
+def detect_encoding(data):
+    """识别HTML字节的编码，返回(编码, BOM字节数)
+
+    依次检查BOM、开头的<meta charset>声明，最后探测内容：能按UTF-8解码即为UTF-8，
+    其次尝试GB18030，都不行时按Windows-1252。
+    """
+    for bom, encoding in BOM_ENCODINGS:
+        if data[:len(bom)] == bom:
+            return encoding, len(bom)
+
+    match = _meta_charset_re.search(data[:META_SCAN_BYTES])
+    if match:
+        encoding = normalize_encoding(match.group(1).decode('ascii'))
+        if encoding:
+            return encoding, 0
+
+    sample = data[:SNIFF_BYTES]
+    truncated = len(data) > SNIFF_BYTES
+    for encoding in ('utf-8', 'gb18030'):
+        if _decodes_as(sample, encoding, truncated):
+            return encoding, 0
+    return FALLBACK_ENCODING, 0
+
+
+class SourceFile:
+    """内存映射的HTML文件，可用作上下文管理器
+
+    data为文件字节（mmap，空文件为b''），encoding和bom_length为识别结果。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            if os.fstat(self._file.fileno()).st_size:
+                self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = b''
+        except Exception:
+            self._file.close()
+            raise
+        self.encoding, self.bom_length = detect_encoding(self.data)
+        self._text = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """释放映射和文件"""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def text(self):
+        """解码后的全文（首次调用时解码，无法解码的字节替换为U+FFFD）"""
+        if self._text is None:
+            with memoryview(self.data) as view, view[self.bom_length:] as body:
+                self._text = str(body, self.encoding, 'replace')
+        return self._text
+
+    def is_utf8(self):
+        return self.encoding == 'utf-8'
+
+    def source_text(self):
+        """文件内容的SourceText：已解码时直接使用文本，否则复制字节（不解码），映射关闭后仍可使用"""
+        if self._text is not None:
+            return SourceText(text=self._text)
+        return SourceText(bytes(self.data), self.encoding, self.bom_length)
+
+    def chunks(self, size=CHUNK_SIZE):
+        """按块产出BOM之后的原始字节，供增量解析器使用"""
+        for start in range(self.bom_length, len(self.data), size):
+            yield self.data[start:start + size]
+
+
+class SourceText:
+    """延迟解码的源码：保存原始字节和识别出的编码，首次调用text()时才解码（与SourceFile.text()相同）
+
+    界面只在显示源码视图、高亮源码或导出源码偏移时才需要文本，lxml后端分析本身不解码。
+    """
+
+    def __init__(self, data=b'', encoding='utf-8', bom_length=0, text=None):
+        self.data = data
+        self.encoding = encoding
+        self.bom_length = bom_length
+        self._text = text
+
+    def decoded(self):
+        """是否已有文本（不需要再解码）"""
+        return self._text is not None
+
+    def text(self):
+        if self._text is None:
+            with memoryview(self.data) as view, view[self.bom_length:] as body:
+                self._text = str(body, self.encoding, 'replace')
+            self.data = None  # 解码后不再需要原始字节
+        return self._text
+
+
+def read_text(path):
+    """读取HTML文件为文本（自动识别编码）"""
+    with SourceFile(path) as source:
+        return source.text()
+
+
+class Utf8Reader:
+    """把任意编码的二进制文件转为UTF-8字节流的只读文件对象，供iterparse等按块读取的解析器使用"""
+
+    def __init__(self, file, encoding):
+        self.file = file
+        self.decoder = codecs.getincrementaldecoder(encoding)('replace')
+        self.buffer = b''
+        self.position = 0
+        self.finished = False
+
+    def read(self, size=-1):
+        while not self.finished and (size < 0 or len(self.buffer) - self.position < size):
+            chunk = self.file.read(CHUNK_SIZE)
+            self.finished = not chunk
+            self.buffer = self.buffer[self.position:] + self.decoder.decode(chunk, self.finished).encode('utf-8')
+            self.position = 0
+        end = len(self.buffer) if size < 0 else self.position + size
+        result = self.buffer[self.position:end]
+        self.position += len(result)
+        return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+
+def open_utf8(path):
+    """打开HTML文件，返回产出UTF-8字节（不含BOM）的二进制文件对象"""
+    file = open(path, 'rb')
+    head = file.read(SNIFF_BYTES + 1)
+    encoding, bom_length = detect_encoding(head)
+    file.seek(bom_length)
+    if encoding == 'utf-8':
+        return file
+    return Utf8Reader(file, encoding)
@@ -0,0 +1,133 @@
+"""源码偏移表 - 记录每个元素在原始HTML文本中的起止位置，供原始HTML视图直接高亮"""
+from html.parser import HTMLParser
+
+# 没有结束标签的元素，范围到开始标签结束为止
+VOID_ELEMENTS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+                           'link', 'meta', 'param', 'source', 'track', 'wbr'))
+# 遇到这些开始标签时，隐式结束栈顶的同组元素（如<li>a<li>b）
+IMPLICIT_CLOSE = {
+    'p': ('p',),
+    'li': ('li',),
+    'option': ('option',),
+    'dt': ('dt', 'dd'),
+    'dd': ('dt', 'dd'),
+    'tr': ('tr', 'td', 'th'),
+    'td': ('td', 'th'),
+    'th': ('td', 'th'),
+}
+# 这些块级开始标签会隐式结束尚未关闭的<p>
+P_CLOSERS = frozenset(('address', 'article', 'aside', 'blockquote', 'details', 'div', 'dl', 'fieldset',
+                       'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+                       'header', 'hr', 'main', 'menu', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'ul'))
+# 对齐时向后查找属性名相同的源码标签的最大距离
+ALIGN_LOOKAHEAD = 20
+
+
+class SourceOffsetParser(HTMLParser):
+    """记录每个开始标签的起始偏移和对应元素的结束偏移"""
+
+    def __init__(self, content):
+        super().__init__()
+        self.content = content
+        self.line_starts = [0]
+        position = content.find('\n')
+        while position >= 0:
+            self.line_starts.append(position + 1)
+            position = content.find('\n', position + 1)
+        self.elements = []  # [标签, 属性名签名, 起始偏移, 结束偏移]，按源码顺序
+        self.open_elements = []  # 尚未结束的元素在elements中的下标
+
+    def _offset(self):
+        line, column = self.getpos()
+        return self.line_starts[line - 1] + column
+
+    def _close_until(self, position, predicate):
+        while self.open_elements and predicate(self.elements[self.open_elements[-1]][0]):
+            self.elements[self.open_elements.pop()][3] = position
+
+    def handle_starttag(self, tag, attrs):
+        start = self._offset()
+        closes = IMPLICIT_CLOSE.get(tag)
+        if closes:
+            self._close_until(start, lambda open_tag: open_tag in closes)
+        if tag in P_CLOSERS and self._is_open('p'):
+            self._close_to(start, 'p')
+        end = start + len(self.get_starttag_text() or '')
+        signature = tuple(sorted({name for name, _value in attrs}))
+        self.elements.append([tag, signature, start, end])
+        if tag not in VOID_ELEMENTS:
+            self.open_elements.append(len(self.elements) - 1)
+
+    def handle_startendtag(self, tag, attrs):
+        start = self._offset()
+        end = start + len(self.get_starttag_text() or '')
+        self.elements.append([tag, tuple(sorted({name for name, _value in attrs})), start, end])
+
+    def _is_open(self, tag):
+        return any(self.elements[index][0] == tag for index in self.open_elements)
+
+    def _close_to(self, position, tag, end=None):
+        """结束最近的tag元素，其内部未关闭的元素在position处结束"""
+        while self.open_elements:
+            index = self.open_elements.pop()
+            if self.elements[index][0] == tag:
+                self.elements[index][3] = position if end is None else end
+                break
+            self.elements[index][3] = position
+
+    def handle_endtag(self, tag):
+        if not self._is_open(tag):
+            return  # 多余的结束标签
+        start = self._offset()
+        close = self.content.find('>', start)
+        self._close_to(start, tag, close + 1 if close >= 0 else len(self.content))
+
+    def close(self):
+        super().close()
+        for index in self.open_elements:
+            self.elements[index][3] = len(self.content)
+        self.open_elements = []
+
+
+def build_source_map(content, scan):
+    """返回与节点表对齐的(起始偏移, 结束偏移)列表，源码中找不到的元素（如解析器补全的tbody）为None
+
+    同一标签的元素按文档顺序与源码中的开始标签依次对齐；属性名不同时视为解析器补全或丢弃的标签并跳过。
+    """
+    parser = SourceOffsetParser(content)
+    parser.feed(content)
+    parser.close()
+
+    sources_by_tag = {}
+    for item in parser.elements:
+        sources_by_tag.setdefault(item[0], []).append(item)
+    elements_by_tag = {}
+    for index in range(1, len(scan.nodes)):
+        elements_by_tag.setdefault(scan.tags[index], []).append(index)
+
+    offsets = [None] * len(scan.nodes)
+    for tag, indices in elements_by_tag.items():
+        sources = sources_by_tag.get(tag.lower(), ())
+        i = j = 0
+        while i < len(indices) and j < len(sources):
+            index = indices[i]
+            signature = tuple(sorted(scan.attrs_of(scan.nodes[index])))
+            if sources[j][1] == signature:
+                offsets[index] = (sources[j][2], sources[j][3])
+                i += 1
+                j += 1
+                continue
+            ahead = next((k for k in range(j + 1, min(j + 1 + ALIGN_LOOKAHEAD, len(sources)))
+                          if sources[k][1] == signature), None)
+            if ahead is not None:
+                j = ahead  # 源码中的标签被解析器丢弃
+            else:
+                i += 1  # 元素由解析器补全，源码中没有
+    return offsets
+
+
+def get_source_offsets(scan, content):
+    """取得文档的源码偏移表，首次使用时建立并缓存在节点表上"""
+    if scan.source_offsets is None:
+        scan.source_offsets = build_source_map(content, scan)
+    return scan.source_offsets
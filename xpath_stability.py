@@ -0,0 +1,433 @@
+"""定位稳定性分析 - 在同一页面的多个保存版本上评估各XPath策略能否持续定位到同一个元素
+
+以基准版本（默认第一个输入）生成XPath，其余每个版本先与基准按树匹配对齐元素
+（标签相同，按属性和文本相似度配对），再在该版本上执行每条XPath：唯一命中对齐后的元素为"稳定"。
+各版本分发到进程池并行处理，每个工作进程只解析一次基准版本；版本的节点表、标签索引和
+XPath执行结果只在处理该版本时保留，汇总只累加计数，版本数量多时内存不增长。
+"""
+import argparse
+import json
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from difflib import SequenceMatcher
+from multiprocessing import Pool
+
+from xpath_cli import apply_rule_files, collect_input_files
+from xpath_diff import MATCH_LOOKAHEAD, compute_subtree_hashes
+from xpath_engine import (DEFAULT_ELEMENT_LIMIT, generate_xpath_rows, make_limits, parse_html, parse_limit,
+                          parse_type_limit)
+from xpath_rules import RuleError
+from xpath_source import SourceFile
+from xpath_verify import XPathVerifier
+
+# 两个元素视为同一逻辑元素的最低相似度（0~1）
+MIN_SIMILARITY = 0.5
+# 相似度中属性和文本的权重
+ATTRIBUTE_WEIGHT = 0.5
+TEXT_WEIGHT = 0.5
+# 子树对齐失败的目标元素在整个版本中查找时，最多比较的同标签候选数（按文档位置就近选取）
+CANDIDATE_LIMIT = 200
+
+# 每条XPath在一个版本上的结果
+STABLE = 0  # 唯一命中对齐后的元素
+AMBIGUOUS = 1  # 命中对齐后的元素，但还匹配其他元素
+WRONG = 2  # 只匹配到其他元素
+MISSING = 3  # 没有匹配（或表达式无效）
+GONE = 4  # 目标元素在该版本中没有对应，不计入稳定率
+OUTCOME_NAMES = ('稳定', '多个匹配', '错误元素', '无匹配', '元素已删除')
+
+
+class SnapshotIndex:
+    """一个版本的节点表及对齐用的索引：子树哈希、标签 -> 元素下标、id属性 -> 元素下标、元素特征"""
+
+    def __init__(self, scan):
+        self.scan = scan
+        self.labels, self.hashes = compute_subtree_hashes(scan)
+        self._features = {}
+        self._by_tag = None
+        self._by_id = None
+
+    def features(self, index):
+        """(属性键值对集合, 属性名集合, 文本前缀)，class等多值属性按每个值拆开"""
+        cached = self._features.get(index)
+        if cached is None:
+            scan = self.scan
+            pairs = set()
+            for key, value in scan.attrs_of(scan.nodes[index]).items():
+                if isinstance(value, list):
+                    pairs.update((key, item) for item in value)
+                else:
+                    pairs.add((key, value))
+            cached = (frozenset(pairs), frozenset(key for key, _value in pairs), scan.text_prefixes[index])
+            self._features[index] = cached
+        return cached
+
+    def _build_indexes(self):
+        scan = self.scan
+        by_tag = {}
+        by_id = {}
+        for index in range(scan.tree_root, scan.tree_end):
+            by_tag.setdefault(scan.tags[index], []).append(index)
+            element_id = scan.attrs_of(scan.nodes[index]).get('id')
+            if element_id and isinstance(element_id, str):
+                by_id.setdefault(element_id, index)
+        self._by_tag = by_tag
+        self._by_id = by_id
+
+    def with_tag(self, tag):
+        """树形视图范围内该标签的元素下标（文档顺序）"""
+        if self._by_tag is None:
+            self._build_indexes()
+        return self._by_tag.get(tag, ())
+
+    def with_id(self, element_id):
+        """id属性为element_id的第一个元素下标，没有时返回None"""
+        if self._by_id is None:
+            self._build_indexes()
+        return self._by_id.get(element_id)
+
+
+def text_similarity(a, b):
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def attribute_similarity(a_pairs, a_keys, b_pairs, b_keys):
+    """属性键值对的Jaccard相似度为主，属性名相同（值变化）给部分分"""
+    if not a_keys and not b_keys:
+        return 1.0
+    pairs = len(a_pairs & b_pairs) / len(a_pairs | b_pairs)
+    keys = len(a_keys & b_keys) / len(a_keys | b_keys)
+    return 0.7 * pairs + 0.3 * keys
+
+
+def similarity(base, base_index, other, other_index):
+    """两个版本中元素的相似度（0~1），标签不同为0"""
+    if base.scan.tags[base_index] != other.scan.tags[other_index]:
+        return 0.0
+    a_pairs, a_keys, a_text = base.features(base_index)
+    b_pairs, b_keys, b_text = other.features(other_index)
+    return (ATTRIBUTE_WEIGHT * attribute_similarity(a_pairs, a_keys, b_pairs, b_keys)
+            + TEXT_WEIGHT * text_similarity(a_text, b_text))
+
+
+class SnapshotAlignment:
+    """基准版本到另一版本的元素对应关系
+
+    counterpart[i]: 基准节点i在该版本中对应的节点下标，没有对应时为-1。
+    先自顶向下对齐子树（子树哈希相同整体对应，否则按相似度对齐子元素），
+    仍未对应的目标元素再到整个版本的同标签元素中找最相似的（处理移动到别处的元素）。
+    """
+
+    def __init__(self, base, other):
+        self.base = base
+        self.other = other
+        self.counterpart = array('i', [-1]) * len(base.scan.nodes)
+        self.used = set()  # 已被对应的该版本节点下标
+
+    def _pair(self, base_index, other_index):
+        self.counterpart[base_index] = other_index
+        self.used.add(other_index)
+
+    def _pair_subtree(self, base_index, other_index):
+        """子树哈希相同：先序编号下子树是连续区间，逐个对应"""
+        depths = self.base.scan.depths
+        depth = depths[base_index]
+        end = base_index + 1
+        while end < len(depths) and depths[end] > depth:
+            end += 1
+        for offset in range(end - base_index):
+            self._pair(base_index + offset, other_index + offset)
+
+    def _align_children(self, base_index, other_index):
+        """对齐两个节点的子元素，返回[(基准下标, 版本下标)]"""
+        base = self.base
+        other = self.other
+        base_children = base.scan.children[base_index]
+        other_children = other.scan.children[other_index]
+        pairs = []
+        pointer = 0
+        for child in base_children:
+            window = range(pointer, min(pointer + MATCH_LOOKAHEAD, len(other_children)))
+            match = next((k for k in window if base.hashes[child] == other.hashes[other_children[k]]), None)
+            if match is None:
+                # 相似度相同时取最靠前的（与上一个对应位置最近），外观相同的兄弟按顺序对应
+                best = MIN_SIMILARITY
+                for k in window:
+                    score = similarity(base, child, other, other_children[k])
+                    if score > best or (match is None and score == best):
+                        best = score
+                        match = k
+                        if score == 1.0:
+                            break
+            if match is not None:
+                pairs.append((child, other_children[match]))
+                pointer = match + 1
+        return pairs
+
+    def _relocate(self, base_index):
+        """在整个版本中查找目标元素的对应：先按id，再按文档位置附近的同标签元素的相似度"""
+        base = self.base
+        other = self.other
+        element_id = base.scan.attrs_of(base.scan.nodes[base_index]).get('id')
+        if element_id and isinstance(element_id, str):
+            found = other.with_id(element_id)
+            if (found is not None and found not in self.used
+                    and other.scan.tags[found] == base.scan.tags[base_index]):
+                return found
+
+        candidates = other.with_tag(base.scan.tags[base_index])
+        if not candidates:
+            return None
+        # 按相对文档位置估计在该版本中的位置，向两侧就近取候选
+        expected = base_index * len(other.scan.nodes) // max(len(base.scan.nodes), 1)
+        middle = bisect_left(candidates, expected)
+        start = max(0, middle - CANDIDATE_LIMIT // 2)
+        best_score = MIN_SIMILARITY
+        best = None
+        for candidate in candidates[start:start + CANDIDATE_LIMIT]:
+            if candidate in self.used:
+                continue
+            score = similarity(base, base_index, other, candidate)
+            if score > best_score or (score == best_score and best is None):
+                best_score = score
+                best = candidate
+        return best
+
+    def compute(self, targets=()):
+        base_root = self.base.scan.tree_root
+        other_root = self.other.scan.tree_root
+        if self.base.scan.tags[base_root] == self.other.scan.tags[other_root]:
+            stack = [(base_root, other_root)]
+            while stack:
+                base_index, other_index = stack.pop()
+                if self.base.hashes[base_index] == self.other.hashes[other_index]:
+                    self._pair_subtree(base_index, other_index)
+                    continue
+                self._pair(base_index, other_index)
+                stack.extend(self._align_children(base_index, other_index))
+
+        for target in targets:
+            if self.counterpart[target] < 0:
+                found = self._relocate(target)
+                if found is not None:
+                    self._pair(target, found)
+        return self
+
+
+def align_snapshots(base, other, targets=()):
+    """对齐基准版本和另一版本（均为SnapshotIndex），targets为需要保证尽量找到对应的基准节点下标"""
+    return SnapshotAlignment(base, other).compute(targets)
+
+
+def baseline_locators(scan, limits=None):
+    """在基准版本上生成要评估的XPath：[(XPath记录, 目标节点下标)]（含最短唯一定位）"""
+    locators = []
+    for row in generate_xpath_rows(scan, locate=True, limits=limits):
+        locators.append((row, scan.index_of[id(row['element'])]))
+    return locators
+
+
+def evaluate_snapshot(base, scan, locators):
+    """在一个版本上执行每条XPath，返回(每条XPath的结果代码bytes, 有对应的目标元素数)
+
+    locators为[(XPath, 目标节点下标)]。
+    """
+    other = SnapshotIndex(scan)
+    targets = sorted({target for _xpath, target in locators})
+    alignment = align_snapshots(base, other, targets)
+    counterpart = alignment.counterpart
+    verifier = XPathVerifier(scan)
+    outcomes = bytearray(len(locators))
+    for position, (xpath, target) in enumerate(locators):
+        index = counterpart[target]
+        if index < 0:
+            outcomes[position] = GONE
+            continue
+        count, hit = verifier.verify(xpath, scan.nodes[index])
+        if not count:
+            outcomes[position] = MISSING
+        elif hit:
+            outcomes[position] = STABLE if count == 1 else AMBIGUOUS
+        else:
+            outcomes[position] = WRONG
+    return bytes(outcomes), sum(1 for target in targets if counterpart[target] >= 0)
+
+
+def parse_snapshot(path, parser='lxml', backend='lxml'):
+    with SourceFile(path) as source:
+        return parse_html(source, parser, backend)
+
+
+_worker = None  # 工作进程的(基准版本SnapshotIndex, [(XPath, 目标节点下标)], 解析器, 后端)
+
+
+def _init_worker(baseline, locators, parser, backend):
+    """工作进程初始化：解析一次基准版本（与主进程的解析结果节点下标相同）"""
+    global _worker
+    _worker = (SnapshotIndex(parse_snapshot(baseline, parser, backend)), locators, parser, backend)
+
+
+def _evaluate_task(path):
+    """进程池任务入口：评估一个版本"""
+    base, locators, parser, backend = _worker
+    try:
+        outcomes, aligned = evaluate_snapshot(base, parse_snapshot(path, parser, backend), locators)
+        return {'file': path, 'outcomes': outcomes, 'aligned': aligned, 'error': None}
+    except Exception as e:
+        return {'file': path, 'outcomes': None, 'aligned': 0, 'error': str(e)}
+
+
+def iter_snapshot_results(baseline, snapshots, locators, workers=1, chunksize=1, parser='lxml', backend='lxml'):
+    """逐个产出各版本的评估结果，workers大于1时分发到进程池（结果顺序不保证）
+
+    locators为[(XPath, 目标节点下标)]。
+    """
+    args = (baseline, locators, parser, backend)
+    if workers <= 1 or len(snapshots) <= 1:
+        _init_worker(*args)
+        for path in snapshots:
+            yield _evaluate_task(path)
+        return
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=args) as pool:
+        for result in pool.imap_unordered(_evaluate_task, snapshots, chunksize=chunksize):
+            yield result
+
+
+class StabilityReport:
+    """累加各版本的结果：每条XPath每种结果的次数"""
+
+    def __init__(self, locators):
+        self.rows = [row for row, _target in locators]
+        self.counts = array('i', [0]) * (len(self.rows) * len(OUTCOME_NAMES))
+        self.snapshots = []
+
+    def add(self, result):
+        self.snapshots.append({'file': result['file'], 'error': result['error'], 'aligned': result['aligned'],
+                               'stable': result['outcomes'].count(STABLE) if result['outcomes'] else 0})
+        if result['outcomes'] is None:
+            return
+        counts = self.counts
+        width = len(OUTCOME_NAMES)
+        for position, outcome in enumerate(result['outcomes']):
+            counts[position * width + outcome] += 1
+
+    def outcome_counts(self, position):
+        width = len(OUTCOME_NAMES)
+        return list(self.counts[position * width:(position + 1) * width])
+
+    def locator_summaries(self):
+        """每条XPath的稳定情况"""
+        summaries = []
+        for position, row in enumerate(self.rows):
+            counts = self.outcome_counts(position)
+            evaluated = sum(counts) - counts[GONE]
+            summaries.append({
+                'element_type': row['element_type'],
+                'element_index': row['element_index'],
+                'tag': row['tag'],
+                'type': row['type'],
+                'xpath': row['xpath'],
+                'outcomes': dict(zip(OUTCOME_NAMES, counts)),
+                'stability': counts[STABLE] / evaluated if evaluated else None,
+            })
+        return summaries
+
+    def strategy_summaries(self):
+        """按策略汇总，按稳定率从高到低排列"""
+        strategies = {}
+        for position, row in enumerate(self.rows):
+            entry = strategies.setdefault(row['type'], {'strategy': row['type'], 'locators': 0,
+                                                        'outcomes': dict.fromkeys(OUTCOME_NAMES, 0)})
+            entry['locators'] += 1
+            for name, count in zip(OUTCOME_NAMES, self.outcome_counts(position)):
+                entry['outcomes'][name] += count
+        for entry in strategies.values():
+            outcomes = entry['outcomes']
+            evaluated = sum(outcomes.values()) - outcomes[OUTCOME_NAMES[GONE]]
+            entry['stability'] = outcomes[OUTCOME_NAMES[STABLE]] / evaluated if evaluated else None
+        return sorted(strategies.values(), key=lambda entry: -1 if entry['stability'] is None else entry['stability'],
+                      reverse=True)
+
+    def to_dict(self, baseline):
+        return {
+            'baseline': baseline,
+            'snapshots': sorted(self.snapshots, key=lambda snapshot: snapshot['file']),
+            'strategies': self.strategy_summaries(),
+            'locators': self.locator_summaries(),
+        }
+
+
+def write_text_report(f, report):
+    """输出各策略的稳定率"""
+    ok = [snapshot for snapshot in report.snapshots if not snapshot['error']]
+    f.write(f"版本数: {len(ok)}（失败 {len(report.snapshots) - len(ok)}），XPath数: {len(report.rows)}\n\n")
+    f.write(f"{'策略':<8}{'稳定率':>8}  " + '  '.join(OUTCOME_NAMES) + '\n')
+    for entry in report.strategy_summaries():
+        stability = '-' if entry['stability'] is None else f"{entry['stability']:.1%}"
+        f.write(f"{entry['strategy']:<8}{stability:>8}  "
+                + '  '.join(str(entry['outcomes'][name]) for name in OUTCOME_NAMES) + '\n')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='定位稳定性分析：在同一页面的多个版本上评估XPath策略')
+    parser.add_argument('inputs', nargs='+', help='各版本的HTML文件、目录或通配符（按文件名排序）')
+    parser.add_argument('--baseline', help='生成XPath的基准版本（默认第一个输入）')
+    parser.add_argument('--json', help='写出详细结果（各策略、每条XPath、每个版本）到JSON文件')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='工作进程数（默认CPU核数）')
+    parser.add_argument('--chunksize', type=int, default=4, help='每次分发给工作进程的版本数')
+    parser.add_argument('--parser', default='lxml', choices=['lxml', 'html.parser'], help='BeautifulSoup解析器')
+    parser.add_argument('--backend', default='lxml', choices=['bs4', 'lxml'], help='解析后端（默认lxml）')
+    parser.add_argument('--limit', type=parse_limit, default=DEFAULT_ELEMENT_LIMIT,
+                        help=f'每个元素类型评估的元素数，all表示不限（默认{DEFAULT_ELEMENT_LIMIT}）')
+    parser.add_argument('--type-limit', type=parse_type_limit, action='append', default=[], metavar='TAG=N',
+                        help='单独指定某个标签或类型名的上限（可重复）')
+    parser.add_argument('--total-limit', type=parse_limit, default=None, help='所有类型合计的元素数上限')
+    parser.add_argument('--rules', action='append', default=[], metavar='FILE', help='加载JSON规则文件（可重复）')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    files = collect_input_files(args.inputs)
+    baseline = args.baseline or (files[0] if files else None)
+    if baseline is None:
+        parser.error('没有找到HTML文件')
+    snapshots = [path for path in files if os.path.abspath(path) != os.path.abspath(baseline)]
+    if not snapshots:
+        parser.error('至少需要基准之外的一个版本')
+    try:
+        apply_rule_files(args.rules)
+    except (OSError, RuleError, ImportError, AttributeError) as e:
+        parser.error(f'规则加载失败: {e}')
+
+    limits = make_limits(args.limit, dict(args.type_limit), args.total_limit)
+    locators = baseline_locators(parse_snapshot(baseline, args.parser, args.backend), limits)
+    report = StabilityReport(locators)
+    plain = [(row['xpath'], target) for row, target in locators]
+    for done, result in enumerate(iter_snapshot_results(baseline, snapshots, plain, args.workers, args.chunksize,
+                                                        args.parser, args.backend), 1):
+        if result['error']:
+            print(f"错误: {result['file']}: {result['error']}", file=sys.stderr)
+        report.add(result)
+        if done % 50 == 0:
+            print(f"已处理 {done}/{len(snapshots)} 个版本", file=sys.stderr)
+
+    write_text_report(sys.stdout, report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report.to_dict(baseline), f, ensure_ascii=False, indent=2)
+        print(f"已导出到: {args.json}", file=sys.stderr)
+    return 1 if any(snapshot['error'] for snapshot in report.snapshots) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""紧凑存储 - 界面中的HTML树节点对应关系和XPath记录按列保存在并列数组中
+
+10万个节点、50万条XPath时，每个节点、每条记录一个字典会占用数百MB并拖慢GC。
+这里每个字段一列（array），标签、策略名和元素类型编码为小整数，XPath文本按UTF-8连续存放在共享字符串池中，
+元素本身不保存，由节点下标到节点表中取。界面通过XPathRow行视图按字典的方式读取一行。
+"""
+from array import array
+
+# match_count列的特殊值
+UNVERIFIED = -2  # 记录没有验证结果（不含match_count）
+INVALID = -1  # 表达式无效（match_count为None）
+
+XPATH_ITEM_PREFIX = 'xpath_'  # XPath列表项ID前缀，后接行号
+
+
+class StringCodes:
+    """取值很少的字符串（标签、策略名、元素类型名）与小整数编码的对应"""
+
+    __slots__ = ('strings', 'codes')
+
+    def __init__(self):
+        self.strings = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.strings[code]
+
+
+class StringPool:
+    """变长字符串按UTF-8连续存放，第i个字符串为data[offsets[i]:offsets[i + 1]]"""
+
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('Q', [0])
+
+    def append(self, value):
+        self.data += value.encode('utf-8', 'surrogatepass')
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode('utf-8', 'surrogatepass')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def _serial_of(node_id, prefix=''):
+    """由"前缀序号"形式的项ID取出序号，格式不符时返回-1"""
+    if not node_id.startswith(prefix):
+        return -1
+    serial = node_id[len(prefix):]
+    return int(serial) if serial.isdigit() else -1
+
+
+class XPathRow:
+    """XPathTable中一行的视图，按XPath记录字典的方式读取（row['xpath']、'match_count' in row）"""
+
+    __slots__ = ('table', 'row')
+
+    KEYS = ('id', 'type', 'element_type', 'element_index', 'xpath', 'tag', 'element', 'match_count',
+            'hits_target', 'item_id', 'tree_index')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        table = self.table
+        row = self.row
+        if key == 'xpath':
+            return table.xpaths[row]
+        if key == 'id':
+            return table.ids[row]
+        if key == 'type':
+            return table.codes[table.types[row]]
+        if key == 'element_type':
+            return table.codes[table.element_types[row]]
+        if key == 'element_index':
+            return table.element_indexes[row]
+        if key == 'tag':
+            return table.codes[table.tags[row]]
+        if key == 'element':
+            return table.scan.nodes[table.nodes[row]]
+        if key == 'match_count':
+            count = table.match_counts[row]
+            if count == UNVERIFIED:
+                raise KeyError(key)
+            return None if count == INVALID else count
+        if key == 'hits_target':
+            if table.match_counts[row] == UNVERIFIED:
+                raise KeyError(key)
+            return bool(table.hits[row])
+        if key == 'item_id':
+            return table.item_id(row)
+        if key == 'tree_index':
+            return table.tree_index(row)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in ('match_count', 'hits_target'):
+            return self.table.match_counts[self.row] != UNVERIFIED
+        return key in self.KEYS
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def to_dict(self):
+        """转换为普通XPath记录字典"""
+        return {key: self[key] for key in self.KEYS if key in self}
+
+
+class XPathTable:
+    """一次分析的XPath记录，按列保存
+
+    nodes列为元素在节点表scan中的下标；第row行显示在XPath列表中时项ID为"xpath_行号"。
+    表只追加不修改，重新分析时换用新表，旧表（及其行视图）仍可用于增量比较。
+    """
+
+    def __init__(self, scan):
+        self.scan = scan
+        self.codes = StringCodes()
+        self.ids = array('i')
+        self.types = array('H')
+        self.element_types = array('H')
+        self.tags = array('H')
+        self.element_indexes = array('i')
+        self.nodes = array('i')
+        # 节点下标 -> 该节点第一条记录的行号（-1表示没有），双击树节点时直接查表
+        self.first_rows = array('i', [-1]) * (len(scan.nodes) if scan is not None else 0)
+        self.match_counts = array('i')
+        self.hits = bytearray()
+        self.xpaths = StringPool()
+
+    def append(self, record):
+        """追加一条XPath记录字典，返回行号"""
+        codes = self.codes
+        self.ids.append(record['id'])
+        self.types.append(codes.encode(record['type']))
+        self.element_types.append(codes.encode(record['element_type']))
+        self.tags.append(codes.encode(record['tag']))
+        self.element_indexes.append(record['element_index'])
+        node = self.scan.index_of[id(record['element'])]
+        self.nodes.append(node)
+        if self.first_rows[node] < 0:
+            self.first_rows[node] = len(self.ids) - 1
+        if 'match_count' in record:
+            count = record['match_count']
+            self.match_counts.append(INVALID if count is None else count)
+            self.hits.append(1 if record.get('hits_target') else 0)
+        else:
+            self.match_counts.append(UNVERIFIED)
+            self.hits.append(0)
+        self.xpaths.append(record['xpath'])
+        return len(self.ids) - 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        return XPathRow(self, range(len(self.ids))[row])
+
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield XPathRow(self, row)
+
+    def item_id(self, row):
+        """第row行在XPath列表中的项ID"""
+        return f"{XPATH_ITEM_PREFIX}{row}"
+
+    def row_of_item(self, item_id):
+        """XPath列表项对应的行视图，不是本表的行时返回None"""
+        row = _serial_of(item_id, XPATH_ITEM_PREFIX)
+        if not 0 <= row < len(self.ids):
+            return None
+        return XPathRow(self, row)
+
+    def first_row_of_node(self, index):
+        """节点的第一条XPath记录的行视图，没有时返回None"""
+        row = self.first_rows[index] if 0 <= index < len(self.first_rows) else -1
+        return XPathRow(self, row) if row >= 0 else None
+
+    def tree_index(self, row):
+        """行对应元素在树形视图范围内的下标，不在树中时返回None"""
+        index = self.nodes[row]
+        scan = self.scan
+        return index if scan.tree_root <= index < scan.tree_end else None
+
+
+class TreeItemTable:
+    """HTML树节点ID（"标签_序号"，序号按插入顺序递增）与节点下标的双向对应
+
+    两个方向都用数组保存；增量更新时由rebind换到新节点表，序号继续递增，保留的树节点ID不变。
+    """
+
+    def __init__(self, tags, next_serial=0):
+        self.tags = tags
+        self.serial_of = array('i', [-1]) * len(tags)  # 节点下标 -> 序号，未插入为-1
+        self.index_of_serial = array('i', [-1]) * next_serial  # 序号 -> 节点下标，不属于本表为-1
+        self.count = 0
+
+    def rebind(self, tags):
+        """新节点表上的空对应表，沿用序号计数"""
+        return TreeItemTable(tags, len(self.index_of_serial))
+
+    def add(self, index):
+        """为新插入的节点分配树节点ID"""
+        serial = len(self.index_of_serial)
+        self.index_of_serial.append(index)
+        self.serial_of[index] = serial
+        self.count += 1
+        return f"{self.tags[index]}_{serial}"
+
+    def bind(self, node_id, index):
+        """把已有的树节点ID关联到节点下标"""
+        serial = _serial_of(node_id.rsplit('_', 1)[-1])
+        if self.serial_of[index] < 0:
+            self.count += 1
+        self.index_of_serial[serial] = index
+        self.serial_of[index] = serial
+
+    def get(self, index, default=None):
+        serial = self.serial_of[index]
+        return default if serial < 0 else f"{self.tags[index]}_{serial}"
+
+    def __getitem__(self, index):
+        node_id = self.get(index)
+        if node_id is None:
+            raise KeyError(index)
+        return node_id
+
+    def __contains__(self, index):
+        return self.serial_of[index] >= 0
+
+    def __len__(self):
+        return self.count
+
+    def node_index(self, node_id):
+        """树节点ID对应的节点下标，不是本表的节点（如占位子项）时返回None"""
+        tag, _, serial = node_id.rpartition('_')
+        serial = _serial_of(serial)
+        if not 0 <= serial < len(self.index_of_serial):
+            return None
+        index = self.index_of_serial[serial]
+        if index < 0 or self.serial_of[index] != serial or self.tags[index] != tag:
+            return None
+        return index
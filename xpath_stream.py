@@ -0,0 +1,389 @@
+"""流式分析 - 用lxml.etree.iterparse边解析边记录元素，处理过的子树随即释放，适合数百MB的导出文件
+
+不建立整个解析树，只保留当前打开的元素链、每个类型上限以内元素的记录和各(标签, id)的出现次数。
+记录要等到文档结束才输出：锚点位置路径要在文档结束后才能确定祖先id是否唯一，输出又要按配置顺序。
+等待期间记录超过SPILL_THRESHOLD条的类型写入临时文件，内存中只保留每条记录的文件偏移。
+所以内存不是与文档深度成正比：libxml2 2.14的HTML增量解析器会保留已读入的原始字节（约为文件大小），
+再加上每个记录的元素8字节偏移；与完整解析（解析树约为文件大小的数十倍）相比仍然小得多。
+生成的记录只有边写入导出文件（--export）时才不占内存，文本输出等仍会先收集全部记录。
+输出与lxml后端（以及BeautifulSoup的lxml解析器）上generate_xpath_rows的结果相同；
+XPath验证和最短唯一定位需要整个文档，流式模式下不提供。
+"""
+import pickle
+import tempfile
+from array import array
+from collections import deque
+
+from bs4.element import NavigableString
+from lxml import etree
+
+from xpath_engine import (DEFAULT_LIMITS, PROGRESS_INTERVAL, TEXT_PREFIX_LIMIT, apply_limits, element_tag,
+                          generate_element_xpaths, get_element_description, id_anchor, type_limit)
+from xpath_lxml_backend import DEFAULT_STRING_SET, STRING_CONTAINERS, element_attrs
+from xpath_rules import active_rules, compiled_rules, rule_key
+from xpath_source import open_utf8
+
+# 文本累积的键：元素get_text收集的字符串类型集合（普通元素，或script/style等容器）
+TEXT_KEYS = (DEFAULT_STRING_SET,) + tuple(frozenset((container,))
+                                          for container in dict.fromkeys(STRING_CONTAINERS.values()))
+# 字符串类型 -> 收集这种字符串的文本键
+KEYS_BY_TYPE = {string_type: tuple(key for key in TEXT_KEYS if string_type in key)
+                for string_type in (NavigableString,) + tuple(STRING_CONTAINERS.values())}
+# 一个类型在内存中保留的记录数，超过后写入临时文件
+SPILL_THRESHOLD = 4096
+
+
+class StreamElement:
+    """流式解析中记录下来的元素：生成XPath和描述所需的全部信息，不引用解析树"""
+
+    __slots__ = ('key', 'tag', 'attrs', 'element_index', 'position', 'text', 'text_length', 'path', 'anchors')
+
+    def __init__(self, key, tag, attrs, element_index, position, path, anchors):
+        self.key = key  # 元素类型的分桶键
+        self.tag = tag
+        self.attrs = attrs
+        self.element_index = element_index  # 同类型元素中的文档顺序序号（从1开始）
+        self.position = position  # 在父节点同标签子元素中的位置
+        self.path = path  # 位置路径（见xpath_engine.position_path）
+        self.anchors = anchors  # 可作锚点的祖先（见_position_path）
+        self.text = ''  # get_text(strip=True)的前缀
+        self.text_length = 0
+
+
+class StreamScan:
+    """供generate_element_xpaths和get_element_description使用的节点表接口，数据取自StreamElement"""
+
+    backend = 'stream'
+
+    def __init__(self, id_counts=None):
+        self.id_counts = id_counts if id_counts is not None else {}  # (标签, id) -> 出现次数，文档结束时完整
+
+    def attrs_of(self, element):
+        return element.attrs
+
+    def tag_of(self, element):
+        return element.tag
+
+    def text_of(self, element):
+        return element.text, element.text_length
+
+    def position_path(self, element):
+        return element.path
+
+    def anchored_position_path(self, element):
+        """与xpath_engine.anchored_position_path相同，须在文档结束（id_counts完整）后调用"""
+        for key, prefix_length in element.anchors:
+            if self.id_counts.get(key) == 1:
+                return id_anchor(*key) + element.path[prefix_length:]
+        return None
+
+
+class _Frame:
+    """一个尚未结束的元素"""
+
+    __slots__ = ('element', 'position', 'path', 'anchors', 'container', 'own_set', 'acc', 'text_done',
+                 'child_counts', 'closed', 'records')
+
+    def __init__(self, element, position, container, own_set):
+        self.element = element
+        self.position = position  # 在父节点同标签子元素中的位置
+        self.path = None  # 位置路径，有记录的元素或其后代需要时才生成
+        self.anchors = ()  # 可作锚点的祖先，与path一起生成
+        self.container = container  # 元素内文本的字符串类型
+        self.own_set = own_set  # 元素自身get_text收集的字符串类型集合
+        self.acc = {}  # 文本键 -> [前缀, 长度]
+        self.text_done = False  # 自身text是否已计入
+        self.child_counts = {}  # 标签 -> 已开始的同标签子元素数量
+        self.closed = deque()  # 已结束、尚未从树中移除的子元素的文本累积
+        self.records = ()  # 本元素的记录（属于多个元素类型时每个类型一条）
+
+
+def _add_text(acc, string_type, text):
+    """把一段去除空白后的文本计入所有收集该类型字符串的键"""
+    for key in KEYS_BY_TYPE[string_type]:
+        entry = acc.get(key)
+        if entry is None:
+            acc[key] = [text[:TEXT_PREFIX_LIMIT], len(text)]
+            continue
+        if len(entry[0]) < TEXT_PREFIX_LIMIT:
+            entry[0] += text[:TEXT_PREFIX_LIMIT - len(entry[0])]
+        entry[1] += len(text)
+
+
+def _merge_text(acc, child_acc):
+    """把子元素的文本累积接到当前累积之后"""
+    for key, (prefix, length) in child_acc.items():
+        entry = acc.get(key)
+        if entry is None:
+            acc[key] = [prefix, length]
+            continue
+        if len(entry[0]) < TEXT_PREFIX_LIMIT:
+            entry[0] += prefix[:TEXT_PREFIX_LIMIT - len(entry[0])]
+        entry[1] += length
+
+
+def _consume(frame, stop=None):
+    """按文档顺序计入元素的text和stop之前的子节点（子元素文本及其tail），并把这些子节点从树中移除
+
+    stop开始时它之前的兄弟节点和tail都已解析完整；元素结束时（stop为None）全部子节点都已完整。
+    """
+    element = frame.element
+    acc = frame.acc
+    container = frame.container
+    if not frame.text_done:
+        frame.text_done = True
+        text = element.text
+        if text:
+            text = text.strip()
+            if text:
+                _add_text(acc, container, text)
+    closed = frame.closed
+    while len(element):
+        child = element[0]
+        if child is stop:
+            break
+        if child.tag.__class__ is str:
+            _merge_text(acc, closed.popleft())
+        tail = child.tail
+        if tail:
+            tail = tail.strip()
+            if tail:
+                _add_text(acc, container, tail)
+        del element[0]
+
+
+def _position_path(stack):
+    """栈顶元素的位置路径（与xpath_engine.position_path相同）和可作锚点的祖先，祖先的结果缓存在各自的帧上
+
+    可作锚点的祖先为((标签, id), 祖先路径长度)，由近到远排列；id是否唯一要到文档结束才知道，
+    由StreamScan.anchored_position_path选取。
+    """
+    depth = len(stack) - 1
+    while depth > 0 and stack[depth].path is None:
+        depth -= 1
+    for level in range(depth + 1, len(stack)):
+        frame = stack[level]
+        step = f"{frame.element.tag}[{frame.position}]"
+        if level == 1:
+            frame.path = '/' + step
+            continue
+        parent = stack[level - 1]
+        frame.path = f"{parent.path}/{step}"
+        element_id = parent.element.get('id')
+        if id_anchor(parent.element.tag, element_id):
+            frame.anchors = (((parent.element.tag, element_id), len(parent.path)),) + parent.anchors
+        else:
+            frame.anchors = parent.anchors
+    return stack[-1].path, stack[-1].anchors
+
+
+def _iterparse(source, encoding):
+    """iterparse的解析事件；空文件没有任何元素，libxml2报"no element found"，与其他后端一样视为空文档"""
+    started = False
+    try:
+        for item in etree.iterparse(source, events=('start', 'end'), html=True, huge_tree=True, encoding=encoding):
+            started = True
+            yield item
+    except etree.XMLSyntaxError:
+        if started:
+            raise
+
+
+def stream_caps(configs, limits):
+    """每个元素类型（分桶键）需要记录的元素数：类型上限与合计上限中较小者，None表示不限"""
+    total = limits.get('total')
+    caps = {}
+    for config in configs:
+        limit = type_limit(config, limits)
+        caps[rule_key(config)] = total if limit is None else limit if total is None else min(limit, total)
+    return caps
+
+
+def iter_stream_elements(source, configs=None, limits=None, encoding=None, progress=None, id_counts=None):
+    """流式解析source，逐个产出每个类型上限以内元素的StreamElement（limits见xpath_engine.make_limits）
+
+    source为文件路径时自动识别编码；为二进制文件对象时按encoding解码（None表示由libxml2判断）。
+    id_counts为字典时统计每个(标签, id)出现的次数，文档结束后完整。
+
+    元素在结束时（文本已完整）产出，后代先于祖先，所以产出顺序不是文档顺序。
+    progress(visited)每处理PROGRESS_INTERVAL个解析事件调用一次，可抛出AnalysisCancelled中止。
+    """
+    if isinstance(source, str):
+        with open_utf8(source) as file:
+            yield from iter_stream_elements(file, configs, limits, 'utf-8', progress, id_counts)
+        return
+
+    rules = compiled_rules(configs)
+    caps = stream_caps(rules.configs, limits or DEFAULT_LIMITS)
+    seen = {}  # 分桶键 -> 已开始的元素数量
+    document = _Frame(None, 0, NavigableString, DEFAULT_STRING_SET)
+    stack = [document]
+    visited = 0
+    for event, element in _iterparse(source, encoding):
+        visited += 1
+        if progress is not None and visited % PROGRESS_INTERVAL == 0:
+            progress(visited)
+
+        if event == 'start':
+            parent = stack[-1]
+            if parent.element is not None:
+                _consume(parent, element)
+            tag = element.tag
+            if id_counts is not None:
+                element_id = element.get('id')
+                if element_id:
+                    key = (tag, element_id)
+                    id_counts[key] = id_counts.get(key, 0) + 1
+            position = parent.child_counts.get(tag, 0) + 1
+            parent.child_counts[tag] = position
+            container = STRING_CONTAINERS.get(tag)
+            frame = _Frame(element, position, container or parent.container,
+                           frozenset((container,)) if container else DEFAULT_STRING_SET)
+            stack.append(frame)
+            attrs = None
+            for key in rules.classify(tag, element.get):
+                number = seen.get(key, 0) + 1
+                seen[key] = number
+                cap = caps[key]
+                if cap is None or number <= cap:
+                    if attrs is None:
+                        attrs = element_attrs(element)
+                        path, anchors = _position_path(stack)
+                        frame.records = []
+                    frame.records.append(StreamElement(key, tag, attrs, number, position, path, anchors))
+            continue
+
+        frame = stack.pop()
+        _consume(frame)
+        parent = stack[-1]
+        parent.closed.append(frame.acc)
+        if frame.records:
+            own = frame.acc.get(frame.own_set)
+            for record in frame.records:
+                if own:
+                    record.text, record.text_length = own
+                yield record
+        element.clear(keep_tail=True)
+
+
+class _ElementBucket:
+    """一个元素类型已记录的StreamElement（到达顺序不是文档顺序），按元素序号读出
+
+    超过SPILL_THRESHOLD条时全部写入临时文件，之后只在内存中保留按元素序号排列的文件偏移。
+    """
+
+    def __init__(self):
+        self.records = {}  # 元素序号 -> StreamElement（写入临时文件后为None）
+        self.file = None
+        self.offsets = None  # 元素序号-1 -> 记录在临时文件中的偏移
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, record):
+        self.count += 1
+        if self.file is None:
+            self.records[record.element_index] = record
+            if self.count > SPILL_THRESHOLD:
+                self._spill()
+            return
+        self._write(record)
+
+    def _spill(self):
+        self.file = tempfile.TemporaryFile()
+        self.offsets = array('q')
+        for record in self.records.values():
+            self._write(record)
+        self.records = None
+
+    def _write(self, record):
+        index = record.element_index - 1
+        if index >= len(self.offsets):
+            self.offsets.extend(array('q', [-1]) * (index + 1 - len(self.offsets)))
+        self.offsets[index] = self.file.tell()
+        pickle.dump(record, self.file, pickle.HIGHEST_PROTOCOL)
+
+    def elements(self):
+        """按元素序号排列的记录：未写入临时文件时为列表，否则为按需读取的_SpilledElements"""
+        if self.file is None:
+            return [self.records[idx] for idx in sorted(self.records)]
+        return _SpilledElements(self, 0, self.count)
+
+    def read(self, index):
+        self.file.seek(self.offsets[index])
+        return pickle.load(self.file)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class _SpilledElements:
+    """临时文件中一段连续元素序号的记录，支持len、切片和迭代（供apply_limits截取）"""
+
+    def __init__(self, bucket, start, stop):
+        self.bucket = bucket
+        self.range = range(start, stop)
+
+    def __len__(self):
+        return len(self.range)
+
+    def __getitem__(self, key):
+        selected = self.range[key]
+        return _SpilledElements(self.bucket, selected.start, selected.stop)
+
+    def __iter__(self):
+        for index in self.range:
+            yield self.bucket.read(index)
+
+
+def _config_rows(config, elements, scan, counter):
+    """逐条生成一个元素类型的XPath记录（elements按文档顺序），与generate_xpath_rows的顺序和字段相同"""
+    strategies = active_rules().strategies
+    for element in elements:
+        idx = element.element_index
+        tag = element_tag(config, element, scan)
+        for xpath_type, xpath in generate_element_xpaths(element, tag, scan, strategies).items():
+            yield {
+                'id': counter,
+                'type': xpath_type,
+                'element_type': config['name'],
+                'element_index': idx,
+                'xpath': xpath,
+                'tag': tag,
+                'element': element,
+                'description': get_element_description(element, scan),
+            }
+            counter += 1
+
+
+def stream_xpath_rows(source, configs=None, limits=None, encoding=None, progress=None):
+    """流式生成XPath记录（生成器），内容和顺序与generate_xpath_rows相同，另带description
+
+    记录在文档结束（祖先id是否唯一已知）后按配置顺序输出，等待期间数量多的类型暂存在临时文件中。
+    """
+    limits = limits or DEFAULT_LIMITS
+    rules = compiled_rules(configs)
+    scan = StreamScan()
+    found = {}  # 分桶键 -> _ElementBucket
+
+    def collected(config):
+        bucket = found.get(rule_key(config))
+        return bucket.elements() if bucket else []
+
+    counter = 1
+    try:
+        for record in iter_stream_elements(source, rules, limits, encoding, progress, scan.id_counts):
+            bucket = found.get(record.key)
+            if bucket is None:
+                bucket = found[record.key] = _ElementBucket()
+            bucket.add(record)
+
+        for config, elements in apply_limits(rules.configs, limits, collected):
+            for row in _config_rows(config, elements, scan, counter):
+                counter += 1
+                yield row
+    finally:
+        for bucket in found.values():
+            bucket.close()
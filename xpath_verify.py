@@ -0,0 +1,142 @@
+"""XPath验证 - 在lxml树上执行生成的XPath，记录匹配数量以及是否命中目标元素"""
+from functools import lru_cache
+
+from bs4 import Tag
+from bs4.element import CData, Comment, PreformattedString
+from lxml import etree
+
+# 同一进程内缓存的已编译XPath数量
+XPATH_CACHE_SIZE = 10000
+
+# BeautifulSoup文档没有唯一根元素时（如html.parser解析的片段）使用的包装根
+FRAGMENT_ROOT_TAG = 'document-fragment'
+
+
+@lru_cache(maxsize=XPATH_CACHE_SIZE)
+def compile_xpath(expression):
+    """编译XPath并按表达式缓存，语法错误时返回None"""
+    try:
+        return etree.XPath(expression)
+    except etree.XPathSyntaxError:
+        return None
+
+
+def _mirror_attrs(attrs):
+    """把BeautifulSoup属性转换为lxml属性（多值属性用空格连接）"""
+    result = {}
+    for key, value in attrs.items():
+        if isinstance(value, list):
+            value = ' '.join(value)
+        result[key] = value
+    return result
+
+
+def _new_mirror_element(parent, tag, attrs):
+    """创建镜像元素，忽略lxml不接受的标签名或属性名"""
+    try:
+        element = etree.SubElement(parent, tag) if parent is not None else etree.Element(tag)
+    except ValueError:
+        element = etree.SubElement(parent, 'invalid-tag') if parent is not None else etree.Element('invalid-tag')
+    for key, value in attrs.items():
+        try:
+            element.set(key, value)
+        except (ValueError, TypeError):
+            pass
+    return element
+
+
+def _append_mirror_text(parent, text):
+    """把文本追加到lxml元素（最后一个子节点的tail或自身text）"""
+    if len(parent):
+        last = parent[-1]
+        last.tail = (last.tail or '') + text
+    else:
+        parent.text = (parent.text or '') + text
+
+
+def build_mirror_tree(scan):
+    """按BeautifulSoup节点表构建结构相同的lxml树，返回(ElementTree, 与节点表对齐的元素列表)"""
+    nodes = scan.nodes
+    mirror = [None] * len(nodes)
+    top = scan.children[0]
+    if len(top) == 1 and not any(isinstance(child, str) and child.strip() for child in nodes[0].contents
+                                 if not isinstance(child, PreformattedString)):
+        root = _new_mirror_element(None, scan.tags[top[0]], _mirror_attrs(scan.attrs_of(nodes[top[0]])))
+        mirror[top[0]] = root
+        mirror[0] = None
+        start = top[0]
+    else:
+        root = etree.Element(FRAGMENT_ROOT_TAG)
+        mirror[0] = root
+        start = 0
+
+    index_of = scan.index_of
+    for index in range(start, len(nodes)):
+        target = mirror[index]
+        if target is None:
+            continue
+        for child in nodes[index].contents:
+            if isinstance(child, Tag):
+                child_index = index_of[id(child)]
+                mirror[child_index] = _new_mirror_element(target, scan.tags[child_index],
+                                                          _mirror_attrs(child.attrs))
+            elif isinstance(child, Comment):
+                target.append(etree.Comment(str(child).replace('--', '- -')))
+            elif isinstance(child, PreformattedString) and not isinstance(child, CData):
+                # doctype、声明、处理指令不影响XPath匹配
+                continue
+            else:
+                _append_mirror_text(target, str(child))
+    return etree.ElementTree(root), mirror
+
+
+def xpath_tree(tree):
+    """执行XPath用的树：空文档（没有根元素）换成空的片段根，与BeautifulSoup后端的空文档相同"""
+    return tree if tree.getroot() is not None else etree.ElementTree(etree.Element(FRAGMENT_ROOT_TAG))
+
+
+class XPathVerifier:
+    """在文档对应的lxml树上执行XPath，统计匹配数量并判断是否命中目标元素"""
+
+    def __init__(self, scan):
+        self.scan = scan
+        if scan.backend == 'lxml':
+            self.tree = xpath_tree(scan.soup)
+            self.mirror = None
+        else:
+            self.tree, self.mirror = build_mirror_tree(scan)
+        self._results = {}  # 表达式 -> (匹配数量, 匹配元素id集合)，同一文档内复用
+        self.evaluations = 0  # 实际执行XPath的次数
+
+    def lxml_element(self, element):
+        """返回元素在lxml树中对应的元素"""
+        if self.mirror is None:
+            return element
+        return self.mirror[self.scan.index_of[id(element)]]
+
+    def matches(self, expression):
+        """执行XPath，返回(匹配数量, 匹配元素id集合)；表达式无效时返回(None, 空集合)"""
+        cached = self._results.get(expression)
+        if cached is not None:
+            return cached
+        compiled = compile_xpath(expression)
+        if compiled is None:
+            result = (None, frozenset())
+        else:
+            try:
+                found = compiled(self.tree)
+            except etree.XPathEvalError:
+                found = None
+            self.evaluations += 1
+            if isinstance(found, list):
+                result = (len(found), frozenset(id(item) for item in found))
+            else:
+                result = (None, frozenset())
+        self._results[expression] = result
+        return result
+
+    def verify(self, expression, element):
+        """返回(匹配数量, 是否命中目标元素)"""
+        count, found = self.matches(expression)
+        target = self.lxml_element(element)
+        return count, target is not None and id(target) in found